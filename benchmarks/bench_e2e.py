@@ -0,0 +1,150 @@
+"""End-to-end offline benchmark: PDF ingest, chunk retrieval and query latency per QueryType.
+
+Runs entirely offline: synthetic PDFs, the fake LLM backend with injected latency and,
+by default, hashing embeddings instead of the HF model.
+
+    python -m benchmarks.bench_e2e --sizes 1 5 20 --docs 4 --output benchmarks/results/e2e.json
+    python -m benchmarks.bench_e2e --baseline benchmarks/results/e2e_baseline.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import tempfile
+import time
+
+from .common import (setup_offline_environment, make_embeddings, percentiles, peak_rss_mb, write_results,
+                     compare_results, report_comparison, Stopwatch)
+from .synthetic import make_pdfs, topic_query
+
+def bench_ingest(processor, workdir: str, sizes, n_docs: int, seed: int):
+    """Time process_pdf over synthetic papers of each size (pages per paper)"""
+    results, ingested = {}, []
+    for pages in sizes:
+        papers = make_pdfs(f"{workdir}/pdfs", n_docs, pages, seed=seed + pages)
+        durations, document_ids = [], set()
+        for path, topic in papers:
+            with Stopwatch(durations):
+                document_id = processor.process_pdf(path)
+            document_ids.add(document_id)
+            ingested.append((document_id, topic))
+        chunks = sum(info.chunks for info in processor.list_documents() if info.document_id in document_ids)
+        total = sum(durations)
+        results[f"pages_{pages}"] = {
+            "documents": n_docs,
+            "chunks": chunks,
+            "total_seconds": total,
+            "documents_per_second": n_docs / total,
+            "pages_per_second": n_docs * pages / total,
+            "chunks_per_second": chunks / total,
+            "latency": percentiles(durations),
+        }
+        print(f"ingest {pages:>3} pages/paper: {n_docs * pages / total:8.1f} pages/s, {chunks / total:8.1f} chunks/s")
+    return results, ingested
+
+def bench_retrieval(processor, ingested, n_queries: int, k: int, seed: int):
+    """Latency percentiles of retrieve_relevant_chunks without a filter and with 1 or several documents"""
+    rng = random.Random(seed)
+    document_ids = [document_id for document_id, _ in ingested]
+    scenarios = {
+        "unfiltered": lambda: None,
+        "single_document": lambda: [rng.choice(document_ids)],
+        "multi_document": lambda: rng.sample(document_ids, min(4, len(document_ids))),
+    }
+    results = {}
+    for name, pick in scenarios.items():
+        durations = []
+        for _ in range(n_queries):
+            _, topic = rng.choice(ingested)
+            query, filter_ids = topic_query(rng, topic), pick()
+            with Stopwatch(durations):
+                processor.retrieve_relevant_chunks(query, filter_ids, k)
+        results[name] = percentiles(durations)
+        print(f"retrieval {name:<16} p50 {results[name]['p50_ms']:7.2f} ms  p99 {results[name]['p99_ms']:7.2f} ms")
+    return results
+
+async def bench_queries(assistant, ingested, repeats: int, seed: int):
+    """End-to-end latency of ResearchAssistant.run for every QueryType"""
+    from research_assistant.models.query import QueryType
+
+    rng = random.Random(seed)
+    document_ids = [document_id for document_id, _ in ingested]
+    options = {
+        QueryType.SUMMARIZE: {"summary_type": "general", "length": "short"},
+        QueryType.GENERATE_CITATION: {"style": "APA"},
+    }
+    results = {}
+    for query_type in QueryType:
+        durations, first_tokens, llm_calls = [], [], 0
+        for _ in range(repeats):
+            docs = rng.sample(document_ids, min(3, len(document_ids)))
+            calls_before = sum(tier["calls"] for tier in assistant.tools.llm_metrics().values())
+            with Stopwatch(durations):
+                state = await assistant.run(f"What do these papers say about {topic_query(rng, 'language', 2)}?",
+                                            query_type.value, docs, options.get(query_type, {}))
+            llm_calls += sum(tier["calls"] for tier in assistant.tools.llm_metrics().values()) - calls_before
+            if "time_to_first_token" in state.metrics:
+                first_tokens.append(state.metrics["time_to_first_token"])
+        results[query_type.value] = {
+            "latency": percentiles(durations),
+            "time_to_first_token": percentiles(first_tokens),
+            "llm_calls_per_query": llm_calls / repeats,
+        }
+        print(f"query {query_type.value:<18} p50 {results[query_type.value]['latency']['p50_ms']:8.1f} ms  "
+              f"{llm_calls / repeats:5.1f} LLM calls")
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 5, 20], help="Pages per synthetic paper")
+    parser.add_argument("--docs", type=int, default=4, help="Papers ingested per size")
+    parser.add_argument("--queries", type=int, default=100, help="Retrieval queries per scenario")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per query type")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Fake LLM seconds per call")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Fake LLM seconds per streamed token")
+    parser.add_argument("--embeddings", choices=["hash", "hf"], default="hash")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="Directory for the stores (default: a temporary directory)")
+    parser.add_argument("--output", help="Results JSON path (default: benchmarks/results/e2e.json)")
+    parser.add_argument("--baseline", help="Earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Relative change reported against the baseline")
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="ra_bench_")
+    setup_offline_environment(workdir, args.llm_latency, args.token_latency)
+    from research_assistant.app import ResearchAssistant
+    from research_assistant.processors.document_processor import DocumentProcessor
+
+    start = time.perf_counter()
+    processor = DocumentProcessor(embeddings=make_embeddings(args.embeddings), persist_directory=f"{workdir}/chroma")
+    setup_seconds = time.perf_counter() - start
+
+    ingest, ingested = bench_ingest(processor, workdir, args.sizes, args.docs, args.seed)
+    retrieval = bench_retrieval(processor, ingested, args.queries, args.k, args.seed)
+    assistant = ResearchAssistant(doc_processor=processor)
+    queries = asyncio.run(bench_queries(assistant, ingested, args.repeats, args.seed))
+
+    results = {
+        "setup_seconds": setup_seconds,
+        "ingest": ingest,
+        "retrieval": retrieval,
+        "queries": queries,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    path = write_results("e2e", {key: value for key, value in vars(args).items()
+                                 if key not in ("output", "baseline", "workdir")}, results, args.output)
+    print(f"Results written to {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(path) as f:
+            current = json.load(f)
+        if report_comparison(compare_results(current, baseline, args.tolerance)):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+"""Quantized index benchmark: int8 codes with float32 rescoring against the exact embedding store.
+
+Two embedding stores are filled with the same synthetic, clustered embeddings (see
+bench_retrieval_scale): an exact float32 store and an int8-quantized one. For each size it
+reports the bytes a search scans, the memory each store keeps resident after the queries,
+latency, and recall@k of the quantized search against the exact one for a range of rescore
+factors (a factor of 1 ranks the codes' top k alone), unfiltered and with a one-document filter.
+
+For each of --index-sizes it also compares whole indexes behind DocumentProcessor: the chunks
+are written to Chroma, to the embedding store (EMBEDDING_STORE=1) and to a quantized one, then
+each index is opened and queried in a fresh process, whose resident memory growth is reported
+in total and private (not backed by files, so neither shared with other processes nor reclaimable).
+
+    python -m benchmarks.bench_quantized --sizes 100000 1000000 --rescore-factors 1 2 5 10 20
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict
+
+import numpy as np
+
+from .bench_retrieval_scale import QueryVectors, clustered_embeddings, fill_store
+from .common import (setup_offline_environment, percentiles, rss_mb, private_rss_mb, peak_rss_mb, write_results,
+                     compare_results, report_comparison)
+
+APPEND_BATCH_SIZE = 50_000
+
+def fill(path: str, embeddings: np.ndarray, n_docs: int, quantized: bool) -> float:
+    from research_assistant.processors.embedding_store import EmbeddingStore
+
+    store = EmbeddingStore(path)
+    if quantized:
+        store.quantize()
+    start = time.perf_counter()
+    for offset in range(0, len(embeddings), APPEND_BATCH_SIZE):
+        rows = range(offset, min(offset + APPEND_BATCH_SIZE, len(embeddings)))
+        store.append([f"synthetic_doc_{i % n_docs}_chunk_{i // n_docs}" for i in rows],
+                     embeddings[offset:offset + len(rows)], [f"synthetic_doc_{i % n_docs}" for i in rows])
+    return time.perf_counter() - start
+
+def run_queries(store, queries: np.ndarray, filters, k: int):
+    durations, hits = [], []
+    for query, document_ids in zip(queries, filters):
+        start = time.perf_counter()
+        found = store.search(query, k, document_ids)
+        durations.append(time.perf_counter() - start)
+        hits.append({chunk_id for chunk_id, _ in found})
+    return durations, hits
+
+def bench_size(n_chunks: int, args, workdir: str) -> Dict:
+    from research_assistant.processors.embedding_store import EmbeddingStore
+
+    rng = np.random.default_rng(args.seed)
+    embeddings = clustered_embeddings(n_chunks, args.docs, args.dimensions, args.spread, rng)
+    anchors = rng.integers(0, n_chunks, args.queries)
+    queries = embeddings[anchors] + args.spread * rng.standard_normal(
+        (args.queries, args.dimensions), dtype=np.float32) / np.sqrt(args.dimensions)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    exact_path, quantized_path = os.path.join(workdir, f"exact_{n_chunks}"), os.path.join(workdir, f"int8_{n_chunks}")
+    fill_seconds = {"exact": fill(exact_path, embeddings, args.docs, quantized=False),
+                    "int8": fill(quantized_path, embeddings, args.docs, quantized=True)}
+    del embeddings
+
+    # Stores are opened fresh, so RSS growth counts the mapped pages their searches touch
+    rss_before = rss_mb()
+    quantized = EmbeddingStore(quantized_path, rescore_factor=max(args.rescore_factors))
+    for factor in args.rescore_factors:
+        quantized.rescore_factor = factor
+        run_queries(quantized, queries, [None] * len(queries), args.k)
+    rss_quantized = rss_mb()
+    exact = EmbeddingStore(exact_path)
+    run_queries(exact, queries, [None] * len(queries), args.k)
+    rss_exact = rss_mb()
+
+    exact_stats, quantized_stats = exact.stats(), quantized.stats()
+    results = {
+        "chunks": n_chunks,
+        "fill_seconds": fill_seconds,
+        "memory": {
+            "exact_scan_mb": exact_stats["scan_bytes"] / 2**20,
+            "int8_scan_mb": quantized_stats["scan_bytes"] / 2**20,
+            "scan_reduction": exact_stats["scan_bytes"] / quantized_stats["scan_bytes"],
+            "int8_resident_mb": rss_quantized - rss_before,
+            "exact_resident_mb": rss_exact - rss_quantized,
+        },
+    }
+    print(f"{n_chunks:>9} chunks: search scans {results['memory']['exact_scan_mb']:.0f} MB exact, "
+          f"{results['memory']['int8_scan_mb']:.0f} MB int8 (x{results['memory']['scan_reduction']:.2f} less); "
+          f"resident after queries {results['memory']['exact_resident_mb']:.0f} MB exact, "
+          f"{results['memory']['int8_resident_mb']:.0f} MB int8")
+
+    scenarios = {
+        "unfiltered": [None] * len(queries),
+        "single_document": [[f"synthetic_doc_{anchor % args.docs}"] for anchor in anchors],
+    }
+    for name, filters in scenarios.items():
+        durations, truth = run_queries(exact, queries, filters, args.k)
+        results[name] = {"exact": percentiles(durations)}
+        print(f"{n_chunks:>9} chunks {name:<16} exact      p50 {results[name]['exact']['p50_ms']:8.2f} ms  "
+              f"p99 {results[name]['exact']['p99_ms']:8.2f} ms")
+        for factor in args.rescore_factors:
+            quantized.rescore_factor = factor
+            durations, found = run_queries(quantized, queries, filters, args.k)
+            recall = float(np.mean([len(a & b) / max(1, len(b)) for a, b in zip(found, truth)]))
+            summary = {**percentiles(durations), f"recall_at_{args.k}": recall}
+            summary["speedup_p50"] = results[name]["exact"]["p50_ms"] / summary["p50_ms"]
+            results[name][f"int8_rescore_{factor}"] = summary
+            print(f"{n_chunks:>9} chunks {name:<16} int8 x{factor:<4} p50 {summary['p50_ms']:8.2f} ms  "
+                  f"p99 {summary['p99_ms']:8.2f} ms  recall@{args.k} {recall:.3f}  speedup x{summary['speedup_p50']:.2f}")
+
+    del exact, quantized
+    shutil.rmtree(exact_path, ignore_errors=True)
+    shutil.rmtree(quantized_path, ignore_errors=True)
+    return results
+
+# Index layouts compared by bench_index_memory, as their EMBEDDING_STORE and EMBEDDING_QUANTIZATION
+INDEX_LAYOUTS = {"chroma": ("0", "none"), "embedding_store": ("1", "none"), "embedding_store_int8": ("1", "int8")}
+
+def index_process(fill: bool, layout: str, directory: str, arrays: str, n_docs: int, k: int):
+    """In a fresh process: fill the index (returns seconds) or open and query it (returns RSS growth in MB)"""
+    setup_offline_environment(directory)
+    os.environ["EMBEDDING_STORE"], os.environ["EMBEDDING_QUANTIZATION"] = INDEX_LAYOUTS[layout]
+    from research_assistant.processors.document_processor import DocumentProcessor
+
+    queries = np.load(os.path.join(arrays, "queries.npy"))
+    rss_before, private_before = rss_mb(), private_rss_mb()
+    processor = DocumentProcessor(embeddings=QueryVectors(queries), persist_directory=os.path.join(directory, "index"))
+    if fill:
+        return fill_store(processor, np.load(os.path.join(arrays, "embeddings.npy"), mmap_mode="r"), n_docs)
+    for q in range(len(queries)):
+        processor.retrieve_relevant_chunks(f"q:{q}", None, k)
+    return {"query_resident_mb": rss_mb() - rss_before, "query_private_mb": private_rss_mb() - private_before}
+
+def bench_index_memory(n_chunks: int, args, workdir: str) -> Dict:
+    """Resident memory of a process querying the same chunks indexed in Chroma and in the embedding store"""
+    rng = np.random.default_rng(args.seed)
+    embeddings = clustered_embeddings(n_chunks, args.docs, args.dimensions, args.spread, rng)
+    queries = embeddings[rng.integers(0, n_chunks, args.queries)]
+    arrays = os.path.join(workdir, f"arrays_{n_chunks}")
+    os.makedirs(arrays, exist_ok=True)
+    np.save(os.path.join(arrays, "embeddings.npy"), embeddings)
+    np.save(os.path.join(arrays, "queries.npy"), queries)
+    del embeddings
+
+    results = {"chunks": n_chunks}
+    for layout in INDEX_LAYOUTS:
+        directory = os.path.join(workdir, f"{layout}_{n_chunks}")
+        runs = {}
+        for fill in (True, False):
+            # Spawned, so each process starts without the other layouts' memory or imports
+            with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                runs[fill] = pool.submit(index_process, fill, layout, directory, arrays, args.docs, args.k).result()
+        results[layout] = {"fill_seconds": runs[True], **runs[False]}
+        shutil.rmtree(directory, ignore_errors=True)
+        print(f"{n_chunks:>9} chunks {layout:<20} querying process: +{results[layout]['query_resident_mb']:.0f} MB "
+              f"resident, +{results[layout]['query_private_mb']:.0f} MB private")
+    shutil.rmtree(arrays, ignore_errors=True)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--index-sizes", type=int, nargs="*", default=[100_000],
+                        help="Chunks for the Chroma vs embedding store memory comparison (none to skip)")
+    parser.add_argument("--rescore-factors", type=int, nargs="+", default=[1, 2, 5, 10, 20],
+                        help="Candidates rescored with float32 vectors, as multiples of k")
+    parser.add_argument("--docs", type=int, default=1000, help="Documents the chunks are spread over")
+    parser.add_argument("--dimensions", type=int, default=384, help="Embedding size (all-MiniLM-L6-v2: 384)")
+    parser.add_argument("--spread", type=float, default=0.6, help="Noise around each document's centre")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per scenario, size and factor")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="Directory for the stores (default: a temporary directory)")
+    parser.add_argument("--output", help="Results JSON path (default: benchmarks/results/quantized.json)")
+    parser.add_argument("--baseline", help="Earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="ra_bench_")
+    results = {f"chunks_{n_chunks}": bench_size(n_chunks, args, workdir) for n_chunks in args.sizes}
+    for n_chunks in args.index_sizes:
+        results[f"index_memory_{n_chunks}"] = bench_index_memory(n_chunks, args, workdir)
+    results["peak_rss_mb"] = peak_rss_mb()
+    path = write_results("quantized", {key: value for key, value in vars(args).items()
+                                       if key not in ("output", "baseline", "workdir")}, results, args.output)
+    print(f"Results written to {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(path) as f:
+            current = json.load(f)
+        if report_comparison(compare_results(current, baseline, args.tolerance)):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
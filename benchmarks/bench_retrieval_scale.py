@@ -0,0 +1,188 @@
+"""Retrieval scale benchmark: retrieve_relevant_chunks latency, memory and recall@k from 10k to 1M chunks.
+
+The Chroma collection behind DocumentProcessor is filled with synthetic, clustered
+embeddings (one cluster per document) and queried through retrieve_relevant_chunks,
+unfiltered and with single- and multi-document `$in` filters. Recall@k is measured
+against exact brute-force search over the same (filtered) vectors. --embedding-store
+searches the memory-mapped embedding store instead of Chroma's HNSW index.
+
+    python -m benchmarks.bench_retrieval_scale --sizes 10000 100000 1000000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .common import (setup_offline_environment, percentiles, rss_mb, peak_rss_mb, write_results,
+                     compare_results, report_comparison)
+
+# Chroma rejects larger add() batches
+ADD_BATCH_SIZE = 5000
+
+class QueryVectors(Embeddings):
+    """Embeddings that resolve query texts "q:<n>" to precomputed vectors"""
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.vectors[int(text.split(":", 1)[1])].tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+def clustered_embeddings(n_chunks: int, n_docs: int, dimensions: int, spread: float, rng: np.random.Generator):
+    """Unit vectors around one random centre per document; chunk i belongs to document i % n_docs"""
+    centres = rng.standard_normal((n_docs, dimensions), dtype=np.float32)
+    centres /= np.linalg.norm(centres, axis=1, keepdims=True)
+    embeddings = np.empty((n_chunks, dimensions), dtype=np.float32)
+    for start in range(0, n_chunks, 100_000):
+        stop = min(start + 100_000, n_chunks)
+        block = centres[np.arange(start, stop) % n_docs] + spread * rng.standard_normal(
+            (stop - start, dimensions), dtype=np.float32) / np.sqrt(dimensions)
+        embeddings[start:stop] = block / np.linalg.norm(block, axis=1, keepdims=True)
+    return embeddings
+
+def fill_store(processor, embeddings: np.ndarray, n_docs: int) -> float:
+    """Add the vectors straight to the index (Chroma, or the embedding store), with the metadata process_pdf stores"""
+    start = time.perf_counter()
+    for offset in range(0, len(embeddings), ADD_BATCH_SIZE):
+        rows = range(offset, min(offset + ADD_BATCH_SIZE, len(embeddings)))
+        ids = [f"synthetic_doc_{i % n_docs}_chunk_{i // n_docs}" for i in rows]
+        processor._upsert(
+            ids=ids,
+            embeddings=embeddings[offset:offset + len(rows)],
+            metadatas=[{"document_id": f"synthetic_doc_{i % n_docs}", "chunk_id": chunk_id}
+                       for i, chunk_id in zip(rows, ids)],
+            documents=[f"chunk {i}" for i in rows],
+        )
+    return time.perf_counter() - start
+
+def exact_top_k(embeddings: np.ndarray, query: np.ndarray, rows: np.ndarray, k: int) -> np.ndarray:
+    """Row indices of the k nearest vectors by L2 distance (Chroma's default space)"""
+    candidates = embeddings[rows] if rows is not None else embeddings
+    distances = np.sum((candidates - query) ** 2, axis=1)
+    nearest = np.argpartition(distances, min(k, len(distances) - 1))[:k]
+    nearest = nearest[np.argsort(distances[nearest])]
+    return rows[nearest] if rows is not None else nearest
+
+def row_of(chunk_id: str, n_docs: int) -> int:
+    document, chunk = chunk_id.split("_chunk_")
+    return int(chunk) * n_docs + int(document.rsplit("_", 1)[1])
+
+def bench_size(n_chunks: int, args, workdir: str) -> Dict:
+    from research_assistant.processors.document_processor import DocumentProcessor
+
+    rng = np.random.default_rng(args.seed)
+    embeddings = clustered_embeddings(n_chunks, args.docs, args.dimensions, args.spread, rng)
+    # Queries sit near a random existing chunk
+    anchors = rng.integers(0, n_chunks, args.queries)
+    queries = embeddings[anchors] + args.spread * rng.standard_normal(
+        (args.queries, args.dimensions), dtype=np.float32) / np.sqrt(args.dimensions)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    rss_before = rss_mb()
+    persist_directory = os.path.join(workdir, f"chroma_{n_chunks}")
+    processor = DocumentProcessor(embeddings=QueryVectors(queries), persist_directory=persist_directory)
+    fill_seconds = fill_store(processor, embeddings, args.docs)
+    rss_after_fill = rss_mb()
+
+    document_rows = {doc: np.arange(doc, n_chunks, args.docs) for doc in range(args.docs)}
+    scenarios = {
+        "unfiltered": lambda q: None,
+        "single_document": lambda q: [int(anchors[q] % args.docs)],
+        "multi_document": lambda q: sorted({int(anchors[q] % args.docs)} | set(
+            int(d) for d in rng.choice(args.docs, args.filter_docs - 1, replace=False))),
+    }
+    results = {
+        "chunks": n_chunks,
+        "fill_seconds": fill_seconds,
+        "fill_chunks_per_second": n_chunks / fill_seconds,
+        "memory": {
+            "embeddings_mb": embeddings.nbytes / 2**20,
+            "process_rss_growth_mb": rss_after_fill - rss_before,
+            "disk_mb": sum(os.path.getsize(os.path.join(root, name))
+                           for root, _, names in os.walk(persist_directory) for name in names) / 2**20,
+        },
+    }
+    for name, pick in scenarios.items():
+        durations, recalls = [], []
+        for q in range(args.queries):
+            docs = pick(q)
+            start = time.perf_counter()
+            found = processor.retrieve_relevant_chunks(f"q:{q}", [f"synthetic_doc_{d}" for d in docs] if docs else None,
+                                                       args.k)
+            durations.append(time.perf_counter() - start)
+            rows = np.concatenate([document_rows[d] for d in docs]) if docs else None
+            exact = set(exact_top_k(embeddings, queries[q], rows, args.k).tolist())
+            approx = {row_of(doc.metadata["chunk_id"], args.docs) for doc in found}
+            recalls.append(len(exact & approx) / max(1, min(args.k, len(exact))))
+        results[name] = {**percentiles(durations), f"recall_at_{args.k}": float(np.mean(recalls))}
+        print(f"{n_chunks:>9} chunks {name:<16} p50 {results[name]['p50_ms']:8.2f} ms  "
+              f"p99 {results[name]['p99_ms']:8.2f} ms  recall@{args.k} {results[name][f'recall_at_{args.k}']:.3f}")
+    print(f"{n_chunks:>9} chunks filled in {fill_seconds:.1f}s, RSS +{results['memory']['process_rss_growth_mb']:.0f} MB, "
+          f"disk {results['memory']['disk_mb']:.0f} MB")
+
+    # Release the collection before the next size
+    processor.vectorstore.delete_collection()
+    processor.embedding_store = processor.chunk_table = None
+    return results
+
+def scaling_summary(results: Dict, sizes: List[int]) -> Dict:
+    """p99 growth relative to corpus growth between consecutive sizes (1.0 means linear scaling)"""
+    summary = {}
+    for smaller, larger in zip(sizes, sizes[1:]):
+        growth = larger / smaller
+        for scenario in ("unfiltered", "single_document", "multi_document"):
+            ratio = results[f"chunks_{larger}"][scenario]["p99_ms"] / results[f"chunks_{smaller}"][scenario]["p99_ms"]
+            summary.setdefault(scenario, {})[f"{smaller}_to_{larger}"] = {
+                "p99_growth": ratio, "relative_to_linear": ratio / growth}
+            print(f"{scenario:<16} {smaller:>9} -> {larger:>9} chunks: p99 x{ratio:.2f} for x{growth:.0f} chunks")
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--docs", type=int, default=1000, help="Documents the chunks are spread over")
+    parser.add_argument("--filter-docs", type=int, default=10, help="Documents in the multi-document filter")
+    parser.add_argument("--dimensions", type=int, default=384, help="Embedding size (all-MiniLM-L6-v2: 384)")
+    parser.add_argument("--spread", type=float, default=0.6, help="Noise around each document's centre")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per scenario and size")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--embedding-store", action="store_true",
+                        help="Search the memory-mapped embedding store instead of Chroma's HNSW index")
+    parser.add_argument("--workdir", help="Directory for the stores (default: a temporary directory)")
+    parser.add_argument("--output", help="Results JSON path (default: benchmarks/results/retrieval_scale.json)")
+    parser.add_argument("--baseline", help="Earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="ra_bench_")
+    setup_offline_environment(workdir)
+    from research_assistant import config
+    config.EMBEDDING_STORE = args.embedding_store
+
+    results = {f"chunks_{n_chunks}": bench_size(n_chunks, args, workdir) for n_chunks in args.sizes}
+    results["scaling"] = scaling_summary(results, args.sizes)
+    results["peak_rss_mb"] = peak_rss_mb()
+    path = write_results("retrieval_scale", {key: value for key, value in vars(args).items()
+                                             if key not in ("output", "baseline", "workdir")}, results, args.output)
+    print(f"Results written to {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(path) as f:
+            current = json.load(f)
+        if report_comparison(compare_results(current, baseline, args.tolerance)):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
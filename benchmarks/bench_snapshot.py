@@ -0,0 +1,105 @@
+"""Snapshot benchmark: export and import throughput of index snapshots, for Chroma and the embedding store.
+
+An index behind DocumentProcessor is filled with synthetic, clustered embeddings (see
+bench_retrieval_scale), exported to a snapshot and imported into an empty index. For each
+size and layout it reports the seconds and chunks per second of the fill, the export and the
+import, and the snapshot's size on disk. Import skips the embedding model, so its cost is
+the index's own write path: Chroma's HNSW inserts, or appends to the embedding store.
+
+    python -m benchmarks.bench_snapshot --sizes 10000 100000
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict
+
+import numpy as np
+
+from .bench_retrieval_scale import QueryVectors, clustered_embeddings, fill_store
+from .common import (setup_offline_environment, peak_rss_mb, write_results, compare_results,
+                     report_comparison)
+
+def directory_mb(path: str) -> float:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names) / 2**20
+
+def bench_size(n_chunks: int, args, workdir: str) -> Dict:
+    from research_assistant import config
+    from research_assistant.processors.document_processor import DocumentProcessor
+    from research_assistant.processors.metadata_registry import MetadataRegistry
+
+    rng = np.random.default_rng(args.seed)
+    embeddings = clustered_embeddings(n_chunks, args.docs, args.dimensions, args.spread, rng)
+    # The snapshot records the embedding model; both indexes use the same query stand-in
+    model = QueryVectors(embeddings[:1])
+    results = {"chunks": n_chunks}
+    for layout, embedding_store in (("chroma", False), ("embedding_store", True)):
+        config.EMBEDDING_STORE = embedding_store
+        directory = os.path.join(workdir, f"{layout}_{n_chunks}")
+        source = DocumentProcessor(embeddings=model, persist_directory=os.path.join(directory, "source"),
+                                   metadata_registry=MetadataRegistry(os.path.join(directory, "source.json")))
+        fill_seconds = fill_store(source, embeddings, args.docs)
+
+        snapshot = os.path.join(directory, "snapshot")
+        start = time.perf_counter()
+        source.export_snapshot(snapshot)
+        export_seconds = time.perf_counter() - start
+
+        target = DocumentProcessor(embeddings=model, persist_directory=os.path.join(directory, "target"),
+                                   metadata_registry=MetadataRegistry(os.path.join(directory, "target.json")))
+        start = time.perf_counter()
+        target.import_snapshot(snapshot)
+        import_seconds = time.perf_counter() - start
+
+        results[layout] = {
+            "fill_seconds": fill_seconds,
+            "export_seconds": export_seconds,
+            "import_seconds": import_seconds,
+            "export_chunks_per_second": n_chunks / export_seconds,
+            "import_chunks_per_second": n_chunks / import_seconds,
+            "snapshot_mb": directory_mb(snapshot),
+        }
+        print(f"{n_chunks:>9} chunks {layout:<16} fill {fill_seconds:7.1f}s  export {export_seconds:7.1f}s  "
+              f"import {import_seconds:7.1f}s ({results[layout]['import_chunks_per_second']:,.0f} chunks/s)  "
+              f"snapshot {results[layout]['snapshot_mb']:.0f} MB")
+        for processor in (source, target):
+            processor.vectorstore.delete_collection()
+        del source, target
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--docs", type=int, default=1000, help="Documents the chunks are spread over")
+    parser.add_argument("--dimensions", type=int, default=384, help="Embedding size (all-MiniLM-L6-v2: 384)")
+    parser.add_argument("--spread", type=float, default=0.6, help="Noise around each document's centre")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="Directory for the indexes and snapshots (default: a temporary directory)")
+    parser.add_argument("--output", help="Results JSON path (default: benchmarks/results/snapshot.json)")
+    parser.add_argument("--baseline", help="Earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="ra_bench_")
+    setup_offline_environment(workdir)
+    results = {f"chunks_{n_chunks}": bench_size(n_chunks, args, workdir) for n_chunks in args.sizes}
+    results["peak_rss_mb"] = peak_rss_mb()
+    path = write_results("snapshot", {key: value for key, value in vars(args).items()
+                                      if key not in ("output", "baseline", "workdir")}, results, args.output)
+    print(f"Results written to {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(path) as f:
+            current = json.load(f)
+        if report_comparison(compare_results(current, baseline, args.tolerance)):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
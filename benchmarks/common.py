@@ -0,0 +1,194 @@
+"""Shared helpers for the benchmarks: offline environment, embeddings, statistics and result files."""
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+def setup_offline_environment(workdir: str, llm_latency: float = 0.0, token_latency: float = 0.0,
+                              rate_limits: bool = False, coalescing: bool = False):
+    """Point every store at workdir and select the fake LLM backend.
+
+    Must run before research_assistant is imported, since its config is read at import.
+    The LLM rate limits are lifted unless `rate_limits` is set, so the benchmark measures
+    the pipeline rather than the Groq account's quota. Query coalescing is off unless
+    `coalescing` is set, so repeated queries are measured rather than served from the cache.
+    """
+    os.makedirs(workdir, exist_ok=True)
+    os.environ.update({
+        "LLM_BACKEND": "fake",
+        "FAKE_LLM_LATENCY": str(llm_latency),
+        "FAKE_LLM_TOKEN_LATENCY": str(token_latency),
+        "METADATA_REGISTRY_PATH": os.path.join(workdir, "document_metadata.json"),
+        "CHECKPOINT_DB_PATH": os.path.join(workdir, "checkpoints.db"),
+        "ARTIFACT_DIR": os.path.join(workdir, "artifacts"),
+        "TRACE_DIR": "",
+        "QUERY_COALESCING": "1" if coalescing else "0",
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+    })
+    if not rate_limits:
+        os.environ.update({"LLM_REQUESTS_PER_MINUTE": "1000000000", "LLM_TOKENS_PER_MINUTE": "1000000000",
+                           "LLM_MAX_CONCURRENCY": "64"})
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic bag-of-words embeddings (feature hashing), for runs without the HF model.
+
+    Texts sharing words get similar vectors, so retrieval results stay meaningful.
+    """
+    def __init__(self, dimensions: int = 384):
+        self.dimensions = dimensions
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for word in text.lower().split():
+            vector[zlib.crc32(word.encode("utf-8")) % self.dimensions] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+def make_embeddings(kind: str):
+    """`hf` for the production all-MiniLM-L6-v2 model, `hash` for offline HashingEmbeddings"""
+    if kind == "hash":
+        return HashingEmbeddings()
+    from langchain_huggingface.embeddings import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds"""
+    if not samples:
+        return {"count": 0}
+    values = np.asarray(samples, dtype=np.float64) * 1000.0
+    return {
+        "count": int(values.size),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p90_ms": float(np.percentile(values, 90)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+    }
+
+def rss_mb() -> float:
+    """Current resident set size in MB (Linux), falling back to the peak"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+def private_rss_mb() -> float:
+    """Resident memory not backed by files in MB (Linux): what other processes cannot share through
+    the page cache and the kernel cannot drop under pressure; 0 where /proc is unavailable"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("RssAnon:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    return 0.0
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def write_results(name: str, params: Dict[str, Any], results: Dict[str, Any], path: Optional[str] = None) -> str:
+    """Write a benchmark's results with enough context to compare runs; returns the path"""
+    path = path or os.path.join(RESULTS_DIR, f"{name}.json")
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    document = {
+        "benchmark": name,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "params": params,
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(document, f, indent=2)
+    return path
+
+def flatten(results: Any, prefix: str = "") -> Dict[str, float]:
+    """Numeric leaves of a results tree keyed by their dotted path"""
+    if isinstance(results, dict):
+        flat = {}
+        for key, value in results.items():
+            flat.update(flatten(value, f"{prefix}.{key}" if prefix else str(key)))
+        return flat
+    if isinstance(results, (int, float)) and not isinstance(results, bool):
+        return {prefix: float(results)}
+    return {}
+
+# Metric name fragments where larger values are better; every other timing/memory metric is "lower is better"
+HIGHER_IS_BETTER = ("per_second", "recall", "throughput")
+LOWER_IS_BETTER = ("_ms", "_mb", "seconds", "latency")
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.1) -> List[Dict[str, Any]]:
+    """Metrics that changed by more than `tolerance` (relative) in either direction"""
+    current_flat, baseline_flat = flatten(current["results"]), flatten(baseline["results"])
+    changes = []
+    for key, value in current_flat.items():
+        if key not in baseline_flat or key.endswith("count"):
+            continue
+        higher_better = any(fragment in key for fragment in HIGHER_IS_BETTER)
+        if not higher_better and not any(fragment in key for fragment in LOWER_IS_BETTER):
+            continue
+        before = baseline_flat[key]
+        if before == 0:
+            continue
+        change = (value - before) / abs(before)
+        if abs(change) <= tolerance:
+            continue
+        regression = change < 0 if higher_better else change > 0
+        changes.append({"metric": key, "baseline": before, "current": value, "change": change,
+                        "regression": regression})
+    return sorted(changes, key=lambda item: (not item["regression"], -abs(item["change"])))
+
+def report_comparison(changes: List[Dict[str, Any]]) -> bool:
+    """Print changes against the baseline; returns True if any metric regressed"""
+    if not changes:
+        print("No metric changed beyond the tolerance.")
+        return False
+    for item in changes:
+        label = "REGRESSION" if item["regression"] else "improved  "
+        print(f"{label} {item['metric']}: {item['baseline']:.4g} -> {item['current']:.4g} "
+              f"({item['change']:+.1%})")
+    return any(item["regression"] for item in changes)
+
+class Stopwatch:
+    """Context manager collecting elapsed seconds into a list"""
+    def __init__(self, samples: List[float]):
+        self.samples = samples
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.samples.append(time.perf_counter() - self.start)
+        return False
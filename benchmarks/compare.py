@@ -0,0 +1,27 @@
+"""Compare two benchmark result files and exit non-zero if any metric regressed.
+
+    python -m benchmarks.compare benchmarks/results/e2e.json benchmarks/results/e2e_baseline.json
+"""
+import argparse
+import json
+import sys
+
+from .common import compare_results, report_comparison
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("current")
+    parser.add_argument("baseline")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Relative change to report (default 10%%)")
+    args = parser.parse_args(argv)
+
+    with open(args.current) as f:
+        current = json.load(f)
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if current.get("benchmark") != baseline.get("benchmark"):
+        parser.error(f"cannot compare {current.get('benchmark')} results with {baseline.get('benchmark')} results")
+    return 1 if report_comparison(compare_results(current, baseline, args.tolerance)) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,284 @@
+"""Concurrent-user load test: N simulated users ingesting papers and running queries at once.
+
+Each user is a thread with its own event loop, as a Streamlit session is. Users share
+one ResearchAssistant by default (--per-user-assistant gives each its own, like separate
+Streamlit sessions) and use the fake LLM with injected latency. Reports throughput,
+latency percentiles per operation, resident memory growth, and contention on the
+embedding model and the Chroma client (concurrent calls and latency inflation over a
+single-user warm-up).
+
+    python -m benchmarks.load_test --users 8 --duration 60 --mix answer_question=5 summarize=2 compare_papers=1
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+from .common import (setup_offline_environment, make_embeddings, percentiles, rss_mb, peak_rss_mb,
+                     write_results, compare_results, report_comparison)
+from .synthetic import make_pdfs, topic_query, TOPIC_WORDS
+
+class ContentionProbe:
+    """Wraps methods of a shared resource to record call durations and how many calls overlap"""
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.overlapping_calls = 0
+        self.durations: List[float] = []
+
+    def wrap(self, target, method: str):
+        original = getattr(target, method)
+
+        def probed(*args, **kwargs):
+            with self._lock:
+                if self.in_flight:
+                    self.overlapping_calls += 1
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                duration = time.perf_counter() - start
+                with self._lock:
+                    self.in_flight -= 1
+                    self.durations.append(duration)
+        setattr(target, method, probed)
+
+    def reset(self):
+        with self._lock:
+            self.max_in_flight = self.overlapping_calls = 0
+            self.durations = []
+
+    def report(self, baseline: Dict[str, float]) -> Dict:
+        with self._lock:
+            durations = list(self.durations)
+            summary = {
+                "calls": len(durations),
+                "max_in_flight": self.max_in_flight,
+                "overlapping_call_ratio": self.overlapping_calls / len(durations) if durations else 0.0,
+                "latency": percentiles(durations),
+            }
+        if durations and baseline.get("p50_ms"):
+            # How much slower a call gets under load than when it runs alone
+            summary["p50_inflation"] = summary["latency"]["p50_ms"] / baseline["p50_ms"]
+        return summary
+
+def instrument(processor, probes: Dict[str, ContentionProbe]):
+    probes["embedding_model"].wrap(processor.embeddings, "embed_documents")
+    probes["embedding_model"].wrap(processor.embeddings, "embed_query")
+    probes["chroma"].wrap(processor.vectorstore, "similarity_search")
+    probes["chroma"].wrap(processor, "_upsert")
+
+class RssSampler(threading.Thread):
+    """Samples resident memory in the background"""
+    def __init__(self, interval: float = 0.5):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = []
+        self._stopped = threading.Event()
+
+    def run(self):
+        start = time.perf_counter()
+        while not self._stopped.wait(self.interval):
+            self.samples.append((time.perf_counter() - start, rss_mb()))
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+def parse_mix(items: List[str]) -> Dict[str, float]:
+    from research_assistant.models.query import QueryType
+
+    mix = {}
+    for item in items:
+        name, _, weight = item.partition("=")
+        mix[QueryType(name).value] = float(weight or 1)
+    return mix
+
+class User:
+    """A simulated user: ingests papers and runs queries against the assistant until the deadline"""
+    def __init__(self, index: int, assistant, papers, shared_documents, args, mix, latencies, errors, lock):
+        self.index = index
+        self.assistant = assistant
+        self.papers = papers
+        self.shared_documents = shared_documents
+        self.args = args
+        self.mix = mix
+        self.latencies = latencies
+        self.errors = errors
+        self.lock = lock
+        self.rng = random.Random(args.seed + index)
+
+    def record(self, operation: str, duration: float):
+        with self.lock:
+            self.latencies[operation].append(duration)
+
+    def ingest(self):
+        path, topic = self.rng.choice(self.papers)
+        start = time.perf_counter()
+        document_id = self.assistant.process_paper(path)
+        self.record("ingest", time.perf_counter() - start)
+        with self.lock:
+            self.shared_documents.append((document_id, topic))
+
+    async def query(self):
+        with self.lock:
+            documents = list(self.shared_documents)
+        query_type = self.rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+        picked = self.rng.sample(documents, min(len(documents), self.rng.randint(2, 3)))
+        topic = picked[0][1]
+        start = time.perf_counter()
+        await self.assistant.run(f"What do these papers report about {topic_query(self.rng, topic, 2)}?",
+                                 query_type, [document_id for document_id, _ in picked], {})
+        self.record(query_type, time.perf_counter() - start)
+
+    def run(self, deadline: float):
+        loop = asyncio.new_event_loop()
+        try:
+            while time.perf_counter() < deadline:
+                try:
+                    with self.lock:
+                        enough_documents = len(self.shared_documents) >= 2
+                    if not enough_documents or self.rng.random() < self.args.ingest_ratio:
+                        self.ingest()
+                    else:
+                        loop.run_until_complete(self.query())
+                except Exception as e:
+                    with self.lock:
+                        self.errors[type(e).__name__] += 1
+                time.sleep(self.rng.uniform(0, 2 * self.args.think_time))
+        finally:
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+
+def warm_up(assistant, papers, probes, rng) -> Dict[str, Dict[str, float]]:
+    """Single-user ingest and retrieval, to get uncontended latencies for each shared resource"""
+    document_ids = [assistant.process_paper(path) for path, _ in papers[:2]]
+    for _ in range(20):
+        assistant.doc_processor.retrieve_relevant_chunks(
+            topic_query(rng, rng.choice(list(TOPIC_WORDS))), rng.sample(document_ids, 1), 5)
+    baseline = {name: probe.report({})["latency"] for name, probe in probes.items()}
+    for probe in probes.values():
+        probe.reset()
+    return baseline
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds of load")
+    parser.add_argument("--mix", nargs="+", default=["answer_question=5", "summarize=2", "extract_info=1",
+                                                     "compare_papers=1", "generate_citation=1"],
+                        help="query_type=weight pairs")
+    parser.add_argument("--ingest-ratio", type=float, default=0.1, help="Share of actions that ingest a paper")
+    parser.add_argument("--think-time", type=float, default=0.5, help="Mean seconds between a user's actions")
+    parser.add_argument("--pages", type=int, default=5, help="Pages per synthetic paper")
+    parser.add_argument("--papers", type=int, default=16, help="Distinct synthetic papers users upload")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Fake LLM seconds per call")
+    parser.add_argument("--token-latency", type=float, default=0.005, help="Fake LLM seconds per streamed token")
+    parser.add_argument("--rate-limits", action="store_true", help="Keep the configured LLM rate limits")
+    parser.add_argument("--coalescing", action="store_true",
+                        help="Let identical concurrent queries share one run (and the result cache)")
+    parser.add_argument("--per-user-assistant", action="store_true",
+                        help="One ResearchAssistant per user (separate Streamlit sessions) instead of a shared one")
+    parser.add_argument("--embeddings", choices=["hash", "hf"], default="hash")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="Directory for the stores (default: a temporary directory)")
+    parser.add_argument("--output", help="Results JSON path (default: benchmarks/results/load_test.json)")
+    parser.add_argument("--baseline", help="Earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="ra_load_")
+    setup_offline_environment(workdir, args.llm_latency, args.token_latency, args.rate_limits, args.coalescing)
+    from research_assistant.app import ResearchAssistant
+    from research_assistant.processors.document_processor import DocumentProcessor
+
+    mix = parse_mix(args.mix)
+    papers = make_pdfs(f"{workdir}/pdfs", args.papers, args.pages, seed=args.seed)
+    probes = {"embedding_model": ContentionProbe("embedding_model"), "chroma": ContentionProbe("chroma")}
+
+    def new_assistant():
+        processor = DocumentProcessor(embeddings=make_embeddings(args.embeddings), persist_directory=f"{workdir}/chroma")
+        instrument(processor, probes)
+        return ResearchAssistant(doc_processor=processor)
+
+    rss_start = rss_mb()
+    shared = new_assistant()
+    assistants = [new_assistant() if args.per_user_assistant and i else shared for i in range(args.users)]
+    uncontended = warm_up(shared, papers, probes, random.Random(args.seed))
+
+    latencies, errors, lock = defaultdict(list), defaultdict(int), threading.Lock()
+    shared_documents = []
+    users = [User(i, assistants[i], papers, shared_documents, args, mix, latencies, errors, lock)
+             for i in range(args.users)]
+    sampler = RssSampler()
+    sampler.start()
+    rss_before_load = rss_mb()
+    start = time.perf_counter()
+    deadline = start + args.duration
+    threads = [threading.Thread(target=user.run, args=(deadline,), name=f"user-{user.index}") for user in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    sampler.stop()
+
+    operations = sum(len(samples) for samples in latencies.values())
+    queries = operations - len(latencies.get("ingest", []))
+    rss_samples = [rss for _, rss in sampler.samples] or [rss_mb()]
+    results = {
+        "elapsed_seconds": elapsed,
+        "throughput": {
+            "operations_per_second": operations / elapsed,
+            "queries_per_second": queries / elapsed,
+            "ingests_per_second": len(latencies.get("ingest", [])) / elapsed,
+        },
+        "latency": {operation: percentiles(samples) for operation, samples in sorted(latencies.items())},
+        "errors": dict(errors),
+        "memory": {
+            "rss_start_mb": rss_start,
+            "rss_before_load_mb": rss_before_load,
+            "rss_end_mb": rss_samples[-1],
+            "rss_peak_mb": max(rss_samples),
+            "rss_growth_mb": rss_samples[-1] - rss_before_load,
+            "peak_rss_mb": peak_rss_mb(),
+        },
+        "contention": {name: probe.report(uncontended[name]) for name, probe in probes.items()},
+        "llm": shared.tools.llm_metrics(),
+        "embedding_batching": shared.doc_processor.embedding_metrics(),
+        "coalescing": shared.single_flight.stats() if shared.single_flight else {},
+    }
+    path = write_results("load_test", {key: value for key, value in vars(args).items()
+                                       if key not in ("output", "baseline", "workdir")}, results, args.output)
+
+    print(f"{args.users} users, {elapsed:.0f}s: {operations / elapsed:.2f} ops/s ({queries / elapsed:.2f} queries/s), "
+          f"errors {dict(errors) or 'none'}")
+    for operation, summary in results["latency"].items():
+        print(f"  {operation:<18} n={summary['count']:<5} p50 {summary['p50_ms']:8.0f} ms  p99 {summary['p99_ms']:8.0f} ms")
+    print(f"  RSS {rss_before_load:.0f} MB -> {rss_samples[-1]:.0f} MB (peak {max(rss_samples):.0f} MB)")
+    for name, summary in results["contention"].items():
+        print(f"  {name:<16} calls {summary['calls']:<6} max in flight {summary['max_in_flight']:<3} "
+              f"overlapping {summary['overlapping_call_ratio']:.0%}  p50 x{summary.get('p50_inflation', 0):.2f} vs alone")
+    print(f"Results written to {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(path) as f:
+            current = json.load(f)
+        if report_comparison(compare_results(current, baseline, args.tolerance)):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
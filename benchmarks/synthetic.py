@@ -0,0 +1,126 @@
+"""Synthetic papers and chunk corpora for the benchmarks.
+
+Texts are drawn from per-topic vocabularies, so a query built from a document's topic
+words has a meaningful set of relevant chunks.
+"""
+import os
+import random
+from typing import Dict, List, Tuple
+
+COMMON_WORDS = (
+    "the of and to in we a is that for this with on are by as an be our from results method "
+    "model approach data show proposed using which these paper study performance section table "
+    "figure experiments evaluation baseline compared analysis work based set than used can"
+).split()
+
+TOPIC_WORDS = {
+    "vision": "image convolutional pixel segmentation detection resnet augmentation imagenet object visual".split(),
+    "language": "token transformer attention language corpus translation embedding bert sentence vocabulary".split(),
+    "graphs": "graph node edge message passing neighbourhood adjacency spectral molecule gnn".split(),
+    "reinforcement": "policy reward agent environment episode q-learning actor critic exploration trajectory".split(),
+    "optimization": "gradient convergence stochastic learning-rate momentum loss adam regularization convex step".split(),
+    "speech": "audio acoustic speech spectrogram phoneme speaker recognition waveform asr prosody".split(),
+    "retrieval": "index query ranking recall dense sparse bm25 passage retrieval relevance".split(),
+    "biology": "protein sequence gene cell expression folding genome assay mutation structure".split(),
+}
+
+def topic_of(index: int) -> str:
+    return list(TOPIC_WORDS)[index % len(TOPIC_WORDS)]
+
+def synthetic_text(rng: random.Random, topic: str, n_words: int, topic_ratio: float = 0.3) -> str:
+    words = [rng.choice(TOPIC_WORDS[topic]) if rng.random() < topic_ratio else rng.choice(COMMON_WORDS)
+             for _ in range(n_words)]
+    sentences, start = [], 0
+    while start < len(words):
+        length = rng.randint(8, 20)
+        sentence = " ".join(words[start:start + length])
+        sentences.append(sentence[:1].upper() + sentence[1:] + ".")
+        start += length
+    return " ".join(sentences)
+
+def topic_query(rng: random.Random, topic: str, n_words: int = 4) -> str:
+    return " ".join(rng.sample(TOPIC_WORDS[topic], n_words))
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def _wrap(text: str, width: int) -> List[str]:
+    lines, line = [], ""
+    for word in text.split():
+        if line and len(line) + 1 + len(word) > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    if line:
+        lines.append(line)
+    return lines
+
+def write_pdf(path: str, pages: List[str], title: str = "", author: str = ""):
+    """Write a minimal text PDF (Helvetica, one content stream per page) readable by pypdf"""
+    objects: List[bytes] = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    catalog = add(b"")  # Filled in once the page tree exists
+    pages_id = add(b"")
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    page_ids = []
+    for text in pages:
+        lines = _wrap(text, 95)[:60]
+        stream = "BT /F1 10 Tf 12 TL 40 760 Td " + " ".join(f"({_pdf_escape(line)}) Tj T*" for line in lines) + " ET"
+        data = stream.encode("latin-1", "replace")
+        contents = add(b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream")
+        page_ids.append(add(b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] "
+                            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>"
+                            % (pages_id, font, contents)))
+    objects[catalog - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id
+    objects[pages_id - 1] = (b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % i for i in page_ids)
+                             + b"] /Count %d >>" % len(page_ids))
+    info = add(b"<< /Title (" + _pdf_escape(title).encode("latin-1", "replace") + b") /Author ("
+               + _pdf_escape(author).encode("latin-1", "replace") + b") /CreationDate (D:20240101000000) >>")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, catalog, info, xref)
+    with open(path, "wb") as f:
+        f.write(bytes(out))
+
+def make_pdfs(directory: str, n_docs: int, pages_per_doc: int, words_per_page: int = 450,
+              seed: int = 0) -> List[Tuple[str, str]]:
+    """Write synthetic papers; returns (path, topic) for each"""
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    papers = []
+    for i in range(n_docs):
+        topic = topic_of(i)
+        path = os.path.join(directory, f"paper_{pages_per_doc}p_{i}.pdf")
+        pages = [synthetic_text(rng, topic, words_per_page) for _ in range(pages_per_doc)]
+        write_pdf(path, pages, title=f"A Study of {topic.title()} Methods {i}", author="Ada Lovelace; Alan Turing")
+        papers.append((path, topic))
+    return papers
+
+def synthetic_chunks(n_chunks: int, n_docs: int, words_per_chunk: int = 150,
+                     seed: int = 0) -> List[Dict[str, str]]:
+    """Chunk corpus spread evenly over n_docs documents, with the metadata the processor stores"""
+    rng = random.Random(seed)
+    chunks = []
+    for i in range(n_chunks):
+        doc_index = i % n_docs
+        document_id = f"synthetic_doc_{doc_index}"
+        chunks.append({
+            "text": synthetic_text(rng, topic_of(doc_index), words_per_chunk),
+            "document_id": document_id,
+            "chunk_id": f"{document_id}_chunk_{i // n_docs}",
+            "topic": topic_of(doc_index),
+        })
+    return chunks
@@ -1,19 +1,33 @@
-from typing import List, Dict, Any, Optional
 import os
 import asyncio
+import time
+import uuid
 
-from .models.query import QueryType, AgentQuery
+from .models.query import QueryType
 from .models.agent import AgentState
+from .models.events import EventType
 from .processors.document_processor import DocumentProcessor
+from .processors.ingest_jobs import IngestJobQueue
 from .tools.agent_tools import AgentTools
+from .utils.progress import ProgressReporter, report_progress
+from .utils.checkpoint import CheckpointStore, checkpoint_run, COMPLETED, FAILED
+from .utils.tracing import Tracer, trace_run, export_trace
+from .utils.single_flight import SingleFlight, query_key
+from . import config
 from .graph.workflow import setup_graph
-from langchain_core.messages import SystemMessage, HumanMessage
+from .graph.router import resume_state
 
 class ResearchAssistant:
-    def __init__(self):
-        self.doc_processor = DocumentProcessor()
-        self.tools = AgentTools(self.doc_processor)
-        # self.graph = setup_graph(self.tools)
+    def __init__(self, llm=None, doc_processor=None):
+        self.doc_processor = doc_processor if doc_processor is not None else DocumentProcessor()
+        self.tools = AgentTools(self.doc_processor, llm=llm)
+        self.graph = setup_graph(self.tools)
+        self.checkpoints = CheckpointStore()
+        self.ingest_jobs = IngestJobQueue(self.process_paper)
+        # Identical concurrent queries run once; results are kept for QUERY_CACHE_TTL seconds
+        self.single_flight = SingleFlight() if config.QUERY_COALESCING else None
+        self._last_collection = time.monotonic()
+        self.collect_garbage()
     
     def process_paper(self, file_path_or_id):
         """Process a paper from file or arXiv ID"""
@@ -26,30 +40,150 @@ class ResearchAssistant:
         else:
             raise ValueError("Unsupported document format or ID")
     
-    async def run(self, query_text, query_type, document_ids=None, options=None):
-        """Run the research assistant on a query"""
-        # Create the query object
-        query = {
-            'query_type': query_type,
-            'query_text': query_text,
-            'document_ids': document_ids,
-            'options': options
-        }
-        
-        # Create initial state
-        state = AgentState(
-            query=query,
-            messages=[{'type': 'human', 'content': query_text}]
-        )
-        
-        # Direct function call workflow
-        from .graph import nodes
-        state = nodes.process_documents(state, self.tools)["state"]
-        state = nodes.retrieve_information(state, self.tools)["state"]
-        state = nodes.generate_summary(state, self.tools)["state"]
-        state = nodes.provide_final_answer(state, self.tools)["state"]
+    def submit_paper(self, file_path_or_id, display_name=None, temp_file=False):
+        """Process a paper in the background; returns a job ID to poll with `ingest_jobs.get`"""
+        return self.ingest_jobs.submit(file_path_or_id, display_name, temp_file)
+    
+    def compact_index(self):
+        """Vacuum the index in the background (see DocumentProcessor.vacuum); returns a job ID"""
+        return self.ingest_jobs.submit("index compaction", task=self.doc_processor.vacuum)
+    
+    def collect_garbage(self):
+        """Prune expired checkpointed runs, then delete the artifacts no remaining run refers to"""
+        self._last_collection = time.monotonic()
+        self.checkpoints.prune()
+        self.tools.artifacts.sweep(self.checkpoints.artifact_ids())
+    
+    async def stream(self, query_text, query_type, document_ids=None, options=None, run_id=None):
+        """Run the research assistant on a query, yielding progress and answer events as they happen.
+
+        Runs are checkpointed under `run_id` (a new one if not given). Passing the ID of an
+        interrupted or failed run resumes it from its last checkpoint instead of starting over.
+        A new query identical to one already running (or finished within QUERY_CACHE_TTL)
+        waits for that run and gets its result as a single FINAL event.
+        """
+        run_id = run_id or uuid.uuid4().hex
+        saved = self.checkpoints.load_state(run_id)
+        flight = None
+        if saved is None and self.single_flight is not None:
+            key = query_key(query_type, query_text, document_ids, options,
+                            self.doc_processor.corpus_version)
+            shared, future = await self._join_flight(key)
+            if shared is not None:
+                reporter = ProgressReporter(lambda event: None)
+                yield reporter.emit(EventType.FINAL, state=shared.model_copy(deep=True), run_id=run_id,
+                                    coalesced=True, **shared.metrics)
+                return
+            flight = (key, future)
+        if saved is not None:
+            status, state = saved
+            if status != COMPLETED:
+                state = resume_state(state)
+        else:
+            status = None
+            # Create the query object
+            query = {
+                'query_type': query_type,
+                'query_text': query_text,
+                'document_ids': document_ids,
+                'options': options
+            }
+            
+            # Create initial state
+            state = AgentState(
+                query=query,
+                messages=[{'type': 'human', 'content': query_text}]
+            )
+
+        # Events are produced on worker threads as well as the event loop
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+        reporter = ProgressReporter(lambda event: loop.call_soon_threadsafe(events.put_nowait, event))
+
+        async def execute():
+            try:
+                with report_progress(reporter):
+                    if status == COMPLETED:
+                        # Nothing left to do, replay the finished run's result
+                        reporter.emit(EventType.FINAL, state=state, run_id=run_id, **state.metrics)
+                    else:
+                        result = await self._execute(state, reporter, run_id)
+                        if flight:
+                            # Failed runs are shared with the current waiters but not cached
+                            self.single_flight.publish(*flight, result=result, cache=not result.error)
+            except asyncio.CancelledError:
+                if flight:
+                    self.single_flight.abandon(*flight)
+                raise
+            except Exception as e:
+                if flight:
+                    self.single_flight.publish(*flight, error=e)
+                raise
+            finally:
+                loop.call_soon_threadsafe(events.put_nowait, None)
+
+        task = asyncio.create_task(execute())
+        try:
+            while True:
+                event = await events.get()
+                if event is None:
+                    break
+                yield event
+            # Surface any error raised by the workflow
+            await task
+        finally:
+            task.cancel()
+
+    async def _execute(self, state, reporter, run_id):
+        """Run the workflow graph on the state, checkpointing and tracing as it goes, then report the final state"""
+        tracer = Tracer()
+        try:
+            with checkpoint_run(self.checkpoints, run_id), trace_run(tracer):
+                result = await self.graph.ainvoke(state)
+        except Exception:
+            self.checkpoints.set_status(run_id, FAILED)
+            raise
+        finally:
+            trace = tracer.records()
+            if config.TRACE_DIR:
+                export_trace(trace, config.TRACE_DIR, run_id, max_runs=config.TRACE_MAX_RUNS)
+        state = AgentState.model_validate(result)
+
+        if reporter.first_token is not None:
+            state.metrics["time_to_first_token"] = reporter.first_token
+        state.metrics["total_latency"] = reporter.elapsed()
+        # A run whose nodes reported an error stays resumable
+        self.checkpoints.save_state(run_id, state, FAILED if state.error else COMPLETED)
+        reporter.emit(EventType.FINAL, state=state, run_id=run_id, trace=trace, **state.metrics)
+        if time.monotonic() - self._last_collection >= config.ARTIFACT_SWEEP_INTERVAL:
+            await asyncio.to_thread(self.collect_garbage)
         return state
 
+    async def _join_flight(self, key):
+        """(state, None) if an identical run is in flight or cached, else (None, future) for this call to run it"""
+        while True:
+            leader, future = self.single_flight.claim(key)
+            if leader:
+                return None, future
+            try:
+                # Shielded so a waiter giving up does not cancel the run for everyone else
+                return await asyncio.shield(asyncio.wrap_future(future)), None
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The leader was cancelled before finishing; run it here or join a new leader
+
+    async def run(self, query_text, query_type, document_ids=None, options=None, run_id=None):
+        """Run the research assistant on a query (resuming the run `run_id` if it was interrupted)"""
+        events = self.stream(query_text, query_type, document_ids, options, run_id)
+        try:
+            async for event in events:
+                if event.type == EventType.FINAL:
+                    return event.state
+        finally:
+            # Finish the stream here rather than leaving it to the event loop's cleanup
+            await events.aclose()
+
 
 # Example usage
 async def example():
@@ -0,0 +1,237 @@
+"""Batch runner: reads jobs from a JSONL file, runs them with bounded concurrency and appends results to a JSONL file.
+
+    python -m research_assistant.batch jobs.jsonl --output results.jsonl --concurrency 4
+
+Each line of the jobs file is one job with a unique "job_id", either a tool call on a
+single paper or a full research assistant query:
+
+    {"job_id": "p1-summary", "tool": "summarize", "source": "papers/p1.pdf", "args": {"length": "short"}}
+    {"job_id": "p1-claims", "tool": "claims", "document_id": "arxiv_1706_03762"}
+    {"job_id": "q1", "query_type": "compare_papers", "query_text": "...", "document_ids": ["...", "..."]}
+
+Tools: summarize, methodology, claims, citation, compare, answer, literature_review.
+"source" (a PDF path or arXiv ID) is ingested once and used as the document ID; a source
+already in the index (the same PDF contents or arXiv paper) is not ingested again. Jobs
+already completed in the output file are skipped, so an interrupted batch resumes where
+it stopped. LLM calls run at batch priority, behind interactive users.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from typing import Any, Dict, List
+
+from . import config
+from .models.query import QueryType
+from .utils.llm_utils import llm_priority, Priority
+
+logger = logging.getLogger(__name__)
+
+COMPLETED = "completed"
+FAILED = "failed"
+
+# Tool name -> (AgentTools method, takes a list of documents rather than one)
+TOOLS = {
+    "summarize": ("summarize_document", False),
+    "methodology": ("extract_methodology", False),
+    "claims": ("extract_claims", False),
+    "citation": ("generate_citation", False),
+    "compare": ("compare_documents", True),
+    "answer": ("answer_question", True),
+    "literature_review": ("generate_literature_review", True),
+}
+
+def load_jobs(path: str) -> List[Dict[str, Any]]:
+    """Jobs from a JSONL file; each needs a unique job_id and either a known tool or a query_type"""
+    jobs, seen = [], set()
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            job = json.loads(line)
+            job_id = job.get("job_id")
+            if not job_id:
+                raise ValueError(f"{path}:{line_number}: job has no job_id")
+            if job_id in seen:
+                raise ValueError(f"{path}:{line_number}: duplicate job_id {job_id!r}")
+            if "tool" in job:
+                if job["tool"] not in TOOLS:
+                    raise ValueError(f"{path}:{line_number}: unknown tool {job['tool']!r}")
+            elif "query_type" in job:
+                QueryType(job["query_type"])
+            else:
+                raise ValueError(f"{path}:{line_number}: job needs a 'tool' or a 'query_type'")
+            seen.add(job_id)
+            jobs.append(job)
+    return jobs
+
+def load_completed(path: str) -> Dict[str, Dict[str, Any]]:
+    """Completed results already in the output file, by job ID (a torn last line is ignored)"""
+    completed = {}
+    if not os.path.exists(path):
+        return completed
+    with open(path) as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if result.get("status") == COMPLETED:
+                completed[result["job_id"]] = result
+    return completed
+
+def to_json(value):
+    """Tool results (pydantic models, lists of them or strings) as plain JSON values"""
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    if isinstance(value, list):
+        return [to_json(item) for item in value]
+    return value
+
+class Progress:
+    """Completed/failed counts with throughput and ETA for the jobs run in this session"""
+    def __init__(self, total: int, skipped: int, interval: float):
+        self.total = total
+        self.skipped = skipped
+        self.interval = interval
+        self.completed = 0
+        self.failed = 0
+        self.start = time.perf_counter()
+        self._last_report = 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.start
+        done = self.completed + self.failed
+        rate = done / elapsed if elapsed > 0 else 0.0
+        remaining = self.total - self.skipped - done
+        return {
+            "completed": self.completed,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "remaining": remaining,
+            "elapsed": elapsed,
+            "jobs_per_minute": rate * 60,
+            "eta_seconds": remaining / rate if rate else None,
+        }
+
+    def report(self, force: bool = False):
+        now = time.perf_counter()
+        if not force and now - self._last_report < self.interval:
+            return
+        self._last_report = now
+        stats = self.snapshot()
+        eta = f"{stats['eta_seconds'] / 60:.1f} min" if stats["eta_seconds"] is not None else "unknown"
+        print(f"[{self.total - stats['remaining']}/{self.total}] {stats['completed']} completed, "
+              f"{stats['failed']} failed, {stats['skipped']} skipped | {stats['jobs_per_minute']:.1f} jobs/min | "
+              f"ETA {eta}", file=sys.stderr, flush=True)
+
+class BatchRunner:
+    """Runs batch jobs against one ResearchAssistant, appending each result to the output as it finishes"""
+    def __init__(self, assistant, output_path: str, concurrency: int = config.LLM_MAX_CONCURRENCY,
+                 report_interval: float = 10.0):
+        self.assistant = assistant
+        self.output_path = output_path
+        self.concurrency = concurrency
+        self.report_interval = report_interval
+        self._documents: Dict[str, asyncio.Future] = {}  # Source -> document ID future
+
+    def _ingest(self, source: str) -> str:
+        """Document ID of a source, ingesting it only if the index does not hold it yet"""
+        document_id = self.assistant.doc_processor.find_document(source)
+        if document_id is not None:
+            logger.info("Source %s is already indexed", source, extra={"document_id": document_id})
+            return document_id
+        return self.assistant.process_paper(source)
+
+    async def _document_id(self, source: str) -> str:
+        """Ingest a source once, however many jobs refer to it"""
+        if source not in self._documents:
+            self._documents[source] = asyncio.ensure_future(asyncio.to_thread(self._ingest, source))
+        return await self._documents[source]
+
+    async def _execute(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        document_ids = list(job.get("document_ids") or [])
+        if job.get("document_id"):
+            document_ids.insert(0, job["document_id"])
+        if job.get("source"):
+            document_ids.insert(0, await self._document_id(job["source"]))
+        output = {"document_ids": document_ids}
+
+        if "tool" in job:
+            method, multiple = TOOLS[job["tool"]]
+            args = dict(job.get("args") or {})
+            if job["tool"] == "answer":
+                args["question"] = job.get("query_text", args.get("question"))
+            target = {"document_ids": document_ids} if multiple else {"document_id": document_ids[0]}
+            result = await asyncio.to_thread(getattr(self.assistant.tools, method), **target, **args)
+            output["result"] = to_json(result)
+        else:
+            # Checkpointed under the job ID, so a job interrupted mid-run resumes its finished steps
+            state = await self.assistant.run(job.get("query_text", ""), job["query_type"], document_ids,
+                                             job.get("options") or {}, run_id=f"batch_{job['job_id']}")
+            if state.error:
+                raise RuntimeError(state.error)
+            output["result"] = state.final_answer
+        return output
+
+    async def _run_job(self, job: Dict[str, Any], semaphore: asyncio.Semaphore, out, progress: Progress):
+        async with semaphore:
+            start = time.perf_counter()
+            record = {"job_id": job["job_id"], "source": job.get("source")}
+            try:
+                with llm_priority(Priority.BATCH):
+                    record.update(await self._execute(job))
+                record["status"] = COMPLETED
+                progress.completed += 1
+            except Exception as e:
+                logger.error("Batch job %s failed: %s", job["job_id"], e, extra={"job_id": job["job_id"]})
+                record.update(status=FAILED, error=f"{type(e).__name__}: {e}")
+                progress.failed += 1
+            record["duration"] = time.perf_counter() - start
+            # One line per job as soon as it finishes; a crash loses at most the jobs in flight
+            out.write(json.dumps(record, default=str) + "\n")
+            out.flush()
+            progress.report()
+
+    async def run(self, jobs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        completed = load_completed(self.output_path)
+        pending = [job for job in jobs if job["job_id"] not in completed]
+        progress = Progress(len(jobs), len(jobs) - len(pending), self.report_interval)
+        progress.report(force=True)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        directory = os.path.dirname(self.output_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.output_path, "a+") as out:
+            # Terminate a line torn by an interrupted write, so the next result starts on its own line
+            if out.tell() > 0:
+                out.seek(out.tell() - 1)
+                if out.read(1) != "\n":
+                    out.write("\n")
+            await asyncio.gather(*(self._run_job(job, semaphore, out, progress) for job in pending))
+        progress.report(force=True)
+        return progress.snapshot()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("jobs", help="JSONL file of jobs")
+    parser.add_argument("--output", required=True, help="JSONL file results are appended to (and resumed from)")
+    parser.add_argument("--concurrency", type=int, default=config.LLM_MAX_CONCURRENCY,
+                        help="Jobs running at once (LLM calls are still held to the configured rate limits)")
+    parser.add_argument("--report-interval", type=float, default=10.0, help="Seconds between progress lines")
+    args = parser.parse_args(argv)
+
+    config.init_environment()
+    from .app import ResearchAssistant
+
+    jobs = load_jobs(args.jobs)
+    runner = BatchRunner(ResearchAssistant(), args.output, args.concurrency, args.report_interval)
+    stats = asyncio.run(runner.run(jobs))
+    return 1 if stats["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
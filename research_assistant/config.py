@@ -5,6 +5,35 @@ load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 HF_TOKEN = os.getenv("HF_TOKEN")
 DEFAULT_MODEL= "llama-3.3-70b-versatile"
+FAST_MODEL = "llama-3.1-8b-instant"
+
+# Model used by each tier: a small low-latency model for control and formatting
+# steps, the large model for everything the user reads
+MODEL_TIERS = {
+    "fast": os.getenv("FAST_MODEL", FAST_MODEL),
+    "large": os.getenv("LARGE_MODEL", DEFAULT_MODEL),
+}
+
+# Tier each LLM task runs on (tasks not listed use the large model)
+TASK_MODEL_TIERS = {
+    "route": "fast",
+    "extract_references": "fast",
+    "structure": "fast",
+    "summarize": "large",
+    "extract": "large",
+    "compare": "large",
+    "citation": "large",
+    "answer": "large",
+    "literature_review": "large",
+    "final_answer": "large",
+}
+
+# LLM backend: "groq", "fake" (offline, scripted), "record" or "replay" (cassette file)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "groq")
+LLM_CASSETTE_PATH = os.getenv("LLM_CASSETTE_PATH", "cassettes/llm.json")
+FAKE_LLM_SCRIPT = os.getenv("FAKE_LLM_SCRIPT")
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0.0"))
+FAKE_LLM_TOKEN_LATENCY = float(os.getenv("FAKE_LLM_TOKEN_LATENCY", "0.0"))
 
 
 
@@ -12,9 +41,88 @@ CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
 DEFAULT_RETRIEVAL_K = 3
 
+# Background ingest workers (Streamlit "Process PDF") and chunks embedded per vector store batch
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "64"))
+
+# Compacting the index (vacuum) only rebuilds it once this fraction of its rows are deleted chunks
+VACUUM_DEAD_FRACTION = float(os.getenv("VACUUM_DEAD_FRACTION", "0.2"))
+
+# Embedding requests from all ingests and queries are encoded together in micro-batches of up to
+# EMBEDDING_BATCH_MAX_SIZE texts, waiting at most EMBEDDING_BATCH_MAX_WAIT_MS for a batch to fill
+EMBEDDING_BATCHING = os.getenv("EMBEDDING_BATCHING", "1") == "1"
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32"))
+EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "2"))
+
+# Search chunk embeddings in a memory-mapped, append-only file (shared by all processes through the
+# page cache) instead of Chroma's in-memory HNSW index; kept in <persist_directory>/embedding_store.
+# Chunk texts and metadata go to a SQLite table next to it, so Chroma holds no vectors and builds no HNSW index
+EMBEDDING_STORE = os.getenv("EMBEDDING_STORE", "0") == "1"
+# "int8": the store also keeps int8 codes of the vectors (a quarter of their size); searches scan the
+# codes and rescore the k * EMBEDDING_RESCORE_FACTOR best candidates with the float32 vectors.
+# Opening a quantized store with "none" drops its codes again
+EMBEDDING_QUANTIZATION = os.getenv("EMBEDDING_QUANTIZATION", "none")
+EMBEDDING_RESCORE_FACTOR = int(os.getenv("EMBEDDING_RESCORE_FACTOR", "10"))
+
+# Document metadata captured at ingest (used for citations)
+METADATA_REGISTRY_PATH = os.getenv("METADATA_REGISTRY_PATH", "chroma_db/document_metadata.json")
+
+# Checkpoints of workflow runs, so interrupted runs can be resumed
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", "checkpoints/runs.db")
+# Completed runs are deleted once not updated for this many hours (0 keeps them forever);
+# failed and interrupted runs are kept so they can be resumed
+CHECKPOINT_RETENTION_HOURS = float(os.getenv("CHECKPOINT_RETENTION_HOURS", "168"))
+# Large run artifacts (chunk texts, summaries, reviews) kept out of the agent state
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", "checkpoints/artifacts")
+# Artifacts no checkpointed run refers to are deleted at start-up and then at most every
+# ARTIFACT_SWEEP_INTERVAL seconds, once ARTIFACT_MIN_AGE seconds old (so runs in progress keep theirs)
+ARTIFACT_SWEEP_INTERVAL = float(os.getenv("ARTIFACT_SWEEP_INTERVAL", "3600"))
+ARTIFACT_MIN_AGE = float(os.getenv("ARTIFACT_MIN_AGE", "3600"))
+
+# Identical concurrent queries (same type, text, documents, options and corpus) run once;
+# their result is reused for QUERY_CACHE_TTL seconds after they finish
+QUERY_COALESCING = os.getenv("QUERY_COALESCING", "1") == "1"
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "60"))
+
+# Directory to write per-run traces to (JSONL and Chrome trace files); off by default. Only the
+# TRACE_MAX_RUNS most recent runs are kept. Runs always return their spans with the final event.
+TRACE_DIR = os.getenv("TRACE_DIR", "")
+TRACE_MAX_RUNS = int(os.getenv("TRACE_MAX_RUNS", "100"))
+
+# Logging: quiet by default; LOG_LEVEL=DEBUG for diagnostics, LOG_FORMAT=json for log pipelines
+LOG_LEVEL = os.getenv("LOG_LEVEL", "WARNING")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+
+# HTTP API server (python -m research_assistant.server)
+SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8080"))
+# Queries running and uploads being received at once; further requests wait up to SERVER_QUEUE_TIMEOUT
+# seconds, then get a 503 (ingests themselves run on the INGEST_WORKERS job queue)
+SERVER_MAX_CONCURRENT_QUERIES = int(os.getenv("SERVER_MAX_CONCURRENT_QUERIES", "8"))
+SERVER_MAX_CONCURRENT_INGESTS = int(os.getenv("SERVER_MAX_CONCURRENT_INGESTS", "2"))
+SERVER_QUEUE_TIMEOUT = float(os.getenv("SERVER_QUEUE_TIMEOUT", "5"))
+# Seconds a query may run before it gets a 504 (it stays checkpointed and can be resumed)
+SERVER_QUERY_TIMEOUT = float(os.getenv("SERVER_QUERY_TIMEOUT", "300"))
+SERVER_MAX_UPLOAD_MB = int(os.getenv("SERVER_MAX_UPLOAD_MB", "50"))
+
+# LLM scheduler limits (match the Groq account's rate limits)
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "30"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "12000"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_RETRY_BASE_DELAY = 1.0
+LLM_RETRY_MAX_DELAY = 60.0
+LLM_COMPLETION_TOKEN_ESTIMATE = 1024
+
 def init_environment():
     """Initialize environment varaible"""
-    os.environ["GROQ_API_KEY"] = GROQ_API_KEY
-    os.environ["HF_TOKEN"] = HF_TOKEN
+    # Keys are optional when running against the offline LLM backends
+    if GROQ_API_KEY:
+        os.environ["GROQ_API_KEY"] = GROQ_API_KEY
+    if HF_TOKEN:
+        os.environ["HF_TOKEN"] = HF_TOKEN
+
+    from .utils.logging_utils import configure_logging
+    configure_logging()
     
     
@@ -1,16 +1,16 @@
+import logging
+
 from ..models.agent import AgentState
+from ..models.events import EventType
 from ..tools.agent_tools import AgentTools
+from ..utils.progress import emit_progress
 from langchain_core.messages import AIMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.messages import SystemMessage, HumanMessage
 
-# Add this helper to all node functions
-def print_state_id(node_name, state):
-    print(f"DEBUG: state id at {node_name}: {id(state)}")
-
+logger = logging.getLogger(__name__)
 
 def process_documents(state: AgentState, tools: AgentTools):
-    print_state_id('process_documents', state)
     """Process documents mentioned in the query"""
     query = state.query
 
@@ -36,10 +36,10 @@ def process_documents(state: AgentState, tools: AgentTools):
             Format your response as a comma-separated list of identifiers."""),
             HumanMessage(content=query['query_text'])
         ])
-        doc_response = tools.llm.invoke(doc_prompt.format_messages(query=query))
+        doc_response = tools.invoke_llm(doc_prompt.format_messages(query=query), task="extract_references")
 
         # Parse potential document IDs (simplified)
-        potential_docs = [doc.strip() for doc in doc_response.content.split(",") if doc.strip()]
+        potential_docs = [doc.strip() for doc in doc_response.split(",") if doc.strip()]
 
         if potential_docs:
             # Simulate processing these documents
@@ -54,15 +54,12 @@ def process_documents(state: AgentState, tools: AgentTools):
         else:
             state.messages.append({'type': 'ai', 'content': "No document references found in the query."})
 
-    # Debug output
-    print("DEBUG: query.document_ids =", query['document_ids'])
-    print("DEBUG: state.documents =", state.documents)
+    logger.debug("Documents for the query: %s", query['document_ids'])
 
     # After processing documents, move to retrieve_information
     return {"state": state, "next": "retrieve_information"}
 
 def retrieve_information(state: AgentState, tools: AgentTools):
-    print_state_id('retrieve_information', state)
     """Retrieve relevant information from documents"""
     query = state.query
 
@@ -76,7 +73,7 @@ def retrieve_information(state: AgentState, tools: AgentTools):
     try:
         # Check if we already have retrieved chunks
         if "retrieved_chunks" in state.extracted_info and state.extracted_info["retrieved_chunks"]:
-            print("DEBUG: Already have retrieved chunks, moving to generate_summary")
+            logger.debug("Retrieved chunks already in the state, skipping retrieval")
             return {"state": state, "next": "generate_summary"}
 
         # Retrieve relevant chunks
@@ -95,8 +92,7 @@ def retrieve_information(state: AgentState, tools: AgentTools):
             }
             for chunk in chunks
         ]
-        state.extracted_info["retrieved_chunks"] = chunk_info
-        state.extracted_info = dict(state.extracted_info)
+        state.extracted_info["retrieved_chunks"] = tools.artifacts.put(chunk_info)
 
         # Add message about retrieval
         state.messages.append({'type': 'ai', 'content': f"Retrieved {len(chunks)} relevant chunks from documents: {', '.join(doc_ids)}"})
@@ -110,7 +106,6 @@ def retrieve_information(state: AgentState, tools: AgentTools):
         return {"state": state, "next": "route"}
 
 def generate_summary(state: AgentState, tools: AgentTools):
-    print_state_id('generate_summary', state)
     """Generate summaries for documents"""
     query = state.query
 
@@ -136,14 +131,15 @@ def generate_summary(state: AgentState, tools: AgentTools):
 
             summary = tools.summarize_document(doc_id, summary_type, length)
             summaries[doc_id] = {
-                "text": summary.summary_text,
+                "text": tools.artifacts.put(summary.summary_text),
                 "type": summary_type,
                 "length": length
             }
+            emit_progress(EventType.DOCUMENT_DONE, node="generate_summary", document_id=doc_id,
+                          completed=len(summaries), total=len(doc_ids))
 
         # Store the summaries
         state.extracted_info["summaries"] = summaries
-        state.extracted_info = dict(state.extracted_info)
 
         # Add message about summaries
         state.messages.append({'type': 'ai', 'content': f"Generated {summary_type} summaries for documents: {', '.join(doc_ids)}"})
@@ -155,7 +151,6 @@ def generate_summary(state: AgentState, tools: AgentTools):
     return {"state": state, "next": "route"}
 
 def extract_methodology(state: AgentState, tools: AgentTools):
-    print_state_id('extract_methodology', state)
     """Extract methodology information from documents"""
     query = state.query
 
@@ -178,10 +173,11 @@ def extract_methodology(state: AgentState, tools: AgentTools):
                 "evaluation_metrics": methodology.evaluation_metrics,
                 "limitations": methodology.limitations
             }
+            emit_progress(EventType.DOCUMENT_DONE, node="extract_methodology", document_id=doc_id,
+                          completed=len(methodologies), total=len(doc_ids))
 
         # Store the methodologies
         state.extracted_info["methodologies"] = methodologies
-        state.extracted_info = dict(state.extracted_info)
 
         # Add message about extraction
         state.messages.append({'type': 'ai', 'content': f"Extracted methodology information from documents: {', '.join(doc_ids)}"})
@@ -193,7 +189,6 @@ def extract_methodology(state: AgentState, tools: AgentTools):
     return {"state": state, "next": "route"}
 
 def extract_claims(state: AgentState, tools: AgentTools):
-    print_state_id('extract_claims', state)
     """Extract key claims from documents"""
     query = state.query
 
@@ -213,10 +208,11 @@ def extract_claims(state: AgentState, tools: AgentTools):
                 {"claim": claim.claim, "evidence": claim.evidence, "confidence": claim.confidence}
                 for claim in claims
             ]
+            emit_progress(EventType.DOCUMENT_DONE, node="extract_claims", document_id=doc_id,
+                          completed=len(all_claims), total=len(doc_ids))
 
         # Store the claims
         state.extracted_info["claims"] = all_claims
-        state.extracted_info = dict(state.extracted_info)
 
         # Add message about extraction
         state.messages.append({'type': 'ai', 'content': f"Extracted key claims from documents: {', '.join(doc_ids)}"})
@@ -253,7 +249,6 @@ def compare_documents(state: AgentState, tools: AgentTools):
             "methodology_comparison": comparison.methodology_comparison,
             "result_comparison": comparison.result_comparison
         }
-        state.extracted_info = dict(state.extracted_info)
 
         # Add message about comparison
         state.messages.append({'type': 'ai', 'content': f"Compared documents: {', '.join(doc_ids)}"})
@@ -289,10 +284,11 @@ def generate_citation(state: AgentState, tools: AgentTools):
                 "text": citation.citation_text,
                 "style": citation.style
             }
+            emit_progress(EventType.DOCUMENT_DONE, node="generate_citation", document_id=doc_id,
+                          completed=len(citations), total=len(doc_ids))
 
         # Store the citations
         state.extracted_info["citations"] = citations
-        state.extracted_info = dict(state.extracted_info)
 
         # Add message about citations
         state.messages.append({'type': 'ai', 'content': f"Generated {style} citations for documents: {', '.join(doc_ids)}"})
@@ -319,8 +315,7 @@ def answer_question(state: AgentState, tools: AgentTools):
         answer = tools.answer_question(query['query_text'], doc_ids)
 
         # Store the answer
-        state.extracted_info["answer"] = answer
-        state.extracted_info = dict(state.extracted_info)
+        state.extracted_info["answer"] = tools.artifacts.put(answer)
 
         # Add message with the answer
         state.messages.append({'type': 'ai', 'content': f"Answer: {answer}"})
@@ -356,8 +351,7 @@ def generate_literature_review(state: AgentState, tools: AgentTools):
         review = tools.generate_literature_review(doc_ids, focus)
 
         # Store the review
-        state.extracted_info["literature_review"] = review
-        state.extracted_info = dict(state.extracted_info)
+        state.extracted_info["literature_review"] = tools.artifacts.put(review)
 
         # Add message about the review
         state.messages.append({'type': 'ai', 'content': f"Generated literature review for {len(doc_ids)} documents."})
@@ -368,9 +362,8 @@ def generate_literature_review(state: AgentState, tools: AgentTools):
 
     return {"state": state, "next": "route"}
 
-def provide_final_answer(state: AgentState, tools: AgentTools):
-    print("DEBUG: extracted_info at provide_final_answer:", state.extracted_info)
-    """Provide a final answer based on all the collected information"""
+def build_final_answer_messages(state: AgentState, tools: AgentTools):
+    """Build the final answer prompt from all the collected information"""
     query = state.query
 
     # Prepare the context from all extracted information
@@ -381,7 +374,7 @@ def provide_final_answer(state: AgentState, tools: AgentTools):
     if "summaries" in state.extracted_info:
         context.append("Document Summaries:")
         for doc_id, summary in state.extracted_info["summaries"].items():
-            context.append(f"Document {doc_id} Summary: {summary['text'][:200]}...")
+            context.append(f"Document {doc_id} Summary: {tools.artifacts.get(summary['text'])[:200]}...")
         context.append("")
 
     # Add methodologies if available
@@ -416,13 +409,13 @@ def provide_final_answer(state: AgentState, tools: AgentTools):
     # Add literature review if available
     if "literature_review" in state.extracted_info:
         context.append("Literature Review:")
-        context.append(state.extracted_info["literature_review"][:300] + "...")
+        context.append(tools.artifacts.get(state.extracted_info["literature_review"])[:300] + "...")
         context.append("")
 
     # Add direct answer if available
     if "answer" in state.extracted_info:
         context.append("Answer to Query:")
-        context.append(state.extracted_info["answer"])
+        context.append(tools.artifacts.get(state.extracted_info["answer"]))
         context.append("")
 
     # Add citations if available
@@ -447,10 +440,26 @@ def provide_final_answer(state: AgentState, tools: AgentTools):
         """)
     ])
 
-    final_answer = tools.llm.invoke(prompt.format_messages(context=context)).content
-    print("DEBUG: Final answer from LLM:", final_answer)
+    return prompt.format_messages(context=context)
+
+def provide_final_answer(state: AgentState, tools: AgentTools):
+    """Provide a final answer based on all the collected information"""
+    logger.debug("Writing the final answer from %s", list(state.extracted_info))
+    final_answer = tools.invoke_llm(build_final_answer_messages(state, tools), task="final_answer")
+    logger.debug("Final answer: %d characters", len(final_answer))
     state.final_answer = final_answer
     state.messages.append({'type': 'ai', 'content': final_answer})
 
     return {"state": state, "next": "END"}
+
+async def stream_final_answer(state: AgentState, tools: AgentTools):
+    """Stream the final answer token by token, storing the full text on the state when done"""
+    parts = []
+    async for token in tools.astream_llm(build_final_answer_messages(state, tools), task="final_answer"):
+        parts.append(token)
+        yield token
+
+    final_answer = "".join(parts)
+    state.final_answer = final_answer
+    state.messages.append({'type': 'ai', 'content': final_answer})
     
\ No newline at end of file
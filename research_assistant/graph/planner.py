@@ -0,0 +1,102 @@
+import re
+from typing import Any, Dict, List, Optional
+
+from ..models.agent import AgentState
+from ..models.query import QueryType
+from . import nodes
+
+# Node functions by name
+NODES = {
+    "process_documents": nodes.process_documents,
+    "retrieve_information": nodes.retrieve_information,
+    "generate_summary": nodes.generate_summary,
+    "extract_methodology": nodes.extract_methodology,
+    "extract_claims": nodes.extract_claims,
+    "compare_documents": nodes.compare_documents,
+    "generate_citation": nodes.generate_citation,
+    "answer_question": nodes.answer_question,
+    "generate_literature_review": nodes.generate_literature_review,
+    "provide_final_answer": nodes.provide_final_answer,
+}
+
+# Minimal plan for each query type: a list of stages that run in order, where the
+# nodes within a stage are independent of each other and run concurrently
+QUERY_PLANS = {
+    QueryType.SUMMARIZE: [["process_documents"], ["generate_summary"], ["provide_final_answer"]],
+    QueryType.EXTRACT_INFO: [["process_documents"], ["extract_methodology", "extract_claims"], ["provide_final_answer"]],
+    QueryType.ANSWER_QUESTION: [["process_documents"], ["answer_question"], ["provide_final_answer"]],
+    QueryType.COMPARE_PAPERS: [["process_documents"], ["compare_documents"], ["provide_final_answer"]],
+    QueryType.GENERATE_CITATION: [["process_documents"], ["generate_citation"], ["provide_final_answer"]],
+    QueryType.LITERATURE_REVIEW: [["process_documents"], ["generate_literature_review"], ["provide_final_answer"]],
+}
+
+# Keyword rules for free-text queries (no query type): the first match picks the analysis
+FREE_TEXT_RULES = [
+    (re.compile(r"\bcompar|\bversus\b|\bvs\b|\bdifferences?\b", re.IGNORECASE), ["compare_documents"]),
+    (re.compile(r"literature review|\bsurvey\b|state of the art", re.IGNORECASE), ["generate_literature_review"]),
+    (re.compile(r"\bcit(e|es|ation|ations)\b|bibtex|bibliograph", re.IGNORECASE), ["generate_citation"]),
+    (re.compile(r"methodolog|\bmethods?\b|\bdatasets?\b|experimental setup", re.IGNORECASE), ["extract_methodology"]),
+    (re.compile(r"\bclaims?\b|\bfindings\b|\bcontributions\b", re.IGNORECASE), ["extract_claims"]),
+    (re.compile(r"summar|overview|\btl;?dr\b", re.IGNORECASE), ["generate_summary"]),
+    (re.compile(r"^\s*(what|why|how|when|where|which|who|does|do|is|are|can)\b|\?\s*$", re.IGNORECASE),
+     ["answer_question"]),
+]
+
+# Analysis run for an ambiguous free-text query until the router has decided on one
+DEFAULT_ANALYSIS = ["generate_summary"]
+
+# EXTRACT_INFO option values and the nodes they select
+EXTRACT_NODES = {"methodology": "extract_methodology", "claims": "extract_claims"}
+
+def _query_type(query: Dict[str, Any]) -> Optional[QueryType]:
+    try:
+        return QueryType(query.get('query_type'))
+    except ValueError:
+        return None
+
+def free_text_analysis(query: Dict[str, Any]) -> Optional[List[str]]:
+    """Analysis nodes the keyword rules pick for a free-text query, or None if none apply"""
+    text = query.get('query_text') or ""
+    for pattern, analysis in FREE_TEXT_RULES:
+        if pattern.search(text):
+            return list(analysis)
+    return None
+
+def is_ambiguous(query: Dict[str, Any]) -> bool:
+    """A free-text query that no keyword rule can place"""
+    return _query_type(query) is None and free_text_analysis(query) is None
+
+def plan_query(query: Dict[str, Any], analysis: Optional[List[str]] = None) -> List[List[str]]:
+    """Map a query's type and options to the stages of nodes it needs.
+
+    `analysis` overrides the middle stage of a free-text query, once a decision for an
+    ambiguous query has been made.
+    """
+    query_type = _query_type(query)
+    if query_type is None:
+        analysis = analysis or free_text_analysis(query) or DEFAULT_ANALYSIS
+        plan = [["process_documents"], list(analysis), ["provide_final_answer"]]
+    else:
+        plan = [list(stage) for stage in QUERY_PLANS[query_type]]
+    options = query.get('options') or {}
+
+    # Only extract what was asked for, e.g. {"extract": ["claims"]}
+    if query_type == QueryType.EXTRACT_INFO and options.get("extract"):
+        selected = [EXTRACT_NODES[item] for item in options["extract"] if item in EXTRACT_NODES]
+        if selected:
+            plan[1] = selected
+
+    # Citations can be produced alongside any other analysis
+    if options.get("include_citations") and "generate_citation" not in plan[1]:
+        plan[1].append("generate_citation")
+
+    return plan
+
+def branch_state(state: AgentState) -> AgentState:
+    """Copy of the state that a node can update in place without touching the original"""
+    return state.model_copy(update={
+        "query": dict(state.query),
+        "extracted_info": dict(state.extracted_info),
+        "messages": list(state.messages),
+        "documents": dict(state.documents),
+    })
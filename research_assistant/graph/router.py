@@ -1,28 +1,56 @@
 from ..models.agent import AgentState, AgentAction
 from ..tools.agent_tools import AgentTools
+from . import planner
 
-#from llm.utils import format_message
-from typing import Any, Dict, List, Optional, Tuple
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+import json
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Set
+from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import HumanMessage, SystemMessage
+from langgraph.graph import END
 
+# Safety net against routing loops
+MAX_STEPS = 10
+
+# Key each analysis node writes into extracted_info once its work is done
+NODE_OUTPUTS = {
+    "retrieve_information": "retrieved_chunks",
+    "generate_summary": "summaries",
+    "extract_methodology": "methodologies",
+    "extract_claims": "claims",
+    "compare_documents": "comparison",
+    "generate_citation": "citations",
+    "answer_question": "answer",
+    "generate_literature_review": "literature_review",
+}
+
+# Bounds on the state summary sent when the LLM has to route
+MAX_QUERY_CHARS = 500
+MAX_RECENT_MESSAGES = 3
+MAX_MESSAGE_CHARS = 200
+
+# Process-wide count of routing decisions by how they were made
+_routing_counts = Counter()
+_routing_lock = threading.Lock()
+
+def routing_stats() -> Dict[str, int]:
+    """Number of routing steps decided by the rules and by the LLM since startup"""
+    with _routing_lock:
+        return {"rule_routed": _routing_counts["rule"], "llm_routed": _routing_counts["llm"]}
 
 def create_router_prompt():
     """
-    Creates the prompt template for the conversation router.
-    
-    This router is responsible for determining the best next step in a conversation
-    based on the user's input and conversation history.
-    
+    Creates the prompt template for routing an ambiguous free-text query.
+
+    Only the analysis step is left to the LLM; everything else is decided by rules.
+
     Returns:
-        ChatPromptTemplate: The formatted router prompt template
+        ChatPromptTemplate: The router prompt template
     """
     router_prompt = ChatPromptTemplate.from_messages([
         SystemMessage(content="""You are the controller for a research assistant agent system.
-        Your job is to determine which action should be taken next based on the current query and state.
-        Choose from the following actions:
-        - process_documents: Process new documents (if document IDs are not in the state)
-        - retrieve_information: Retrieve relevant information from documents
+        Choose the analysis that best serves the user's query:
         - generate_summary: Generate a summary of documents
         - extract_methodology: Extract methodology information
         - extract_claims: Extract key claims
@@ -30,139 +58,96 @@ def create_router_prompt():
         - generate_citation: Generate citations for documents
         - answer_question: Answer a specific question about documents
         - generate_literature_review: Generate a literature review
-        - final_answer: Provide a final answer to the user query
-       
-        If all relevant actions have been completed, select 'final_answer' to finish the workflow.
-        You must not repeat actions that have already been completed unless necessary."""),
-        MessagesPlaceholder(variable_name="messages"),
-        HumanMessage(content="""Based on the above conversation and current state, what should be the next action?
-        Current query: {query}
-        Current state: {current_state}
-       
-        Respond with just the action name from the list above.""")
+
+        Respond with just the action name from the list above."""),
+        ("human", "Current state: {current_state}")
     ])
-    
+
     return router_prompt
 
+def completed_nodes(state: AgentState) -> Set[str]:
+    """Nodes whose work is already in the state"""
+    completed = {step["node"] for step in state.plan}
+    completed.update(node for node, key in NODE_OUTPUTS.items() if key in state.extracted_info)
+    if state.documents:
+        completed.add("process_documents")
+    if state.final_answer is not None:
+        completed.add("provide_final_answer")
+    return completed
+
+def resume_state(state: AgentState) -> AgentState:
+    """
+    Prepares the last checkpoint of an interrupted or failed run to continue.
+
+    Nodes that ran without producing their output (usually because they failed) are
+    dropped from the executed plan so the router schedules them again; their
+    per-document results saved before the failure are reused by the tools. The final
+    answer is always written again from the completed work.
+    """
+    plan = [step for step in state.plan if step["node"] != "provide_final_answer"
+            and (step["node"] not in NODE_OUTPUTS or NODE_OUTPUTS[step["node"]] in state.extracted_info)]
+    return state.model_copy(update={"plan": plan, "error": None, "final_answer": None, "next_nodes": []})
+
+def state_summary(state: AgentState) -> str:
+    """Bounded description of the state for the routing prompt"""
+    recent = state.messages[-MAX_RECENT_MESSAGES:]
+    return json.dumps({
+        "query": (state.query.get('query_text') or "")[:MAX_QUERY_CHARS],
+        "documents": len(state.documents),
+        "completed": sorted(completed_nodes(state)),
+        "recent_messages": [str(message.get('content', ''))[:MAX_MESSAGE_CHARS] for message in recent],
+    })
+
+def llm_route(state: AgentState, tools: AgentTools) -> List[str]:
+    """Ask the LLM which analysis an ambiguous free-text query needs"""
+    prompt = create_router_prompt().format_messages(current_state=state_summary(state))
+    response = tools.invoke_llm(prompt, task="route")
+    choice = [node for node in NODE_OUTPUTS if node in response and node != "retrieve_information"]
+    return choice[:1] or list(planner.DEFAULT_ANALYSIS)
+
 def route(state: AgentState, tools: AgentTools) -> Dict[str, Any]:
     """
-    Routes the conversation to the appropriate next step based on the user's input.
-    
+    Decides which nodes run next.
+
+    The plan for the query type (see planner.QUERY_PLANS and FREE_TEXT_RULES) is the
+    routing table: the next nodes are those of the first stage whose work is not yet in
+    the state. The LLM is consulted only when a free-text query matches no rule, and
+    then only once per run.
+
     Args:
         state: The current state of the agent
         tools: The tools available to the agent
-    
+
     Returns:
-        Dict[str, Any]: Updated state and the next action to take
+        Dict[str, Any]: State updates, including the next nodes to run
     """
-    # Initialize state fields if not present
-    if not hasattr(state, "step_count"):
-        state.step_count = 0
-    if not hasattr(state, "documents"):
-        state.documents = {}
-    if not hasattr(state, "extracted_info"):
-        state.extracted_info = {}
-    if not hasattr(state, "messages"):
-        state.messages = []
-    
-    # Increment step count
-    state.step_count += 1
-
-    # Hard stop after 10 steps
-    if state.step_count > 10:
-        print("Step limit reached, forcing provide_final_answer")
-        state.current_action = AgentAction(action="provide_final_answer")
-        return {"state": state, "next": "provide_final_answer"}
-    
-    if len(state.messages) > 10:  # or another threshold
-        print("Forcing final_answer for debugging")
-        state.current_action = AgentAction(action="final_answer")
-        return {"state": state, "next": "final_answer"}
-    
-    # Check if we need to process documents
-    if not state.documents:
-        print("No documents found, routing to process_documents")
-        state.current_action = AgentAction(action="process_documents")
-        return {"state": state, "next": "process_documents"}
-    
-    # Check if we've already processed documents in this step
-    if state.current_action and state.current_action.action == "process_documents":
-        print("Documents already processed in this step, moving to next action")
-        state.current_action = AgentAction(action="retrieve_information")
-        return {"state": state, "next": "retrieve_information"}
-    
-    # Check if we have any unprocessed documents
-    has_unprocessed = False
-    for doc_id, doc_info in state.documents.items():
-        if not doc_info.get("processed", False):
-            has_unprocessed = True
-            break
-    
-    if has_unprocessed:
-        print("Found unprocessed documents, routing to process_documents")
-        state.current_action = AgentAction(action="process_documents")
-        return {"state": state, "next": "process_documents"}
-    
-    # Check if we have retrieved information
-    if "retrieved_chunks" in state.extracted_info:
-        print("Information already retrieved, checking next action")
-        
-        # If we have retrieved information but no summaries, go to generate_summary
-        if "summaries" not in state.extracted_info:
-            print("No summaries found, routing to generate_summary")
-            state.current_action = AgentAction(action="generate_summary")
-            return {"state": state, "next": "generate_summary"}
-    
-    # If we have processed documents but no information retrieved yet
-    if state.documents and "retrieved_chunks" not in state.extracted_info:
-        print("Documents processed but no information retrieved yet, routing to retrieve_information")
-        state.current_action = AgentAction(action="retrieve_information")
-        return {"state": state, "next": "retrieve_information"}
-    
-    print("DEBUG (router): state.documents =", state.documents)
-    
-    messages = list(state.messages)
-    
-    # Add a message about the current state
-    current_state = {
-        "documents": list(state.documents.keys()) if state.documents else [],
-        "extracted_info": list(state.extracted_info.keys()) if state.extracted_info else [],
-        "current_action": state.current_action.action if state.current_action else None,
-        "next_actions_remaining": len(state.next_actions) if hasattr(state, "next_actions") else 0
-    }
-    
-    print("Current state:", current_state)
-    print("Extracted info keys:", list(state.extracted_info.keys()))
-    
-    # Determine next action
-    if hasattr(state, "next_actions") and state.next_actions:
-        # Use the next planned action if available
-        next_action = state.next_actions.pop(0)
-        state.current_action = next_action
-        print(f"Router selected next action: {next_action.action}")
-        return {"state": state, "next": next_action.action}
-    else:
-        # Use the router to determine the next action
-        router_prompt = create_router_prompt()
-        
-        # Format the prompt with the current state and query
-        formatted_prompt = router_prompt.format(
-            messages=messages,
-            query=state.query.query_text,
-            current_state=str(current_state)
-        )
-        
-        # Convert the formatted prompt to messages
-        formatted_messages = [
-            SystemMessage(content=formatted_prompt.split("\n\n")[0]),
-            *messages,
-            HumanMessage(content=formatted_prompt.split("\n\n")[-1])
-        ]
-        
-        # Invoke the LLM with the formatted messages
-        response = tools.llm.invoke(formatted_messages)
-        
-        next_action = response.content.strip()
-        state.current_action = AgentAction(action=next_action)
-        print(f"Router selected next action: {next_action}")
-        return {"state": state, "next": next_action}
\ No newline at end of file
+    step_count = state.step_count + 1
+    metrics = dict(state.metrics)
+    update = {"step_count": step_count, "metrics": metrics}
+    decided_by = "rule"
+
+    completed = completed_nodes(state)
+    analysis = [action.action for action in state.next_actions] or None
+    plan = planner.plan_query(state.query, analysis)
+
+    next_nodes = next((
+        [node for node in stage if node not in completed]
+        for stage in plan if any(node not in completed for node in stage)
+    ), [END])
+
+    # An ambiguous free-text query gets its analysis chosen by the LLM
+    if analysis is None and next_nodes == plan[1] and planner.is_ambiguous(state.query):
+        next_nodes = llm_route(state, tools)
+        update["next_actions"] = [AgentAction(action=node) for node in next_nodes]
+        decided_by = "llm"
+
+    # Hard stop after too many steps
+    if step_count > MAX_STEPS and state.final_answer is None:
+        next_nodes = ["provide_final_answer"]
+
+    with _routing_lock:
+        _routing_counts[decided_by] += 1
+    metrics[f"{decided_by}_routed_steps"] = metrics.get(f"{decided_by}_routed_steps", 0) + 1
+    update["next_nodes"] = next_nodes
+    update["current_action"] = AgentAction(action=next_nodes[0])
+    return update
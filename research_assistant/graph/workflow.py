@@ -1,56 +1,101 @@
+import logging
+
 from langgraph.graph import StateGraph, END
 
 from ..models.agent import AgentState
+from ..models.events import EventType
 from ..tools.agent_tools import AgentTools
+from ..utils.progress import get_reporter
+from ..utils.checkpoint import save_run_state
+from ..utils.tracing import span
 from . import nodes
+from . import planner
 from . import router
 
+logger = logging.getLogger(__name__)
+
+def _updates(name: str, before: AgentState, after: AgentState, step: int, start: float, duration: float):
+    """Partial state update with only what the node changed, for the graph's reducers"""
+    update = {
+        "messages": after.messages[len(before.messages):],
+        "extracted_info": {key: value for key, value in after.extracted_info.items()
+                           if before.extracted_info.get(key) is not value},
+        "plan": [{"stage": step, "node": name, "start": start, "duration": duration}],
+    }
+    if after.documents != before.documents:
+        update["documents"] = after.documents
+    if after.query != before.query:
+        update["query"] = after.query
+    if after.error != before.error:
+        update["error"] = after.error
+    if after.final_answer != before.final_answer:
+        update["final_answer"] = after.final_answer
+    return update
+
+def _graph_node(name: str, node, tools: AgentTools):
+    """Adapt a node function to the graph: run it on a copy and return its updates"""
+    def run(state: AgentState):
+        reporter = get_reporter()
+        total_steps = len(planner.plan_query(state.query))
+        reporter.emit(EventType.NODE_START, node=name, step=state.step_count, total_steps=total_steps)
+        start = reporter.elapsed()
+        with span(name, "node", step=state.step_count):
+            result = node(planner.branch_state(state), tools)["state"]
+        duration = reporter.elapsed() - start
+        logger.debug("Node %s finished in %.3fs", name, duration, extra={"step": state.step_count})
+        reporter.emit(EventType.NODE_END, node=name, step=state.step_count, total_steps=total_steps,
+                      duration=duration)
+        return _updates(name, state, result, state.step_count, start, duration)
+    return run
+
+def _final_answer_node(tools: AgentTools):
+    """Final answer node that streams its tokens to the run's progress reporter"""
+    async def run(state: AgentState):
+        reporter = get_reporter()
+        total_steps = len(planner.plan_query(state.query))
+        reporter.emit(EventType.NODE_START, node="provide_final_answer", step=state.step_count,
+                      total_steps=total_steps)
+        start = reporter.elapsed()
+        result = planner.branch_state(state)
+        with span("provide_final_answer", "node", step=state.step_count):
+            async for token in nodes.stream_final_answer(result, tools):
+                reporter.emit(EventType.TOKEN, content=token)
+        duration = reporter.elapsed() - start
+        reporter.emit(EventType.NODE_END, node="provide_final_answer", step=state.step_count,
+                      total_steps=total_steps, duration=duration)
+        return _updates("provide_final_answer", state, result, state.step_count, start, duration)
+    return run
+
+def _route_node(tools: AgentTools):
+    """Router node that first checkpoints the state, which holds every node completed so far"""
+    def run(state: AgentState):
+        with span("route", "router", step=state.step_count):
+            save_run_state(state)
+            return router.route(state, tools)
+    return run
+
 def setup_graph(tools: AgentTools):
     """Create and return the workflow graph"""
 
     workflow = StateGraph(AgentState)
-    
-    # Add nodes
-    workflow.add_node("route", lambda state: router.route(state, tools))
-    workflow.add_node("process_documents", lambda state: nodes.process_documents(state, tools))
-    workflow.add_node("retrieve_information", lambda state: nodes.retrieve_information(state, tools))
-    workflow.add_node("generate_summary", lambda state: nodes.generate_summary(state, tools))
-    workflow.add_node("extract_methodology", lambda state: nodes.extract_methodology(state, tools))
-    workflow.add_node("extract_claims", lambda state: nodes.extract_claims(state, tools))
-    workflow.add_node("compare_documents", lambda state: nodes.compare_documents(state, tools))
-    workflow.add_node("generate_citation", lambda state: nodes.generate_citation(state, tools))
-    workflow.add_node("answer_question", lambda state: nodes.answer_question(state, tools))
-    workflow.add_node("generate_literature_review", lambda state: nodes.generate_literature_review(state, tools))
-    workflow.add_node("provide_final_answer", lambda state: nodes.provide_final_answer(state, tools))
-    
-    # Add edges from router to all other nodes
-    workflow.add_edge("route", "process_documents")
-    workflow.add_edge("route", "retrieve_information")
-    workflow.add_edge("route", "generate_summary")
-    workflow.add_edge("route", "extract_methodology")
-    workflow.add_edge("route", "extract_claims")
-    workflow.add_edge("route", "compare_documents")
-    workflow.add_edge("route", "generate_citation")
-    workflow.add_edge("route", "answer_question")
-    workflow.add_edge("route", "generate_literature_review")
-    workflow.add_edge("route", "provide_final_answer")
-    
-    # Add direct progression edges
-    workflow.add_edge("process_documents", "retrieve_information")
-    workflow.add_edge("retrieve_information", "generate_summary")
-    workflow.add_edge("generate_summary", "provide_final_answer")  # Go directly to final answer
-    workflow.add_edge("extract_methodology", "provide_final_answer")  # Go directly to final answer
-    workflow.add_edge("extract_claims", "provide_final_answer")  # Go directly to final answer
-    workflow.add_edge("compare_documents", "provide_final_answer")  # Go directly to final answer
-    workflow.add_edge("generate_citation", "provide_final_answer")  # Go directly to final answer
-    workflow.add_edge("answer_question", "provide_final_answer")  # Go directly to final answer
-    workflow.add_edge("generate_literature_review", "provide_final_answer")  # Go directly to final answer
-    
+
+    # Add nodes; every analysis node reports back to the router when done
+    workflow.add_node("route", _route_node(tools))
+    for name, node in planner.NODES.items():
+        if name == "provide_final_answer":
+            workflow.add_node(name, _final_answer_node(tools))
+        else:
+            workflow.add_node(name, _graph_node(name, node, tools))
+            workflow.add_edge(name, "route")
+
+    # The router's next_nodes decide where to go; parallel branches join again at the
+    # router, with their updates combined by the reducers on AgentState
+    workflow.add_conditional_edges("route", lambda state: state.next_nodes, [*planner.NODES, END])
+
     # Final answer leads to the end
     workflow.add_edge("provide_final_answer", END)
-    
+
     # Set the entry point
     workflow.set_entry_point("route")
-    
-    return workflow.compile()
 
+    return workflow.compile()
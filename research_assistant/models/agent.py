@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
+from typing import Annotated, List, Dict, Any, Optional
+import operator
 #from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, FunctionMessage
 #from .query import AgentQuery
 
@@ -8,17 +9,57 @@ class AgentAction(BaseModel):
     action: str
     action_input: Optional[Dict[str, Any]] = None
     
+def merge_dicts(left: Dict[str, Any], right: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge step for updates from parallel branches (each branch writes its own keys)"""
+    return {**left, **right}
+
+def keep_latest(left: Optional[str], right: Optional[str]) -> Optional[str]:
+    return right or left
+
+# Bounds on the message window kept in the state
+MAX_MESSAGES = 12
+MAX_MESSAGE_CHARS = 1000
+MAX_SUMMARY_CHARS = 1000
+SUMMARY_SNIPPET_CHARS = 80
+
+def add_messages(left: List[Dict[str, Any]], right: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Append messages to a bounded window, folding the oldest ones into a single summary message"""
+    messages = left + [
+        {**message, 'content': message['content'][:MAX_MESSAGE_CHARS]}
+        if isinstance(message.get('content'), str) and len(message['content']) > MAX_MESSAGE_CHARS else message
+        for message in right
+    ]
+    if len(messages) <= MAX_MESSAGES:
+        return messages
+
+    summary = messages[0] if messages[0].get('type') == 'summary' else None
+    older = messages[1 if summary else 0:len(messages) - MAX_MESSAGES + 1]
+    snippets = [str(message.get('content', ''))[:SUMMARY_SNIPPET_CHARS] for message in older]
+    text = "; ".join(([summary['content']] if summary else []) + snippets)
+    count = (summary['count'] if summary else 0) + len(older)
+    summary = {'type': 'summary', 'count': count, 'content': text[-MAX_SUMMARY_CHARS:]}
+    return [summary] + messages[len(messages) - MAX_MESSAGES + 1:]
+
 class AgentState(BaseModel):
-    """State maintained during the agent's execution"""
+    """State maintained during the agent's execution.
+
+    Annotated fields are reduced by the workflow graph, so nodes running as parallel
+    branches return partial updates instead of overwriting each other. The state stays
+    compact: messages are a bounded window (see add_messages), and large artifacts in
+    extracted_info are references into the tools' ArtifactStore.
+    """
     query: Dict[str, Any]
-    messages: List[Dict[str, Any]] = Field(default_factory=list)
-    documents: Dict[str, Any] = Field(default_factory=dict)
-    extracted_info: Dict[str, Any] = Field(default_factory=dict)
+    messages: Annotated[List[Dict[str, Any]], add_messages] = Field(default_factory=list)
+    documents: Annotated[Dict[str, Any], merge_dicts] = Field(default_factory=dict)
+    extracted_info: Annotated[Dict[str, Any], merge_dicts] = Field(default_factory=dict)
     next_actions: List[AgentAction] = Field(default_factory=list)
+    next_nodes: List[str] = Field(default_factory=list)  # Chosen by the router
     current_action: Optional[AgentAction] = None
     final_answer: Optional[str] = None
-    error: Optional[str] = None
+    error: Annotated[Optional[str], keep_latest] = None
     step_count: int = 0
+    metrics: Dict[str, float] = Field(default_factory=dict)
+    plan: Annotated[List[Dict[str, Any]], operator.add] = Field(default_factory=list)  # Executed nodes with timings
     
     class Config:
         arbitrary_types_allowed = True
\ No newline at end of file
@@ -10,6 +10,8 @@ class DocumentMetadata(BaseModel):
     doi: Optional[str] = None
     url: Optional[str] = None
     source: Optional[str] = None
+    arxiv_id: Optional[str] = None
+    file_hash: Optional[str] = None  # SHA-256 of the ingested PDF
     
 class DocumentChunk(BaseModel):
     """A chunk of text from a document with its metadata"""
@@ -19,6 +21,14 @@ class DocumentChunk(BaseModel):
     section: Optional[str] = None
     page_num: Optional[int] = None
 
+class DocumentInfo(BaseModel):
+    """An indexed document with the space its chunks take up"""
+    document_id: str
+    title: Optional[str] = None
+    chunks: int = 0
+    text_bytes: int = 0
+    embedding_bytes: int = 0
+
 class DocumentSummary(BaseModel):
     """Summary of a document"""
     document_id: str
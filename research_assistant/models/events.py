@@ -0,0 +1,22 @@
+from pydantic import BaseModel, Field
+from typing import Dict, Any, Optional
+from enum import Enum
+
+from .agent import AgentState
+
+class EventType(str, Enum):
+    NODE_START = "node_start"
+    NODE_END = "node_end"
+    DOCUMENT_DONE = "document_done"
+    LLM_START = "llm_start"
+    LLM_END = "llm_end"
+    TOKEN = "token"
+    FINAL = "final"
+
+class AgentEvent(BaseModel):
+    """An event emitted while the research assistant runs a query"""
+    type: EventType
+    content: Optional[str] = None
+    data: Dict[str, Any] = Field(default_factory=dict)
+    elapsed: float = 0.0  # Seconds since the run started
+    state: Optional[AgentState] = None
@@ -0,0 +1,32 @@
+from pydantic import BaseModel, Field
+from typing import Dict, Optional
+from enum import Enum
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+class StageProgress(BaseModel):
+    """Progress of one ingest stage (pages parsed, chunks embedded, ...)"""
+    done: int = 0
+    total: Optional[int] = None
+
+class IngestJob(BaseModel):
+    """A paper ingested in the background"""
+    job_id: str
+    source: str  # File name or arXiv ID
+    status: JobStatus = JobStatus.QUEUED
+    stage: Optional[str] = None  # Stage running now
+    progress: Dict[str, StageProgress] = Field(default_factory=dict)
+    document_id: Optional[str] = None
+    error: Optional[str] = None
+    created: float
+    started: Optional[float] = None
+    finished: Optional[float] = None
+
+    @property
+    def active(self) -> bool:
+        return self.status in (JobStatus.QUEUED, JobStatus.RUNNING)
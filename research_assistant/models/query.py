@@ -15,4 +15,9 @@ class AgentQuery(BaseModel):
     query_type: QueryType
     query_text: str
     document_ids: Optional[List[str]] = None
-    options: Optional[Dict[str, Any]] = None
\ No newline at end of file
+    options: Optional[Dict[str, Any]] = None
+
+class QueryRequest(AgentQuery):
+    """A query submitted to the HTTP API; `run_id` resumes an interrupted run"""
+    run_id: Optional[str] = None
+    include_trace: bool = False
@@ -0,0 +1,81 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+class ChunkTable:
+    """SQLite table of chunk texts and metadata, keyed by chunk ID.
+
+    Used instead of the Chroma collection when the embedding store serves vector search,
+    so no vectors (and no HNSW index) are kept outside the store.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # Ingest and query threads share the connection under the lock
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS chunks (
+                chunk_id TEXT PRIMARY KEY, document_id TEXT NOT NULL, text TEXT NOT NULL, metadata TEXT NOT NULL)""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_by_document ON chunks (document_id)")
+
+    def upsert(self, ids: List[str], metadatas: List[Optional[Dict[str, Any]]], documents: List[str]):
+        rows = [(chunk_id, (metadata or {}).get("document_id", "unknown"), text or "", json.dumps(metadata or {}))
+                for chunk_id, metadata, text in zip(ids, metadatas, documents)]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?)", rows)
+
+    def get(self, chunk_ids: List[str]) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+        """Text and metadata of each of the given chunks that exists"""
+        found = {}
+        with self._lock:
+            # Bounded below SQLite's limit on query parameters
+            for start in range(0, len(chunk_ids), 500):
+                batch = chunk_ids[start:start + 500]
+                query = f"SELECT chunk_id, text, metadata FROM chunks WHERE chunk_id IN ({','.join('?' * len(batch))})"
+                for chunk_id, text, metadata in self._conn.execute(query, batch):
+                    found[chunk_id] = (text, json.loads(metadata))
+        return found
+
+    def chunk_ids(self, document_ids: List[str]) -> List[str]:
+        """IDs of the chunks of the given documents"""
+        ids = []
+        with self._lock:
+            for start in range(0, len(document_ids), 500):
+                batch = document_ids[start:start + 500]
+                query = f"SELECT chunk_id FROM chunks WHERE document_id IN ({','.join('?' * len(batch))})"
+                ids.extend(row[0] for row in self._conn.execute(query, batch))
+        return ids
+
+    def delete(self, chunk_ids: List[str]):
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM chunks WHERE chunk_id = ?", [(chunk_id,) for chunk_id in chunk_ids])
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def scan(self, batch_size: int) -> Iterator[Tuple[List[str], List[Dict[str, Any]], List[str]]]:
+        """Every chunk as (ids, metadatas, texts) pages of up to `batch_size`, in insertion order"""
+        last = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute("SELECT rowid, chunk_id, metadata, text FROM chunks WHERE rowid > ? "
+                                          "ORDER BY rowid LIMIT ?", (last, batch_size)).fetchall()
+            if not rows:
+                return
+            last = rows[-1][0]
+            yield [row[1] for row in rows], [json.loads(row[2]) for row in rows], [row[3] for row in rows]
+            if len(rows) < batch_size:
+                return
+
+    def vacuum(self):
+        """Give the pages of deleted chunks back to the file system"""
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._conn.execute("VACUUM")
@@ -1,88 +1,140 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
+import hashlib
+import logging
 import os
+import shutil
+import sqlite3
+import threading
+import uuid
 
-from langchain_community.document_loaders import PyPDFLoader, ArxivLoader
+from langchain_community.document_loaders import ArxivLoader
 from langchain_huggingface.embeddings import HuggingFaceEmbeddings
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import Chroma
 from langchain.retrievers.multi_vector import MultiVectorRetriever
 from langchain.storage import InMemoryStore
 from langchain_core.documents import Document
+from pypdf import PdfReader
 
-from ..models.document import DocumentMetadata, DocumentChunk
+from ..models.document import DocumentMetadata, DocumentChunk, DocumentInfo
+from .metadata_registry import MetadataRegistry, extract_pdf_metadata
+from .ingest_jobs import report_ingest_progress, IngestCancelled
+from .embedding_service import BatchingEmbeddings
+from .embedding_store import EmbeddingStore
+from .chunk_table import ChunkTable
+from .snapshot import SnapshotWriter, Snapshot, embedding_model_name
+from .. import config
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "research_papers"
+# Rows read from or written to Chroma per call when scanning or rebuilding the collection
+SCAN_BATCH_SIZE = 5000
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
 
 class DocumentProcessor:
-    def __init__(self):
-        print("DEBUG: Initializing DocumentProcessor")
+    def __init__(self, embeddings=None, persist_directory: str = "chroma_db",
+                 metadata_registry: Optional[MetadataRegistry] = None):
         try:
-            print("DEBUG: Creating HuggingFace embeddings")
-            self.embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-            print("DEBUG: Embeddings created successfully")
+            # Another embedding model can be passed in (e.g. by the benchmarks)
+            self.embeddings = embeddings if embeddings is not None else HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+            if config.EMBEDDING_BATCHING:
+                # One worker encodes the texts of all concurrent ingests and queries in micro-batches
+                self.embeddings = BatchingEmbeddings(self.embeddings)
             
-            print("DEBUG: Creating text splitter")
             self.text_splitter = RecursiveCharacterTextSplitter(
                 chunk_size=1000,
                 chunk_overlap=200
             )
-            print("DEBUG: Text splitter created successfully")
             
             # Initialize vector store and retriever
-            print("DEBUG: Creating InMemoryStore")
             self.docstore = InMemoryStore()
-            print("DEBUG: InMemoryStore created successfully")
             
-            print("DEBUG: Creating Chroma vector store")
+            self.persist_directory = persist_directory
             self.vectorstore = Chroma(
-                collection_name="research_papers",
+                collection_name=COLLECTION_NAME,
                 embedding_function=self.embeddings,
-                persist_directory="chroma_db"
+                persist_directory=persist_directory
             )
-            print("DEBUG: Chroma vector store created successfully")
+            logger.debug("Chroma vector store ready")
             
-            print("DEBUG: Creating MultiVectorRetriever")
             self.retriever = MultiVectorRetriever(
                 vectorstore=self.vectorstore,
                 docstore=self.docstore,
                 id_key="chunk_id",
             )
-            print("DEBUG: MultiVectorRetriever created successfully")
+            logger.debug("DocumentProcessor initialized")
+            
+            self.metadata_registry = metadata_registry if metadata_registry is not None else MetadataRegistry()
+            
+            # Bumped whenever the indexed documents change (part of the query cache key)
+            self.corpus_version = 0
+            self._version_lock = threading.Lock()
+            # Held while writing to the collection, so a rebuild in vacuum() cannot drop concurrent writes
+            self._write_lock = threading.Lock()
+            # Chunks deleted by this process since the collection was last rebuilt
+            self._deleted_chunks = 0
+            
+            # With the embedding store on, it holds the vectors and the chunk table the texts and
+            # metadata; the Chroma collection stays empty, so no HNSW index is built
+            self.embedding_store = None
+            self.chunk_table = None
+            if config.EMBEDDING_STORE:
+                store_directory = os.path.join(persist_directory, "embedding_store")
+                self.embedding_store = EmbeddingStore(store_directory, rescore_factor=config.EMBEDDING_RESCORE_FACTOR)
+                self.chunk_table = ChunkTable(os.path.join(store_directory, "chunks.sqlite3"))
+                if config.EMBEDDING_QUANTIZATION == "int8":
+                    self.embedding_store.quantize()
+                elif self.embedding_store.quantization:
+                    self.embedding_store.dequantize()
+                if self.vectorstore._collection.count():
+                    self._move_collection_to_store()
             
         except Exception as e:
-            print("ERROR in DocumentProcessor initialization:", str(e))
+            logger.error("DocumentProcessor initialization failed: %s", e)
             raise
         
     def process_pdf(self, file_path: str) -> str:
         """Process a PDF file and return the document ID"""
         try:
-            print("DEBUG: Starting PDF processing")
-            # Generate a unique document ID
-            document_id = f"doc_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-            print("DEBUG: Generated document ID:", document_id)
+            # Generate a unique document ID (the timestamp alone collides within a second)
+            document_id = f"doc_{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:6]}"
+            logger.debug("Processing PDF %s", file_path, extra={"document_id": document_id})
             
-            # Load and process the document
-            print("DEBUG: Loading PDF file")
-            loader = PyPDFLoader(file_path)
-            pages = loader.load()
-            print("DEBUG: Loaded", len(pages), "pages")
+            # Load and process the document, page by page so progress can be reported
+            # (one reader for the text, page count and info dict, so the file is parsed once)
+            reader = PdfReader(file_path)
+            total_pages = len(reader.pages)
+            all_texts = []
+            for page in reader.pages:
+                all_texts.append(page.extract_text())
+                report_ingest_progress("parsing", len(all_texts), total_pages)
+            logger.debug("Loaded %d pages", len(all_texts), extra={"document_id": document_id})
             
-            # Extract document metadata from first page
+            # Extract document metadata from the PDF info dict and first page
             title = os.path.basename(file_path).replace('.pdf', '')
-            authors = []
-            
-            # Extract text and metadata
-            print("DEBUG: Extracting text from pages")
-            all_texts = []
-            for i, page in enumerate(pages):
-                all_texts.append(page.page_content)
+            try:
+                info = dict(reader.metadata or {})
+            except Exception:
+                info = {}
+            metadata = extract_pdf_metadata(info, all_texts[0] if all_texts else "", fallback_title=title)
+            metadata.file_hash = _file_hash(file_path)
             
             # Split into chunks
-            print("DEBUG: Splitting text into chunks")
             chunks = self.text_splitter.split_text("\n".join(all_texts))
-            print("DEBUG: Created", len(chunks), "chunks")
+            logger.debug("Split into %d chunks", len(chunks), extra={"document_id": document_id})
             
             # Create document chunks with metadata
-            print("DEBUG: Creating document chunks")
             doc_chunks = []
             for i, chunk in enumerate(chunks):
                 chunk_id = f"{document_id}_chunk_{i}"
@@ -102,38 +154,35 @@ class DocumentProcessor:
                         "chunk_id": chunk_id
                     }
                 )
-                print(f"DEBUG: Storing chunk {i+1} in docstore")
                 self.docstore.mset([(chunk_id, doc)])
             
             # Create embeddings and store in vector store
-            print("DEBUG: Creating embeddings and storing in vector store")
-            self.vectorstore.add_documents(
-                documents=[Document(
-                    page_content=chunk.text,
-                    metadata={
-                        "document_id": chunk.document_id,
-                        "chunk_id": chunk.chunk_id
-                    }
-                ) for chunk in doc_chunks],
-                ids=[chunk.chunk_id for chunk in doc_chunks]  # Add explicit IDs
-            )
-            print("DEBUG: Successfully stored embeddings")
+            self._add_chunks(doc_chunks)
             
-            # Create document metadata
-            metadata = DocumentMetadata(
-                title=title,
-                authors=authors,
-                source="local_upload"
-            )
+            # Keep the metadata for citations
+            self.metadata_registry.put(document_id, metadata)
+            self._bump_corpus_version()
             
             # Return document ID for future reference
-            print("DEBUG: Successfully processed document:", document_id)
+            logger.info("Processed PDF into %d chunks", len(doc_chunks), extra={"document_id": document_id})
             return document_id
             
+        except IngestCancelled:
+            raise
         except Exception as e:
-            print("ERROR in process_pdf:", str(e))
+            logger.error("Error processing PDF %s: %s", file_path, e)
             raise
     
+    def find_document(self, source: str) -> Optional[str]:
+        """ID of an indexed document already ingested from a PDF with the same contents, or from the
+        same arXiv paper; None if the source has not been ingested (or is not a readable file)"""
+        if source.endswith('.pdf'):
+            try:
+                return self.metadata_registry.find(file_hash=_file_hash(source))
+            except OSError:
+                return None
+        return self.metadata_registry.find(arxiv_id=source)
+    
     def process_arxiv(self, arxiv_id: str) -> str:
         """Process an arXiv paper and return the document ID"""
         try:
@@ -141,8 +190,10 @@ class DocumentProcessor:
             document_id = f"arxiv_{arxiv_id.replace('.', '_')}"
             
             # Load and process the document
+            report_ingest_progress("downloading", 0, 1)
             loader = ArxivLoader(query=arxiv_id, load_max_docs=1)
             docs = loader.load()
+            report_ingest_progress("downloading", 1, 1)
             
             if not docs:
                 raise Exception(f"Could not find arXiv paper with ID: {arxiv_id}")
@@ -154,9 +205,12 @@ class DocumentProcessor:
             metadata = DocumentMetadata(
                 title=metadata_dict.get("Title", "Unknown Title"),
                 authors=metadata_dict.get("Authors", "").split(", "),
-                publication_date=datetime.strptime(metadata_dict.get("Published", "2020-01-01"), "%Y-%m-%d"),
+                # Left unknown rather than guessed when the feed has no date
+                publication_date=(datetime.strptime(str(metadata_dict["Published"]), "%Y-%m-%d")
+                                  if metadata_dict.get("Published") else None),
                 url=f"https://arxiv.org/abs/{arxiv_id}",
-                source="arxiv"
+                source="arxiv",
+                arxiv_id=arxiv_id
             )
             
             # Split into chunks
@@ -177,29 +231,303 @@ class DocumentProcessor:
                 self.docstore.mset([(chunk_id, {"text": chunk, "document_id": document_id, "chunk_id": chunk_id})])
                 
             # Create embeddings and store in vector store
-            self.vectorstore.add_texts(
-                texts=[chunk.text for chunk in doc_chunks],
-                metadatas=[{"document_id": chunk.document_id, "chunk_id": chunk.chunk_id} for chunk in doc_chunks],
-                ids=[chunk.chunk_id for chunk in doc_chunks]
-            )
+            self._add_chunks(doc_chunks)
             
-            print("Added document to state:", document_id)
+            # Registered only once its chunks are stored, so a failed ingest leaves no entry behind
+            self.metadata_registry.put(document_id, metadata)
+            self._bump_corpus_version()
+            
+            logger.info("Processed arXiv paper into %d chunks", len(doc_chunks), extra={"document_id": document_id})
             return document_id
             
+        except IngestCancelled:
+            raise
         except Exception as e:
             raise Exception(f"Error processing arXiv paper: {str(e)}")
     
+    def _bump_corpus_version(self):
+        with self._version_lock:
+            self.corpus_version += 1
+    
+    def _add_chunks(self, doc_chunks: List[DocumentChunk]):
+        """Embed chunks into the vector store in batches, reporting progress between batches.
+
+        If the ingest is cancelled part-way, the chunks already added are removed again.
+        """
+        chunk_ids = [chunk.chunk_id for chunk in doc_chunks]
+        try:
+            report_ingest_progress("embedding", 0, len(doc_chunks))
+            for start in range(0, len(doc_chunks), config.INGEST_EMBED_BATCH_SIZE):
+                batch = doc_chunks[start:start + config.INGEST_EMBED_BATCH_SIZE]
+                texts = [chunk.text for chunk in batch]
+                # Embedded outside the write lock, so concurrent ingests still share embedding batches
+                self._upsert(
+                    ids=[chunk.chunk_id for chunk in batch],  # Add explicit IDs
+                    embeddings=self.embeddings.embed_documents(texts),
+                    metadatas=[{"document_id": chunk.document_id, "chunk_id": chunk.chunk_id} for chunk in batch],
+                    documents=texts
+                )
+                report_ingest_progress("embedding", start + len(batch), len(doc_chunks))
+        except IngestCancelled:
+            with self._write_lock:
+                if self.embedding_store is not None:
+                    self.embedding_store.delete(chunk_ids)
+                    self.chunk_table.delete(chunk_ids)
+                else:
+                    self.vectorstore.delete(ids=chunk_ids)
+            self.docstore.mdelete(chunk_ids)
+            raise
+    
+    def _upsert(self, ids, embeddings, metadatas, documents):
+        """Write embedded chunks to the Chroma collection, or to the chunk table and embedding store when enabled"""
+        with self._write_lock:
+            if self.embedding_store is not None:
+                # Texts first: a search drops hits whose text is missing
+                self.chunk_table.upsert(ids, metadatas, documents)
+                self.embedding_store.append(ids, embeddings, [(metadata or {}).get("document_id", "unknown")
+                                                              for metadata in metadatas])
+            else:
+                self.vectorstore._collection.upsert(ids=ids, embeddings=embeddings, metadatas=metadatas,
+                                                    documents=documents)
+    
+    def _move_collection_to_store(self):
+        """Move the chunks of a collection built with the embedding store off into the store and chunk table"""
+        client, collection = self.vectorstore._client, self.vectorstore._collection
+        with self._write_lock:
+            offset = 0
+            while True:
+                page = collection.get(limit=SCAN_BATCH_SIZE, offset=offset,
+                                      include=["embeddings", "metadatas", "documents"])
+                if len(page["ids"]):
+                    self.chunk_table.upsert(page["ids"], page["metadatas"], page["documents"])
+                    self.embedding_store.append(page["ids"], page["embeddings"],
+                                                [(metadata or {}).get("document_id", "unknown")
+                                                 for metadata in page["metadatas"]])
+                if len(page["ids"]) < SCAN_BATCH_SIZE:
+                    break
+                offset += SCAN_BATCH_SIZE
+            # Emptied rather than kept in sync, so the HNSW index is not loaded again
+            client.delete_collection(COLLECTION_NAME)
+            self.vectorstore._collection = client.create_collection(COLLECTION_NAME, embedding_function=None,
+                                                                    metadata=collection.metadata)
+        logger.info("Moved %d chunks from the collection into the embedding store", len(self.embedding_store))
+    
+    def _scan(self, embeddings: bool = False):
+        """Every indexed chunk, as pages of (ids, metadatas, texts, embeddings or None)"""
+        if self.embedding_store is not None:
+            for ids, metadatas, texts in self.chunk_table.scan(SCAN_BATCH_SIZE):
+                yield ids, metadatas, texts, self.embedding_store.vectors(ids) if embeddings else None
+            return
+        collection = self.vectorstore._collection
+        include = ["metadatas", "documents"] + (["embeddings"] if embeddings else [])
+        offset = 0
+        while True:
+            page = collection.get(limit=SCAN_BATCH_SIZE, offset=offset, include=include)
+            if len(page["ids"]):
+                yield page["ids"], page["metadatas"], page["documents"], page["embeddings"] if embeddings else None
+            if len(page["ids"]) < SCAN_BATCH_SIZE:
+                break
+            offset += SCAN_BATCH_SIZE
+    
+    def _chunk_count(self) -> int:
+        if self.embedding_store is not None:
+            return self.chunk_table.count()
+        return self.vectorstore._collection.count()
+    
+    def _dimensions(self) -> int:
+        if self.embedding_store is not None:
+            return self.embedding_store.dimensions or 0
+        sample = self.vectorstore._collection.get(limit=1, include=["embeddings"])
+        return len(sample["embeddings"][0]) if len(sample["ids"]) else 0
+    
+    def list_documents(self) -> List[DocumentInfo]:
+        """Indexed documents with their chunk counts, text size and embedding size"""
+        dimensions = self._dimensions()
+        documents: Dict[str, DocumentInfo] = {}
+        for _, metadatas, texts, _ in self._scan():
+            for metadata, text in zip(metadatas, texts):
+                document_id = (metadata or {}).get("document_id", "unknown")
+                info = documents.get(document_id)
+                if info is None:
+                    metadata_entry = self.metadata_registry.get(document_id)
+                    info = documents[document_id] = DocumentInfo(
+                        document_id=document_id, title=metadata_entry.title if metadata_entry else None)
+                info.chunks += 1
+                info.text_bytes += len((text or "").encode("utf-8"))
+                info.embedding_bytes += dimensions * 4  # float32
+        return sorted(documents.values(), key=lambda info: info.document_id)
+    
+    def delete_documents(self, document_ids: List[str]) -> int:
+        """Remove documents' vectors, chunks and metadata from the index; returns the number of chunks deleted"""
+        if not document_ids:
+            return 0
+        with self._write_lock:
+            if self.embedding_store is not None:
+                chunk_ids = self.chunk_table.chunk_ids(list(document_ids))
+                self.chunk_table.delete(chunk_ids)
+                self.embedding_store.delete(chunk_ids)
+            else:
+                collection = self.vectorstore._collection
+                chunk_ids = collection.get(where={"document_id": {"$in": list(document_ids)}}, include=[])["ids"]
+                for start in range(0, len(chunk_ids), SCAN_BATCH_SIZE):
+                    collection.delete(ids=chunk_ids[start:start + SCAN_BATCH_SIZE])
+            self._deleted_chunks += len(chunk_ids)
+        self.docstore.mdelete(chunk_ids)
+        for document_id in document_ids:
+            self.metadata_registry.remove(document_id)
+        self._bump_corpus_version()
+        logger.info("Deleted %d documents (%d chunks)", len(document_ids), len(chunk_ids))
+        return len(chunk_ids)
+    
+    def dead_fraction(self) -> float:
+        """Fraction of the stored rows that are deleted chunks, still taking space until a rebuild"""
+        dead = self._deleted_chunks
+        if self.embedding_store is not None:
+            dead = max(dead, self.embedding_store.stats()["dead_rows"])
+        return dead / (dead + self._chunk_count()) if dead else 0.0
+    
+    def vacuum(self, rebuild: Optional[bool] = None) -> Dict[str, Any]:
+        """Compact the persisted store; returns its size in bytes before and after, and whether it was rebuilt.
+
+        Deleted vectors are only marked as deleted in Chroma's HNSW index, so a rebuild
+        copies the live chunks into a fresh collection that replaces the old one (with the
+        embedding store on, it rewrites the store without its deleted rows). By default it only happens
+        once dead_fraction() reaches config.VACUUM_DEAD_FRACTION, since it rewrites every
+        live chunk and holds the write lock meanwhile; `rebuild` forces or skips it. Index
+        directories of dropped collections are removed and the SQLite database is vacuumed
+        to give the freed pages back to the file system.
+
+        Not safe while other processes have the store open: they keep using the dropped
+        collection. Run it from the only process using the directory.
+        """
+        size_before = _directory_size(self.persist_directory)
+        if rebuild is None:
+            dead = self.dead_fraction()
+            rebuild = dead > 0 and dead >= config.VACUUM_DEAD_FRACTION
+        with self._write_lock:
+            if rebuild:
+                if self.embedding_store is not None:
+                    self.embedding_store.compact()
+                else:
+                    self._rebuild_collection()
+                self._deleted_chunks = 0
+            if self.chunk_table is not None:
+                self.chunk_table.vacuum()
+            database = os.path.join(self.persist_directory, "chroma.sqlite3")
+            if os.path.exists(database):
+                try:
+                    with sqlite3.connect(database, timeout=30) as conn:
+                        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                    conn = sqlite3.connect(database, timeout=30, isolation_level=None)
+                    try:
+                        segments = {row[0] for row in conn.execute("SELECT id FROM segments")}
+                        conn.execute("VACUUM")
+                    finally:
+                        conn.close()
+                    self._remove_orphaned_segments(segments)
+                except sqlite3.OperationalError as e:
+                    logger.warning("Could not vacuum %s: %s", database, e)
+        size_after = _directory_size(self.persist_directory)
+        logger.info("Vacuumed vector store: %d -> %d bytes (rebuilt: %s)", size_before, size_after, rebuild)
+        return {"bytes_before": size_before, "bytes_after": size_after, "rebuilt": rebuild}
+    
+    def export_snapshot(self, path: str) -> Dict[str, Any]:
+        """Write every indexed chunk, its metadata and its embedding to a snapshot directory; returns the manifest"""
+        document_ids = set()
+        # No writes while the chunks are scanned, so the snapshot is consistent
+        with self._write_lock:
+            rows = self._chunk_count()
+            writer = SnapshotWriter(path, rows, self._dimensions(), embedding_model_name(self.embeddings))
+            for ids, metadatas, texts, embeddings in self._scan(embeddings=True):
+                writer.write(ids, embeddings, metadatas, texts)
+                document_ids.update((metadata or {}).get("document_id") for metadata in metadatas)
+        documents = {}
+        for document_id in sorted(filter(None, document_ids)):
+            metadata = self.metadata_registry.get(document_id)
+            if metadata is not None:
+                documents[document_id] = metadata.model_dump(mode="json")
+        manifest = writer.close(documents)
+        logger.info("Exported %d chunks to snapshot %s", rows, path)
+        return manifest
+    
+    def import_snapshot(self, path: str, force: bool = False) -> int:
+        """Load a snapshot's chunks and embeddings into the index without running the embedding model.
+
+        Chunks already in the index with the same IDs are overwritten. A snapshot made
+        with a different embedding model is refused unless `force` is set, since its
+        vectors would not be comparable with query embeddings.
+        """
+        snapshot = Snapshot(path)
+        model = embedding_model_name(self.embeddings)
+        if snapshot.manifest["embedding_model"] != model and not force:
+            raise ValueError(f"snapshot was embedded with {snapshot.manifest['embedding_model']}, "
+                             f"this index uses {model}")
+        for batch in snapshot.batches(SCAN_BATCH_SIZE):
+            self._upsert(**batch)
+            self.docstore.mset([(chunk_id, Document(page_content=text, metadata=metadata))
+                                for chunk_id, text, metadata in zip(batch["ids"], batch["documents"], batch["metadatas"])])
+        self.metadata_registry.put_many({document_id: DocumentMetadata.model_validate(entry)
+                                         for document_id, entry in snapshot.documents.items()})
+        self._bump_corpus_version()
+        logger.info("Imported %d chunks from snapshot %s", snapshot.rows, path)
+        return snapshot.rows
+    
+    def _remove_orphaned_segments(self, segments):
+        """Delete index directories (named by segment UUID) that no segment refers to any more"""
+        for name in os.listdir(self.persist_directory):
+            path = os.path.join(self.persist_directory, name)
+            try:
+                uuid.UUID(name)
+            except ValueError:
+                continue
+            if os.path.isdir(path) and name not in segments:
+                shutil.rmtree(path, ignore_errors=True)
+    
+    def _rebuild_collection(self):
+        """Copy the live chunks into a new collection and swap it in (called with the write lock held)"""
+        client, old = self.vectorstore._client, self.vectorstore._collection
+        compact_name = f"{COLLECTION_NAME}_compact"
+        try:
+            client.delete_collection(compact_name)  # Left over from an interrupted rebuild
+        except Exception:
+            pass
+        compact = client.create_collection(compact_name, embedding_function=None, metadata=old.metadata)
+        offset = 0
+        while True:
+            page = old.get(limit=SCAN_BATCH_SIZE, offset=offset, include=["embeddings", "metadatas", "documents"])
+            if len(page["ids"]):
+                compact.add(ids=page["ids"], embeddings=page["embeddings"], metadatas=page["metadatas"],
+                            documents=page["documents"])
+            if len(page["ids"]) < SCAN_BATCH_SIZE:
+                break
+            offset += SCAN_BATCH_SIZE
+        # Queries move to the new collection before the old one is dropped and its name taken over
+        self.vectorstore._collection = compact
+        client.delete_collection(COLLECTION_NAME)
+        compact.modify(name=COLLECTION_NAME)
+    
+    def embedding_metrics(self):
+        """Micro-batching metrics of the embedding service (empty when batching is off)"""
+        return self.embeddings.metrics() if isinstance(self.embeddings, BatchingEmbeddings) else {}
+    
+    def _search_embedding_store(self, query: str, document_ids: Optional[List[str]], k: int) -> List[Document]:
+        """Nearest chunks from the memory-mapped embedding store, with their texts read from the chunk table"""
+        hits = self.embedding_store.search(self.embeddings.embed_query(query), k, document_ids)
+        if not hits:
+            return []
+        found = self.chunk_table.get([chunk_id for chunk_id, _ in hits])
+        return [Document(page_content=found[chunk_id][0], metadata=found[chunk_id][1])
+                for chunk_id, _ in hits if chunk_id in found]
+    
     def retrieve_relevant_chunks(self, query: str, document_ids: Optional[List[str]] = None, k: int = 5):
         """Retrieve relevant chunks for a query"""
         try:
-            print("DEBUG: Starting chunk retrieval")
-            print("DEBUG: Query:", query)
-            print("DEBUG: Document IDs:", document_ids)
-            print("DEBUG: Number of chunks to retrieve:", k)
+            logger.debug("Retrieving %d chunks for %r from %s", k, query, document_ids or "all documents")
             
             # First try direct vector store search
-            if document_ids:
-                print("DEBUG: Filtering by document IDs")
+            if self.embedding_store is not None:
+                docs = self._search_embedding_store(query, document_ids, k)
+            elif document_ids:
                 filter_dict = {"document_id": {"$in": document_ids}}
                 docs = self.vectorstore.similarity_search(
                     query,
@@ -207,10 +535,9 @@ class DocumentProcessor:
                     filter=filter_dict
                 )
             else:
-                print("DEBUG: No document IDs provided, retrieving from all documents")
                 docs = self.vectorstore.similarity_search(query, k=k)
             
-            print("DEBUG: Retrieved chunks:", len(docs))
+            logger.debug("Retrieved %d chunks", len(docs))
             
             # Convert retrieved docs to proper Document objects
             processed_docs = []
@@ -227,13 +554,10 @@ class DocumentProcessor:
                 else:
                     processed_doc = doc
                 processed_docs.append(processed_doc)
-                print(f"DEBUG: Chunk {len(processed_docs)}:", 
-                      processed_doc.metadata.get("document_id"), 
-                      processed_doc.page_content[:100] + "...")
             
             return processed_docs
             
         except Exception as e:
-            print("ERROR in retrieve_relevant_chunks:", str(e))
+            logger.error("Error retrieving chunks: %s", e)
             raise
 
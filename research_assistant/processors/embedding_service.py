@@ -0,0 +1,159 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from ..utils.llm_utils import _distribution
+from ..utils.tracing import annotate
+from .. import config
+
+logger = logging.getLogger(__name__)
+
+class _EncodeRequest:
+    def __init__(self, texts: List[str], query: bool):
+        self.texts = texts
+        self.query = query
+        self.future = Future()
+        self.submitted = time.perf_counter()
+        self.started = None  # When its batch went to the model
+        self.batch_size = 0
+
+class BatchingEmbeddings(Embeddings):
+    """Embeddings that funnel every caller's texts through one worker thread in micro-batches.
+
+    Ingests and queries on different threads each encode a handful of texts; the worker
+    collects whatever is queued into one batch of up to `max_batch_size` texts, waiting at
+    most `max_wait` seconds for more after the first request, and runs it through the
+    model in one call. While the model is busy, new requests pile up and form the next
+    batch. Queries are encoded with `embed_documents` alongside document texts unless
+    `batch_queries` is off (for models that embed queries differently).
+    """
+    def __init__(self, embeddings: Embeddings,
+                 max_batch_size: int = config.EMBEDDING_BATCH_MAX_SIZE,
+                 max_wait: float = config.EMBEDDING_BATCH_MAX_WAIT_MS / 1000.0,
+                 batch_queries: bool = True):
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batch_queries = batch_queries
+
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._closed = False
+
+        # Metrics
+        self._batches = 0
+        self._texts = 0
+        self._failures = 0
+        self._batch_sizes = deque(maxlen=1000)
+        self._requests_per_batch = deque(maxlen=1000)
+        self._queue_latencies = deque(maxlen=1000)
+        self._encode_latencies = deque(maxlen=1000)
+        self._max_queue_depth = 0
+
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._submit(list(texts), query=False)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._submit([text], query=True)[0]
+
+    def _submit(self, texts: List[str], query: bool) -> List[List[float]]:
+        if not texts:
+            return []
+        request = _EncodeRequest(texts, query and not self.batch_queries)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("embedding service is closed")
+            self._queue.append(request)
+            self._max_queue_depth = max(self._max_queue_depth, len(self._queue))
+            self._cond.notify()
+        vectors = request.future.result()
+        annotate(embedding_queue_wait=request.started - request.submitted, embedding_batch=request.batch_size)
+        return vectors
+
+    def _next_batch(self) -> List[_EncodeRequest]:
+        """Wait for a request, then gather compatible queued requests up to the size and time bounds"""
+        with self._cond:
+            while not self._queue:
+                if self._closed:
+                    return []
+                self._cond.wait()
+            batch = [self._queue.popleft()]
+            size = len(batch[0].texts)
+            deadline = time.perf_counter() + self.max_wait
+            while size < self.max_batch_size:
+                if not self._queue:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                    continue
+                request = self._queue[0]
+                if request.query != batch[0].query or size + len(request.texts) > self.max_batch_size:
+                    break
+                batch.append(self._queue.popleft())
+                size += len(request.texts)
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            started = time.perf_counter()
+            texts = [text for request in batch for text in request.texts]
+            for request in batch:
+                request.started, request.batch_size = started, len(texts)
+            try:
+                if batch[0].query:
+                    vectors = [self.embeddings.embed_query(text) for text in texts]
+                else:
+                    vectors = self.embeddings.embed_documents(texts)
+            except Exception as e:
+                logger.error("Embedding batch of %d texts failed: %s", len(texts), e)
+                with self._cond:
+                    self._failures += 1
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            finished = time.perf_counter()
+            with self._cond:
+                self._batches += 1
+                self._texts += len(texts)
+                self._batch_sizes.append(len(texts))
+                self._requests_per_batch.append(len(batch))
+                self._encode_latencies.append(finished - started)
+                self._queue_latencies.extend(started - request.submitted for request in batch)
+            offset = 0
+            for request in batch:
+                request.future.set_result(vectors[offset:offset + len(request.texts)])
+                offset += len(request.texts)
+
+    def close(self):
+        """Stop the worker once the requests already queued are encoded"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._worker.join()
+
+    def metrics(self):
+        """Snapshot of batch sizes, queue latency (submit to encode start) and encode time"""
+        with self._cond:
+            return {
+                "queue_depth": len(self._queue),
+                "max_queue_depth": self._max_queue_depth,
+                "batches": self._batches,
+                "texts": self._texts,
+                "failures": self._failures,
+                "batch_size": _distribution(self._batch_sizes),
+                "requests_per_batch": _distribution(self._requests_per_batch),
+                "queue_latency": _distribution(self._queue_latencies),
+                "encode_latency": _distribution(self._encode_latencies),
+            }
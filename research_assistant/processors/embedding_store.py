@@ -0,0 +1,419 @@
+"""Append-only, memory-mapped store of chunk embeddings, searched with vectorized NumPy scoring.
+
+Layout of a store directory:
+    store.json           format version, dimensions, quantization and current generation
+    vectors.<gen>.f32    float32 rows, only ever appended to (compact() writes a new generation)
+    codes.<gen>.i8       int8 codes of the rows, when the store is quantized
+    scales.<gen>.f32     float32 scale of each row's codes (row ~= scale * codes)
+    rows.<gen>.log       one line per change, in order: "+<TAB>chunk_id<TAB>document_id" adds the
+                         next row, "-<TAB>chunk_id" deletes a chunk
+
+A row's vector (and codes) are written before its log line, so the log line commits the row;
+data left without one by an interrupted append is truncated by the next writer. Readers map the
+vector file read-only, so processes opening the same store share its pages through the page
+cache, and pick up rows appended by other processes by reading the new lines of the log.
+A chunk added again under the same ID supersedes its earlier row.
+
+A quantized store scans the int8 codes, a quarter of the float32 matrix, for a shortlist of
+candidates and ranks only those by their full-precision vectors.
+"""
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized within one process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+# Rows scored per NumPy call, bounding the temporary arrays of a scan
+SEARCH_BLOCK_ROWS = 65536
+# Rows of int8 codes converted to float32 at a time, few enough for the buffer to stay in CPU cache
+CODE_BLOCK_ROWS = 512
+INT8 = "int8"
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric int8 codes with one scale per row, so rows can be appended without recalibration"""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+def int8_dot(codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """codes @ query for int8 codes, without materializing the codes as a float32 array"""
+    out = np.empty(len(codes), dtype=np.float32)
+    buffer = np.empty((min(CODE_BLOCK_ROWS, len(codes)), codes.shape[1]), dtype=np.float32)
+    for start in range(0, len(codes), CODE_BLOCK_ROWS):
+        stop = min(start + CODE_BLOCK_ROWS, len(codes))
+        block = buffer[:stop - start]
+        block[...] = codes[start:stop]
+        np.dot(block, query, out=out[start:stop])
+    return out
+
+def read_rows(path: str, rows: np.ndarray, dimensions: int) -> np.ndarray:
+    """float32 rows read from the file rather than the mapping: touching a mapped row faults in
+    the whole page (or larger folio) around it, so rescoring through the mapping would leave most
+    of the matrix resident after a few searches"""
+    out = np.empty((len(rows), dimensions), dtype=np.float32)
+    with open(path, "rb") as f:
+        for i, row in enumerate(rows):
+            f.seek(int(row) * dimensions * 4)
+            f.readinto(memoryview(out[i]).cast("B"))
+    return out
+
+def squared_norms(rows: np.ndarray) -> np.ndarray:
+    norms = np.empty(len(rows), dtype=np.float32)
+    for start in range(0, len(rows), SEARCH_BLOCK_ROWS):
+        block = np.asarray(rows[start:start + SEARCH_BLOCK_ROWS], dtype=np.float32)
+        norms[start:start + len(block)] = np.einsum("ij,ij->i", block, block)
+    return norms
+
+class EmbeddingStore:
+    """Chunk embeddings in an append-only float32 file with a row -> chunk ID index.
+
+    `rescore_factor` sets the shortlist of a quantized search: k * rescore_factor candidates
+    from the codes are rescored against their float32 vectors.
+    """
+    def __init__(self, path: str, rescore_factor: int = 10):
+        self.path = path
+        self.rescore_factor = rescore_factor
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()  # Guards the in-memory index
+        self._write_lock = threading.Lock()
+        self._manifest_key = None
+        self._reset({"dimensions": None, "generation": 0})
+        self.refresh()
+
+    def _reset(self, manifest):
+        self.dimensions = manifest["dimensions"]
+        self.generation = manifest["generation"]
+        self.quantization = manifest.get("quantization")
+        self._log_offset = 0
+        self._row_ids: List[str] = []
+        self._chunk_rows = {}  # Chunk ID -> its current row
+        self._document_codes = {}  # Document ID -> code in _row_documents
+        self._document_names: List[str] = []
+        self._row_documents = np.empty(0, dtype=np.int32)
+        self._live = np.empty(0, dtype=bool)
+        self._norms = np.empty(0, dtype=np.float32)  # Squared norms, for L2 distances
+        self._vectors = np.empty((0, self.dimensions or 0), dtype=np.float32)
+        self._codes = np.empty((0, self.dimensions or 0), dtype=np.int8)
+        self._scales = np.empty(0, dtype=np.float32)
+
+    def _vectors_path(self, generation: Optional[int] = None) -> str:
+        return os.path.join(self.path, f"vectors.{self.generation if generation is None else generation}.f32")
+
+    def _codes_path(self, generation: Optional[int] = None) -> str:
+        return os.path.join(self.path, f"codes.{self.generation if generation is None else generation}.i8")
+
+    def _scales_path(self, generation: Optional[int] = None) -> str:
+        return os.path.join(self.path, f"scales.{self.generation if generation is None else generation}.f32")
+
+    def _log_path(self, generation: Optional[int] = None) -> str:
+        return os.path.join(self.path, f"rows.{self.generation if generation is None else generation}.log")
+
+    def _write_manifest(self, dimensions: int, generation: int, quantization: Optional[str]):
+        tmp_path = os.path.join(self.path, "store.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"version": FORMAT_VERSION, "dimensions": dimensions, "generation": generation,
+                       "quantization": quantization}, f)
+        os.replace(tmp_path, os.path.join(self.path, "store.json"))
+
+    @contextmanager
+    def _writing(self):
+        """Serialize writers, across processes where the platform supports file locks"""
+        with self._write_lock, open(os.path.join(self.path, "lock"), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def refresh(self):
+        """Pick up the rows added and chunks deleted since the last call, by this or another process"""
+        with self._lock:
+            try:
+                stat = os.stat(os.path.join(self.path, "store.json"))
+            except FileNotFoundError:
+                return  # Nothing stored yet
+            key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            if key != self._manifest_key:
+                with open(os.path.join(self.path, "store.json")) as f:
+                    manifest = json.load(f)
+                if manifest.get("version") != FORMAT_VERSION:
+                    raise ValueError(f"unsupported embedding store version {manifest.get('version')}")
+                if ((manifest["generation"], manifest["dimensions"], manifest.get("quantization"))
+                        != (self.generation, self.dimensions, self.quantization)):
+                    self._reset(manifest)
+                self._manifest_key = key
+            self._read_log()
+
+    def _read_log(self):
+        try:
+            size = os.path.getsize(self._log_path())
+            if size <= self._log_offset:
+                return
+            vector_rows = os.path.getsize(self._vectors_path()) // (self.dimensions * 4)
+            if self.quantization:
+                vector_rows = min(vector_rows, os.path.getsize(self._codes_path()) // self.dimensions,
+                                  os.path.getsize(self._scales_path()) // 4)
+            with open(self._log_path(), "rb") as f:
+                f.seek(self._log_offset)
+                data = f.read(size - self._log_offset)
+        except FileNotFoundError:
+            return  # Not written yet, or replaced by compact() (the next refresh reads the new generation)
+
+        first_row = len(self._row_ids)
+        codes, dead = [], []
+        for line in data.split(b"\n")[:-1]:  # The last piece is empty or a line still being written
+            fields = line.decode("utf-8").split("\t")
+            if fields[0] == "+" and len(self._row_ids) >= vector_rows:
+                break
+            previous = self._chunk_rows.pop(fields[1], None)
+            if previous is not None:
+                dead.append(previous)
+            if fields[0] == "+":
+                self._chunk_rows[fields[1]] = len(self._row_ids)
+                self._row_ids.append(fields[1])
+                code = self._document_codes.get(fields[2])
+                if code is None:
+                    code = self._document_codes[fields[2]] = len(self._document_names)
+                    self._document_names.append(fields[2])
+                codes.append(code)
+            self._log_offset += len(line) + 1
+
+        # New arrays rather than in-place updates, so searches running now keep a consistent view
+        rows = len(self._row_ids)
+        if codes:
+            self._vectors = np.memmap(self._vectors_path(), dtype=np.float32, mode="r", shape=(rows, self.dimensions))
+            if self.quantization:
+                # Norms of the codes, so opening a quantized store does not read the float32 rows
+                self._codes = np.memmap(self._codes_path(), dtype=np.int8, mode="r", shape=(rows, self.dimensions))
+                self._scales = np.memmap(self._scales_path(), dtype=np.float32, mode="r", shape=(rows,))
+                added = squared_norms(self._codes[first_row:]) * np.square(self._scales[first_row:])
+            else:
+                added = squared_norms(self._vectors[first_row:])
+            self._norms = np.concatenate([self._norms, added])
+            self._row_documents = np.concatenate([self._row_documents, np.asarray(codes, dtype=np.int32)])
+        live = np.concatenate([self._live, np.ones(rows - first_row, dtype=bool)])
+        live[dead] = False
+        self._live = live
+
+    def append(self, chunk_ids: List[str], embeddings, document_ids: List[str]):
+        """Add rows for embedded chunks; existing rows are never rewritten"""
+        vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if not len(chunk_ids):
+            return
+        if vectors.ndim != 2 or len(vectors) != len(chunk_ids) or len(document_ids) != len(chunk_ids):
+            raise ValueError("append() needs one vector and one document ID per chunk")
+        with self._writing():
+            self.refresh()
+            if self.dimensions is None:
+                self._write_manifest(vectors.shape[1], self.generation, self.quantization)
+                self.refresh()
+            if vectors.shape[1] != self.dimensions:
+                raise ValueError(f"embeddings have {vectors.shape[1]} dimensions, the store holds {self.dimensions}")
+            self._truncate_uncommitted()
+            with open(self._vectors_path(), "ab") as f:
+                f.write(vectors.tobytes())
+            if self.quantization:
+                self._append_codes(vectors, self.generation)
+            with open(self._log_path(), "a", encoding="utf-8", newline="\n") as f:
+                f.writelines(f"+\t{chunk_id}\t{document_id}\n" for chunk_id, document_id in zip(chunk_ids, document_ids))
+            self.refresh()
+
+    def delete(self, chunk_ids: List[str]) -> int:
+        """Mark chunks as deleted; their rows stay in the file until compact()"""
+        with self._writing():
+            self.refresh()
+            deleted = [chunk_id for chunk_id in dict.fromkeys(chunk_ids) if chunk_id in self._chunk_rows]
+            if deleted:
+                self._truncate_uncommitted()
+                with open(self._log_path(), "a", encoding="utf-8", newline="\n") as f:
+                    f.writelines(f"-\t{chunk_id}\n" for chunk_id in deleted)
+                self.refresh()
+            return len(deleted)
+
+    def vectors(self, chunk_ids: List[str]) -> np.ndarray:
+        """float32 vectors of the given live chunks, in order"""
+        self.refresh()
+        with self._lock:
+            rows = np.array([self._chunk_rows[chunk_id] for chunk_id in chunk_ids], dtype=np.int64)
+            path, dimensions = self._vectors_path(), self.dimensions or 0
+        try:
+            return read_rows(path, rows, dimensions)
+        except FileNotFoundError:  # Replaced by compact() since the index was read
+            return self.vectors(chunk_ids)
+
+    def _append_codes(self, vectors: np.ndarray, generation: int):
+        codes, scales = quantize_int8(vectors)
+        with open(self._codes_path(generation), "ab") as f:
+            f.write(codes.tobytes())
+        with open(self._scales_path(generation), "ab") as f:
+            f.write(scales.tobytes())
+
+    def _truncate_uncommitted(self):
+        """Drop what an interrupted append left behind: rows without log lines, a torn last line"""
+        rows = len(self._row_ids)
+        sizes = {self._vectors_path(): rows * self.dimensions * 4, self._log_path(): self._log_offset}
+        if self.quantization:
+            sizes.update({self._codes_path(): rows * self.dimensions, self._scales_path(): rows * 4})
+        for path, size in sizes.items():
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                os.truncate(path, size)
+
+    def quantize(self):
+        """Add int8 codes for every row; later appends by any process write codes as well"""
+        with self._writing():
+            self.refresh()
+            if self.quantization or self.dimensions is None:
+                if self.dimensions is None:  # Empty store: quantize rows as they arrive
+                    self.quantization = INT8
+                return
+            self._truncate_uncommitted()
+            for path in (self._codes_path(), self._scales_path()):
+                open(path, "wb").close()
+            for start in range(0, len(self._vectors), SEARCH_BLOCK_ROWS):
+                self._append_codes(np.asarray(self._vectors[start:start + SEARCH_BLOCK_ROWS]), self.generation)
+            self._write_manifest(self.dimensions, self.generation, INT8)
+            self.refresh()
+        logger.info("Quantized embedding store %s: %d rows", self.path, len(self._row_ids))
+
+    def dequantize(self):
+        """Drop the int8 codes; searches go back to scanning the float32 vectors"""
+        with self._writing():
+            self.refresh()
+            if not self.quantization or self.dimensions is None:
+                self.quantization = None
+                return
+            self._truncate_uncommitted()
+            self._write_manifest(self.dimensions, self.generation, None)
+            self.refresh()
+        for path in (self._codes_path(), self._scales_path()):
+            try:
+                os.remove(path)
+            except OSError:  # Still mapped by a reader on Windows
+                pass
+        logger.info("Dequantized embedding store %s", self.path)
+
+    def compact(self) -> int:
+        """Rewrite the live rows as a new generation, dropping deleted and superseded rows; returns the rows dropped"""
+        with self._writing():
+            self.refresh()
+            if self.dimensions is None:
+                return 0
+            old_generation = self.generation
+            generation = old_generation + 1
+            rows = np.flatnonzero(self._live)
+            if self.quantization:
+                for path in (self._codes_path(generation), self._scales_path(generation)):
+                    open(path, "wb").close()
+            with open(self._vectors_path(generation), "wb") as f:
+                for start in range(0, len(rows), SEARCH_BLOCK_ROWS):
+                    block = np.ascontiguousarray(self._vectors[rows[start:start + SEARCH_BLOCK_ROWS]])
+                    f.write(block.tobytes())
+                    if self.quantization:
+                        self._append_codes(block, generation)
+            with open(self._log_path(generation), "w", encoding="utf-8", newline="\n") as f:
+                f.writelines(f"+\t{self._row_ids[row]}\t{self._document_names[self._row_documents[row]]}\n"
+                             for row in rows)
+            dropped = len(self._row_ids) - len(rows)
+            self._write_manifest(self.dimensions, generation, self.quantization)
+            self.refresh()
+        for path in (self._vectors_path(old_generation), self._codes_path(old_generation),
+                     self._scales_path(old_generation), self._log_path(old_generation)):
+            try:
+                os.remove(path)
+            except OSError:  # Still mapped by a reader on Windows; removed by a later compact
+                pass
+        logger.info("Compacted embedding store %s: %d rows kept, %d dropped", self.path, len(rows), dropped)
+        return dropped
+
+    def search(self, query, k: int, document_ids: Optional[List[str]] = None,
+               exact: bool = False) -> List[Tuple[str, float]]:
+        """The k nearest live chunks by squared L2 distance, as (chunk_id, distance) pairs, nearest first.
+
+        A quantized store scans the int8 codes for k * rescore_factor candidates and ranks
+        those by their float32 vectors; `exact` scans the float32 vectors instead.
+        """
+        self.refresh()
+        with self._lock:
+            vectors, codes, scales, vectors_path = self._vectors, self._codes, self._scales, self._vectors_path()
+            norms, live, row_ids, row_documents = self._norms, self._live, self._row_ids, self._row_documents
+            document_codes = [self._document_codes[d] for d in document_ids or [] if d in self._document_codes]
+        if not len(vectors) or k <= 0 or (document_ids and not document_codes):
+            return []
+        query = np.asarray(query, dtype=np.float32)
+
+        # Filtered searches only score the rows of the requested documents
+        candidates = np.flatnonzero(live & np.isin(row_documents, document_codes)) if document_ids else None
+        if not self.quantization:
+            rows, scores = self._nearest(lambda rows: norms[rows] - 2 * (vectors[rows] @ query), live, candidates, k)
+        elif exact:
+            # The stored norms are those of the codes; exact distances need the rows' own
+            rows, scores = self._nearest(lambda rows: squared_norms(vectors[rows]) - 2 * (vectors[rows] @ query),
+                                         live, candidates, k)
+        else:
+            shortlist, _ = self._nearest(lambda rows: norms[rows] - 2 * scales[rows] * int8_dot(codes[rows], query),
+                                         live, candidates, k * max(1, self.rescore_factor))
+            rows = np.sort(shortlist)
+            try:
+                shortlisted = read_rows(vectors_path, rows, self.dimensions)
+            except FileNotFoundError:  # Replaced by compact() since the index was read
+                return self.search(query, k, document_ids, exact)
+            scores = squared_norms(shortlisted) - 2 * (shortlisted @ query)
+            order = np.argsort(scores, kind="stable")[:k]
+            rows, scores = rows[order], scores[order]
+        query_norm = float(query @ query)
+        return [(row_ids[row], max(0.0, float(score) + query_norm)) for row, score in zip(rows, scores)]
+
+    @staticmethod
+    def _nearest(score, live: np.ndarray, candidates: Optional[np.ndarray], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows with the k lowest scores, ascending, scoring the candidate rows (or all live rows) in blocks"""
+        total = len(candidates) if candidates is not None else len(live)
+        best_rows, best_scores = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.float32)]
+        for start in range(0, total, SEARCH_BLOCK_ROWS):
+            stop = min(start + SEARCH_BLOCK_ROWS, total)
+            if candidates is not None:
+                rows = candidates[start:stop]
+                scores = score(rows)
+            else:
+                rows = np.arange(start, stop)
+                scores = score(slice(start, stop))
+                scores[~live[start:stop]] = np.inf
+            if len(scores) > k:
+                top = np.argpartition(scores, k - 1)[:k]
+                rows, scores = rows[top], scores[top]
+            best_rows.append(rows)
+            best_scores.append(scores)
+        rows, scores = np.concatenate(best_rows), np.concatenate(best_scores)
+        order = np.argsort(scores, kind="stable")[:k]
+        order = order[np.isfinite(scores[order])]
+        return rows[order], scores[order]
+
+    def __len__(self) -> int:
+        """Number of live chunks"""
+        self.refresh()
+        return len(self._chunk_rows)
+
+    def stats(self):
+        self.refresh()
+        with self._lock:
+            rows = len(self._row_ids)
+            return {
+                "chunks": len(self._chunk_rows),
+                "rows": rows,
+                "dead_rows": rows - len(self._chunk_rows),
+                "dimensions": self.dimensions,
+                "generation": self.generation,
+                "quantization": self.quantization,
+                "file_bytes": rows * (self.dimensions or 0) * 4,
+                # What a search scans: the codes and scales of a quantized store, else the float32 rows
+                "scan_bytes": rows * ((self.dimensions or 0) + 4 if self.quantization else (self.dimensions or 0) * 4),
+            }
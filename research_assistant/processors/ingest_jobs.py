@@ -0,0 +1,146 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, List, Optional
+
+from ..models.job import IngestJob, JobStatus, StageProgress
+from .. import config
+
+logger = logging.getLogger(__name__)
+
+# Job the ingest running in the current context belongs to
+_current_job = contextvars.ContextVar("ingest_job", default=None)
+
+class IngestCancelled(Exception):
+    """Raised inside an ingest when its job has been cancelled"""
+
+class _JobHandle:
+    def __init__(self, job: IngestJob, lock: threading.Lock):
+        self.job = job
+        self.lock = lock
+        self.cancelled = threading.Event()
+
+def report_ingest_progress(stage: str, done: int, total: Optional[int] = None):
+    """Record progress of the current ingest stage; raises IngestCancelled if the job was cancelled.
+
+    A no-op outside a background job, so the processor reports progress unconditionally.
+    """
+    handle = _current_job.get()
+    if handle is None:
+        return
+    with handle.lock:
+        handle.job.stage = stage
+        handle.job.progress[stage] = StageProgress(done=done, total=total)
+    if handle.cancelled.is_set():
+        raise IngestCancelled(handle.job.job_id)
+
+@contextmanager
+def _job_context(handle: _JobHandle):
+    token = _current_job.set(handle)
+    try:
+        yield
+    finally:
+        _current_job.reset(token)
+
+class IngestJobQueue:
+    """Runs ingests on a background worker pool and tracks their status by job ID.
+
+    `ingest` is called with the job's source (a PDF path or an arXiv ID) and returns the
+    document ID. Uploaded temp files handed to `submit` are removed when the job ends,
+    whatever the outcome. Index maintenance that should not block the caller runs on the
+    same workers as a job with a `task` instead of an ingest.
+    """
+    def __init__(self, ingest: Callable[[str], str], max_workers: int = config.INGEST_WORKERS,
+                 max_finished: int = 100):
+        self.ingest = ingest
+        self.max_finished = max_finished
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, _JobHandle]" = OrderedDict()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest-job")
+
+    def submit(self, source: str, display_name: Optional[str] = None, temp_file: bool = False,
+               task: Optional[Callable[[], Any]] = None) -> str:
+        """Queue an ingest and return its job ID; `temp_file` marks `source` as a file to delete afterwards.
+
+        With `task`, the job calls it instead of ingesting `source`, which then only names the job.
+        """
+        job = IngestJob(job_id=uuid.uuid4().hex, source=display_name or os.path.basename(source), created=time.time())
+        handle = _JobHandle(job, self._lock)
+        with self._lock:
+            self._jobs[job.job_id] = handle
+            self._forget_finished()
+        self._pool.submit(self._run, handle, source, temp_file, task)
+        logger.info("Queued ingest of %s", job.source, extra={"job_id": job.job_id})
+        return job.job_id
+
+    def _run(self, handle: _JobHandle, source: str, temp_file: bool, task: Optional[Callable[[], Any]]):
+        job = handle.job
+        try:
+            with self._lock:
+                if handle.cancelled.is_set():
+                    job.status = JobStatus.CANCELLED
+                    return
+                job.status, job.started = JobStatus.RUNNING, time.time()
+            document_id = None
+            with _job_context(handle):
+                if task is not None:
+                    task()
+                else:
+                    document_id = self.ingest(source)
+            with self._lock:
+                job.status, job.document_id, job.stage = JobStatus.COMPLETED, document_id, None
+            logger.info("Ingest job finished", extra={"job_id": job.job_id, "document_id": document_id})
+        except IngestCancelled:
+            with self._lock:
+                job.status = JobStatus.CANCELLED
+            logger.info("Ingest job cancelled", extra={"job_id": job.job_id})
+        except Exception as e:
+            with self._lock:
+                job.status, job.error = JobStatus.FAILED, str(e)
+            logger.error("Ingest job failed: %s", e, extra={"job_id": job.job_id})
+        finally:
+            with self._lock:
+                job.finished = job.finished or time.time()
+            if temp_file:
+                try:
+                    os.unlink(source)
+                except OSError:
+                    pass
+
+    def _forget_finished(self):
+        """Drop the oldest finished jobs beyond max_finished (called with the lock held)"""
+        finished = [job_id for job_id, handle in self._jobs.items() if not handle.job.active]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        """Snapshot of a job's status, or None for an unknown job"""
+        with self._lock:
+            handle = self._jobs.get(job_id)
+            return handle.job.model_copy(deep=True) if handle else None
+
+    def jobs(self) -> List[IngestJob]:
+        with self._lock:
+            return [handle.job.model_copy(deep=True) for handle in self._jobs.values()]
+
+    def cancel(self, job_id: str) -> bool:
+        """Ask a queued or running job to stop; a running ingest stops at its next progress report"""
+        with self._lock:
+            handle = self._jobs.get(job_id)
+            if handle is None or not handle.job.active:
+                return False
+            handle.cancelled.set()
+            if handle.job.status == JobStatus.QUEUED:
+                handle.job.status, handle.job.finished = JobStatus.CANCELLED, time.time()
+        return True
+
+    def shutdown(self, wait: bool = True):
+        for job in self.jobs():
+            self.cancel(job.job_id)
+        self._pool.shutdown(wait=wait)
@@ -0,0 +1,121 @@
+import json
+import os
+import re
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from ..models.document import DocumentMetadata
+from .. import config
+
+DOI_PATTERN = re.compile(r"\b(10\.\d{4,9}/[^\s\"<>]+)", re.IGNORECASE)
+ARXIV_PATTERN = re.compile(r"arXiv:\s*(\d{4}\.\d{4,5})(v\d+)?", re.IGNORECASE)
+
+class MetadataRegistry:
+    """Persistent map of document ID to the DocumentMetadata captured at ingest"""
+    def __init__(self, path: str = config.METADATA_REGISTRY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, DocumentMetadata] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for document_id, entry in json.load(f).items():
+                    self._entries[document_id] = DocumentMetadata.model_validate(entry)
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        data = {document_id: metadata.model_dump(mode="json") for document_id, metadata in self._entries.items()}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def get(self, document_id: str) -> Optional[DocumentMetadata]:
+        return self._entries.get(document_id)
+
+    def put(self, document_id: str, metadata: DocumentMetadata):
+        with self._lock:
+            self._entries[document_id] = metadata
+            self._save()
+
+    def put_many(self, entries: Dict[str, DocumentMetadata]):
+        """Add several entries with a single write of the registry file"""
+        with self._lock:
+            self._entries.update(entries)
+            self._save()
+
+    def remove(self, document_id: str):
+        with self._lock:
+            if self._entries.pop(document_id, None) is not None:
+                self._save()
+
+    def document_ids(self) -> List[str]:
+        return list(self._entries)
+
+    def find(self, file_hash: Optional[str] = None, arxiv_id: Optional[str] = None) -> Optional[str]:
+        """ID of a document ingested from the same file or arXiv paper, if any"""
+        for document_id, metadata in list(self._entries.items()):
+            if (file_hash and metadata.file_hash == file_hash) or (arxiv_id and metadata.arxiv_id == arxiv_id):
+                return document_id
+        return None
+
+def arxiv_date(arxiv_id: str) -> Optional[datetime]:
+    """Month a paper was first submitted to arXiv, from its identifier (YYMM.NNNNN)"""
+    try:
+        return datetime(2000 + int(arxiv_id[:2]), int(arxiv_id[2:4]), 1)
+    except ValueError:
+        return None
+
+def _split_authors(value: str) -> List[str]:
+    # "Last, First; Last, First" lists keep the comma inside each name
+    separator = r"\s*(?:;| and |&)\s*" if ";" in value else r"\s*(?:,| and |&)\s*"
+    parts = re.split(separator, value)
+    return [part.strip() for part in parts if part.strip()]
+
+def _looks_like_author_line(line: str) -> bool:
+    """Names only: capitalised words separated by commas/"and", no digits or sentence punctuation"""
+    if not line or len(line) > 200 or re.search(r"\d|@|\.\s+[a-z]|:", line):
+        return False
+    names = _split_authors(re.sub(r"[*†‡]", "", line))
+    return bool(names) and all(
+        1 < len(name.split()) <= 4 and all(word[:1].isupper() for word in name.split())
+        for name in names
+    )
+
+def extract_pdf_metadata(info: Dict[str, Any], first_page_text: str, fallback_title: str) -> DocumentMetadata:
+    """Build metadata from a PDF info dict, filling gaps with first-page heuristics"""
+    info = {str(key).lstrip("/").lower(): value for key, value in (info or {}).items() if value}
+    lines = [line.strip() for line in first_page_text.splitlines() if line.strip()]
+
+    title = str(info.get("title", "")).strip()
+    authors = _split_authors(str(info.get("author", "")))
+
+    # First page: the title is the first substantial line, the authors usually follow it
+    if not title or title.lower() in ("untitled", "microsoft word"):
+        title_index = next((i for i, line in enumerate(lines[:10]) if 10 <= len(line) <= 200
+                            and not ARXIV_PATTERN.search(line)), None)
+        if title_index is not None:
+            title = lines[title_index]
+            if not authors:
+                authors = next((_split_authors(re.sub(r"[*†‡]", "", line))
+                                for line in lines[title_index + 1:title_index + 4]
+                                if _looks_like_author_line(line)), [])
+
+    head = "\n".join(lines[:40])
+    doi = DOI_PATTERN.search(head)
+    arxiv = ARXIV_PATTERN.search(head)
+
+    # Not the info dict's CreationDate: that is when the file was produced (often a re-export
+    # years later), not when the paper was published. Without an arXiv ID the date stays
+    # missing, so citations fall back to the LLM reading the first page.
+    return DocumentMetadata(
+        title=title or fallback_title,
+        authors=authors,
+        publication_date=arxiv_date(arxiv.group(1)) if arxiv else None,
+        doi=doi.group(1).rstrip(".,;") if doi else None,
+        arxiv_id=arxiv.group(1) if arxiv else None,
+        url=f"https://arxiv.org/abs/{arxiv.group(1)}" if arxiv else None,
+        source="local_upload"
+    )
@@ -0,0 +1,160 @@
+"""Index snapshots: the chunk texts, metadata and embedding matrix of the vector store in a versioned directory.
+
+Layout (format version 1):
+    manifest.json     format, version, row count, dimensions, embedding model, file sizes
+    embeddings.npy    float32 matrix, one row per chunk (np.load(..., mmap_mode="r") maps it)
+    texts.bin         UTF-8 chunk texts, concatenated
+    offsets.npy       int64 byte offsets of each text in texts.bin (rows + 1 entries)
+    metadata.jsonl    one {"id": ..., "metadata": {...}} line per row, in row order
+    documents.json    citation metadata of the documents in the snapshot
+
+    python -m research_assistant.processors.snapshot export snapshots/corpus --persist-directory chroma_db
+    python -m research_assistant.processors.snapshot import snapshots/corpus --persist-directory chroma_db
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+FORMAT = "research-assistant-index-snapshot"
+VERSION = 1
+
+def embedding_model_name(embeddings) -> str:
+    """Identifier of the model behind an embeddings object (unwrapping the batching service)"""
+    embeddings = getattr(embeddings, "embeddings", embeddings)
+    return getattr(embeddings, "model_name", None) or type(embeddings).__name__
+
+class SnapshotWriter:
+    """Writes a snapshot of `rows` chunks page by page, into a temporary directory renamed on close"""
+    def __init__(self, path: str, rows: int, dimensions: int, embedding_model: str):
+        self.path = path
+        self.rows = rows
+        self.dimensions = dimensions
+        self.embedding_model = embedding_model
+        self.tmp_path = f"{path}.tmp"
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+        os.makedirs(self.tmp_path)
+        self.embeddings = np.lib.format.open_memmap(os.path.join(self.tmp_path, "embeddings.npy"), mode="w+",
+                                                    dtype=np.float32, shape=(rows, dimensions))
+        self.offsets = np.zeros(rows + 1, dtype=np.int64)
+        self._texts = open(os.path.join(self.tmp_path, "texts.bin"), "wb")
+        self._metadata = open(os.path.join(self.tmp_path, "metadata.jsonl"), "w")
+        self.written = 0
+
+    def write(self, ids: List[str], embeddings, metadatas: List[Dict[str, Any]], texts: List[str]):
+        end = self.written + len(ids)
+        if end > self.rows:
+            raise ValueError(f"snapshot was sized for {self.rows} rows")
+        self.embeddings[self.written:end] = np.asarray(embeddings, dtype=np.float32)
+        for row, (chunk_id, metadata, text) in enumerate(zip(ids, metadatas, texts), self.written):
+            data = (text or "").encode("utf-8")
+            self._texts.write(data)
+            self.offsets[row + 1] = self.offsets[row] + len(data)
+            self._metadata.write(json.dumps({"id": chunk_id, "metadata": metadata or {}}) + "\n")
+        self.written = end
+
+    def close(self, documents: Dict[str, Any]):
+        """Finish the files, write the manifest and move the snapshot into place"""
+        if self.written != self.rows:
+            raise ValueError(f"snapshot has {self.written} of {self.rows} rows")
+        self.embeddings.flush()
+        del self.embeddings
+        self._texts.close()
+        self._metadata.close()
+        np.save(os.path.join(self.tmp_path, "offsets.npy"), self.offsets)
+        with open(os.path.join(self.tmp_path, "documents.json"), "w") as f:
+            json.dump(documents, f, indent=1)
+        files = {name: os.path.getsize(os.path.join(self.tmp_path, name)) for name in sorted(os.listdir(self.tmp_path))}
+        manifest = {
+            "format": FORMAT,
+            "version": VERSION,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "rows": self.rows,
+            "dimensions": self.dimensions,
+            "dtype": "float32",
+            "embedding_model": self.embedding_model,
+            "files": files,
+        }
+        with open(os.path.join(self.tmp_path, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=1)
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.replace(self.tmp_path, self.path)
+        return manifest
+
+class Snapshot:
+    """A snapshot opened for reading; the embedding matrix and offsets are memory-mapped, not loaded"""
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "manifest.json")) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format") != FORMAT:
+            raise ValueError(f"{path} is not an index snapshot")
+        if self.manifest.get("version") != VERSION:
+            raise ValueError(f"unsupported snapshot version {self.manifest.get('version')} (expected {VERSION})")
+        for name, size in self.manifest["files"].items():
+            if os.path.getsize(os.path.join(path, name)) != size:
+                raise ValueError(f"{path}/{name} does not match the manifest (truncated copy?)")
+        self.embeddings = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        if self.embeddings.shape != (self.manifest["rows"], self.manifest["dimensions"]):
+            raise ValueError(f"{path}/embeddings.npy has shape {self.embeddings.shape}, "
+                             f"expected {(self.manifest['rows'], self.manifest['dimensions'])}")
+        with open(os.path.join(path, "documents.json")) as f:
+            self.documents = json.load(f)
+
+    @property
+    def rows(self) -> int:
+        return self.manifest["rows"]
+
+    def text(self, row: int) -> str:
+        with open(os.path.join(self.path, "texts.bin"), "rb") as f:
+            f.seek(int(self.offsets[row]))
+            return f.read(int(self.offsets[row + 1] - self.offsets[row])).decode("utf-8")
+
+    def batches(self, batch_size: int) -> Iterable[Dict[str, Any]]:
+        """Rows in order as {"ids", "embeddings", "metadatas", "documents"} batches"""
+        with open(os.path.join(self.path, "metadata.jsonl")) as metadata_file, \
+                open(os.path.join(self.path, "texts.bin"), "rb") as texts_file:
+            for start in range(0, self.rows, batch_size):
+                stop = min(start + batch_size, self.rows)
+                entries = [json.loads(next(metadata_file)) for _ in range(start, stop)]
+                data = texts_file.read(int(self.offsets[stop] - self.offsets[start]))
+                base = int(self.offsets[start])
+                texts = [data[int(self.offsets[row]) - base:int(self.offsets[row + 1]) - base].decode("utf-8")
+                         for row in range(start, stop)]
+                yield {
+                    "ids": [entry["id"] for entry in entries],
+                    "embeddings": np.asarray(self.embeddings[start:stop]),
+                    "metadatas": [entry["metadata"] for entry in entries],
+                    "documents": texts,
+                }
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", help="Snapshot directory")
+    parser.add_argument("--persist-directory", default="chroma_db")
+    parser.add_argument("--force", action="store_true", help="Import even if the embedding model differs")
+    args = parser.parse_args(argv)
+
+    from .. import config
+    from .document_processor import DocumentProcessor
+
+    config.init_environment()
+    processor = DocumentProcessor(persist_directory=args.persist_directory)
+    start = time.perf_counter()
+    if args.command == "export":
+        manifest = processor.export_snapshot(args.path)
+        print(f"Exported {manifest['rows']} chunks to {args.path} in {time.perf_counter() - start:.1f}s")
+    else:
+        rows = processor.import_snapshot(args.path, force=args.force)
+        print(f"Imported {rows} chunks from {args.path} in {time.perf_counter() - start:.1f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,316 @@
+"""Async HTTP API over one shared, warm ResearchAssistant.
+
+    python -m research_assistant.server --host 127.0.0.1 --port 8080
+
+Endpoints:
+    GET  /health        liveness (the process is serving requests)
+    GET  /ready         readiness (the assistant is built and warmed up); 503 until then
+    POST /ingest        multipart PDF upload ("file") or JSON {"arxiv_id": ...}; queues an ingest job (202)
+    GET  /ingest        ingest jobs, newest last
+    GET  /ingest/{id}   status and per-stage progress of an ingest job
+    DELETE /ingest/{id} cancel a queued or running ingest job
+    POST /query         JSON QueryRequest; returns the final answer
+    POST /query/stream  JSON QueryRequest; streams the run's events as NDJSON
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+import uuid
+from contextlib import asynccontextmanager
+
+from aiohttp import web
+from pydantic import ValidationError
+
+from . import config
+from .models.events import AgentEvent, EventType
+from .models.query import QueryRequest
+
+logger = logging.getLogger(__name__)
+
+class ConcurrencyLimiter:
+    """Caps requests running at once; a request that cannot start within the queue timeout gets a 503"""
+    def __init__(self, name: str, limit: int, queue_timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue_timeout = queue_timeout
+        self.running = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    @asynccontextmanager
+    async def slot(self):
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise web.HTTPServiceUnavailable(
+                text=json.dumps({"error": f"too many concurrent {self.name} requests"}),
+                content_type="application/json", headers={"Retry-After": str(max(1, round(self.queue_timeout)))})
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {"limit": self.limit, "running": self.running, "waiting": self.waiting, "rejected": self.rejected}
+
+def json_error(status: int, message: str, **data) -> web.Response:
+    return web.json_response({"error": message, **data}, status=status)
+
+def event_payload(event: AgentEvent, include_trace: bool = False) -> dict:
+    """JSON-serializable form of an event; the final state is reduced to what a client needs"""
+    data = {key: value for key, value in event.data.items() if include_trace or key != "trace"}
+    payload = {"type": event.type.value, "content": event.content, "data": data, "elapsed": event.elapsed}
+    if event.type == EventType.FINAL and event.state is not None:
+        payload.update(result_payload(event.state))
+    return payload
+
+def result_payload(state) -> dict:
+    return {"final_answer": state.final_answer, "error": state.error, "metrics": state.metrics}
+
+def get_assistant(request: web.Request):
+    """The shared assistant, or a 503 while it is still warming up"""
+    assistant = request.app["assistant"]
+    if assistant is None:
+        raise web.HTTPServiceUnavailable(text=json.dumps({"error": "assistant is not ready"}),
+                                         content_type="application/json", headers={"Retry-After": "5"})
+    return assistant
+
+async def parse_query(request: web.Request) -> QueryRequest:
+    try:
+        return QueryRequest.model_validate(await request.json())
+    except json.JSONDecodeError:
+        raise web.HTTPBadRequest(text=json.dumps({"error": "request body must be JSON"}), content_type="application/json")
+    except ValidationError as e:
+        raise web.HTTPBadRequest(text=json.dumps({"error": "invalid query", "details": json.loads(e.json())}),
+                                 content_type="application/json")
+
+async def health(request: web.Request) -> web.Response:
+    app = request.app
+    return web.json_response({
+        "status": "ok",
+        "uptime": time.monotonic() - app["started"],
+        "limits": {"query": app["query_limiter"].stats(), "ingest": app["ingest_limiter"].stats()},
+        "embedding_batching": app["assistant"].doc_processor.embedding_metrics() if app["assistant"] else {},
+    })
+
+async def ready(request: web.Request) -> web.Response:
+    app = request.app
+    if app["assistant"] is not None:
+        return web.json_response({"ready": True})
+    if app["startup_error"] is not None:
+        return json_error(503, "assistant failed to start", ready=False, details=app["startup_error"])
+    return json_error(503, "assistant is warming up", ready=False)
+
+# Bytes of an upload read from the request per write to the temp file
+UPLOAD_CHUNK_SIZE = 2**20
+
+async def receive_upload(field, max_bytes: int) -> str:
+    """Stream a multipart file field to a temp file (pypdf reads uploads from disk); returns its path.
+
+    File writes run on a worker thread, so a slow disk does not stall the event loop. An
+    upload larger than max_bytes gets a 413 (client_max_size does not cover streamed fields).
+    """
+    temp_file = await asyncio.to_thread(tempfile.NamedTemporaryFile, delete=False, suffix=".pdf")
+    size = 0
+    try:
+        while chunk := await field.read_chunk(UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_bytes:
+                raise web.HTTPRequestEntityTooLarge(
+                    max_size=max_bytes, actual_size=size, content_type="application/json",
+                    text=json.dumps({"error": f"upload exceeds {max_bytes // 2**20} MB"}))
+            await asyncio.to_thread(temp_file.write, chunk)
+    except BaseException:
+        temp_file.close()
+        os.unlink(temp_file.name)
+        raise
+    await asyncio.to_thread(temp_file.close)
+    return temp_file.name
+
+async def ingest(request: web.Request) -> web.Response:
+    """Queue an ingest job; poll GET /ingest/{job_id} for its progress and document ID"""
+    assistant = get_assistant(request)
+    async with request.app["ingest_limiter"].slot():
+        if request.content_type.startswith("multipart/"):
+            reader = await request.multipart()
+            field = await reader.next()
+            while field is not None and field.name != "file":
+                field = await reader.next()
+            if field is None:
+                return json_error(400, "multipart upload must have a 'file' field")
+            path = await receive_upload(field, config.SERVER_MAX_UPLOAD_MB * 2**20)
+            try:
+                # The job deletes the temp file when it ends
+                job_id = assistant.submit_paper(path, display_name=field.filename, temp_file=True)
+            except Exception:
+                os.unlink(path)
+                raise
+        else:
+            try:
+                arxiv_id = (await request.json())["arxiv_id"]
+            except (json.JSONDecodeError, KeyError, TypeError):
+                return json_error(400, "expected a PDF upload or JSON {\"arxiv_id\": ...}")
+            job_id = assistant.submit_paper(arxiv_id)
+    return web.json_response(job_payload(assistant.ingest_jobs.get(job_id)), status=202)
+
+def job_payload(job) -> dict:
+    return {**job.model_dump(mode="json"), "status_url": f"/ingest/{job.job_id}"}
+
+async def ingest_jobs(request: web.Request) -> web.Response:
+    assistant = get_assistant(request)
+    return web.json_response({"jobs": [job_payload(job) for job in assistant.ingest_jobs.jobs()]})
+
+async def ingest_status(request: web.Request) -> web.Response:
+    job = get_assistant(request).ingest_jobs.get(request.match_info["job_id"])
+    if job is None:
+        return json_error(404, "unknown ingest job")
+    return web.json_response(job_payload(job))
+
+async def cancel_ingest(request: web.Request) -> web.Response:
+    assistant = get_assistant(request)
+    job_id = request.match_info["job_id"]
+    if assistant.ingest_jobs.get(job_id) is None:
+        return json_error(404, "unknown ingest job")
+    cancelled = assistant.ingest_jobs.cancel(job_id)
+    return web.json_response({"cancelled": cancelled, **job_payload(assistant.ingest_jobs.get(job_id))})
+
+async def query(request: web.Request) -> web.Response:
+    assistant = get_assistant(request)
+    body = await parse_query(request)
+    async with request.app["query_limiter"].slot():
+        run_id = body.run_id or uuid.uuid4().hex
+        state = trace = None
+        events = assistant.stream(body.query_text, body.query_type.value, body.document_ids, body.options, run_id)
+
+        async def consume():
+            nonlocal state, trace
+            async for event in events:
+                if event.type == EventType.FINAL:
+                    state, trace = event.state, event.data.get("trace")
+
+        try:
+            await asyncio.wait_for(consume(), config.SERVER_QUERY_TIMEOUT)
+        except asyncio.TimeoutError:
+            return json_error(504, f"query did not finish within {config.SERVER_QUERY_TIMEOUT:g}s", run_id=run_id)
+        except Exception as e:
+            logger.exception("Query %s failed", run_id, extra={"run_id": run_id})
+            return json_error(500, str(e), run_id=run_id)
+        finally:
+            await events.aclose()
+    response = {"run_id": run_id, **result_payload(state)}
+    if body.include_trace:
+        response["trace"] = trace
+    return web.json_response(response, dumps=lambda value: json.dumps(value, default=str))
+
+async def query_stream(request: web.Request) -> web.StreamResponse:
+    assistant = get_assistant(request)
+    body = await parse_query(request)
+    async with request.app["query_limiter"].slot():
+        run_id = body.run_id or uuid.uuid4().hex
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson", "X-Run-Id": run_id})
+        await response.prepare(request)
+
+        async def send(payload: dict):
+            await response.write((json.dumps(payload, default=str) + "\n").encode())
+
+        events = assistant.stream(body.query_text, body.query_type.value, body.document_ids, body.options, run_id)
+
+        async def forward():
+            async for event in events:
+                await send({"run_id": run_id, **event_payload(event, body.include_trace)})
+
+        try:
+            await asyncio.wait_for(forward(), config.SERVER_QUERY_TIMEOUT)
+        except asyncio.TimeoutError:
+            # Headers are already sent, so the timeout is reported in the stream
+            await send({"run_id": run_id, "type": "error",
+                        "error": f"query did not finish within {config.SERVER_QUERY_TIMEOUT:g}s"})
+        except ConnectionResetError:
+            # The client went away; the run stays checkpointed under its run_id
+            logger.info("Client disconnected from run %s", run_id, extra={"run_id": run_id})
+            return response
+        except Exception as e:
+            logger.exception("Streaming query %s failed", run_id, extra={"run_id": run_id})
+            await send({"run_id": run_id, "type": "error", "error": str(e)})
+        finally:
+            await events.aclose()
+        await response.write_eof()
+        return response
+
+async def warm_up(app: web.Application):
+    """Build the shared assistant off the event loop and exercise the embedding model and vector store once"""
+    def build():
+        assistant = app["assistant_factory"]()
+        assistant.doc_processor.embeddings.embed_query("warm up")
+        assistant.doc_processor.retrieve_relevant_chunks("warm up", k=1)
+        return assistant
+
+    start = time.perf_counter()
+    try:
+        app["assistant"] = await asyncio.to_thread(build)
+        app["owns_assistant"] = True
+    except Exception as e:
+        logger.exception("Research assistant failed to start")
+        app["startup_error"] = str(e)
+        return
+    logger.info("Research assistant ready", extra={"duration": time.perf_counter() - start})
+
+async def on_startup(app: web.Application):
+    # Listen right away; /ready reports when the assistant can take requests
+    if app["assistant"] is None:
+        app["warm_up"] = asyncio.create_task(warm_up(app))
+
+async def on_cleanup(app: web.Application):
+    if app.get("warm_up") is not None:
+        app["warm_up"].cancel()
+    if app.get("owns_assistant"):
+        # Running ingests stop at their next progress report and remove what they added
+        app["assistant"].ingest_jobs.shutdown(wait=False)
+
+def create_app(assistant=None, assistant_factory=None) -> web.Application:
+    """The API application; pass an assistant to serve it as is, otherwise one is built and warmed up on startup"""
+    if assistant_factory is None:
+        from .app import ResearchAssistant
+        assistant_factory = ResearchAssistant
+
+    app = web.Application(client_max_size=config.SERVER_MAX_UPLOAD_MB * 2**20)
+    app["assistant"] = assistant
+    app["assistant_factory"] = assistant_factory
+    app["startup_error"] = None
+    app["started"] = time.monotonic()
+    app["query_limiter"] = ConcurrencyLimiter("query", config.SERVER_MAX_CONCURRENT_QUERIES, config.SERVER_QUEUE_TIMEOUT)
+    app["ingest_limiter"] = ConcurrencyLimiter("ingest", config.SERVER_MAX_CONCURRENT_INGESTS, config.SERVER_QUEUE_TIMEOUT)
+    app.router.add_get("/health", health)
+    app.router.add_get("/ready", ready)
+    app.router.add_post("/ingest", ingest)
+    app.router.add_get("/ingest", ingest_jobs)
+    app.router.add_get("/ingest/{job_id}", ingest_status)
+    app.router.add_delete("/ingest/{job_id}", cancel_ingest)
+    app.router.add_post("/query", query)
+    app.router.add_post("/query/stream", query_stream)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=config.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=config.SERVER_PORT)
+    args = parser.parse_args(argv)
+
+    config.init_environment()
+    web.run_app(create_app(), host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
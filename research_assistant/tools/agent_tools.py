@@ -1,24 +1,112 @@
-from langchain_groq import ChatGroq
+from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import SystemMessage, HumanMessage
 from typing import List, Optional
+import itertools
+import time
 
 
 from ..processors.document_processor import DocumentProcessor
 from ..models.document import DocumentSummary
 from ..models.research import MethodologyInfo, ResearchClaim, ComparisonResult, Citation
+from ..models.events import EventType
+from ..utils.progress import emit_progress
+from ..utils.llm_utils import LLMScheduler, estimate_tokens
+from ..utils.llm_backends import create_chat_model
+from ..utils.citations import can_format, format_citation
+from ..utils.checkpoint import saved_step, save_step
+from ..utils.artifacts import ArtifactStore
+from ..utils.tracing import span, start_span, annotate, traced
+from .. import config
+
+def _token_counts(messages, completion: str, usage: Optional[dict]) -> dict:
+    """Token counts reported by the model, or estimates when it reports none"""
+    if usage:
+        return {"prompt_tokens": usage.get("input_tokens", 0), "completion_tokens": usage.get("output_tokens", 0)}
+    return {"prompt_tokens": estimate_tokens(messages), "completion_tokens": estimate_tokens(completion),
+            "estimated_tokens": True}
 
 class AgentTools:
-    def __init__(self, doc_processor: DocumentProcessor):
+    def __init__(self, doc_processor: DocumentProcessor, llm: Optional[BaseChatModel] = None,
+                 fast_llm: Optional[BaseChatModel] = None):
         self.doc_processor = doc_processor
-        self.llm = ChatGroq(temperature=0, model="llama-3.3-70b-versatile")
-    
+        self.llm = llm if llm is not None else create_chat_model(config.MODEL_TIERS["large"])
+        if fast_llm is None:
+            # An explicitly provided model serves both tiers unless a fast one is given too
+            fast_llm = llm if llm is not None else create_chat_model(config.MODEL_TIERS["fast"])
+        self.llms = {"large": self.llm, "fast": fast_llm}
+        # Rate limits are per model, so each tier gets its own scheduler
+        self.schedulers = {tier: LLMScheduler(model) for tier, model in self.llms.items()}
+        self._llm_call_ids = itertools.count(1)
+        # Large node outputs live here; the agent state holds references to them
+        self.artifacts = ArtifactStore()
+
+    def _scheduler(self, task: str):
+        tier = config.TASK_MODEL_TIERS.get(task, "large")
+        return tier, self.schedulers[tier]
+
+    def invoke_llm(self, messages, task: str = "answer") -> str:
+        """Invoke the model tier configured for the task and return the response text"""
+        tier, scheduler = self._scheduler(task)
+        call_id = next(self._llm_call_ids)
+        emit_progress(EventType.LLM_START, call_id=call_id, task=task, tier=tier)
+        start = time.perf_counter()
+        try:
+            with span(f"llm:{task}", "llm", task=task, tier=tier) as llm_span:
+                response = scheduler.invoke(messages)
+                if llm_span is not None:
+                    llm_span.set(**_token_counts(messages, response.content, response.usage_metadata))
+                return response.content
+        finally:
+            emit_progress(EventType.LLM_END, call_id=call_id, task=task, tier=tier,
+                          duration=time.perf_counter() - start)
+
+    async def astream_llm(self, messages, task: str = "final_answer"):
+        """Stream the response of the model tier configured for the task as text chunks"""
+        tier, scheduler = self._scheduler(task)
+        call_id = next(self._llm_call_ids)
+        emit_progress(EventType.LLM_START, call_id=call_id, task=task, tier=tier)
+        start = time.perf_counter()
+        # Not made the current span: the generator is suspended between chunks
+        llm_span = start_span(f"llm:{task}", "llm", task=task, tier=tier, streamed=True)
+        parts, usage = [], None
+        try:
+            async for chunk in scheduler.astream(messages):
+                usage = chunk.usage_metadata or usage
+                if chunk.content:
+                    parts.append(chunk.content)
+                    yield chunk.content
+        finally:
+            if llm_span is not None:
+                llm_span.set(**_token_counts(messages, "".join(parts), usage))
+                llm_span.finish()
+            emit_progress(EventType.LLM_END, call_id=call_id, task=task, tier=tier,
+                          duration=time.perf_counter() - start)
+
+    def llm_metrics(self):
+        """Per-tier model, latency, token and scheduler metrics"""
+        return {
+            tier: {"model": config.MODEL_TIERS.get(tier), **scheduler.metrics()}
+            for tier, scheduler in self.schedulers.items()
+        }
+
+    @traced("retrieval")
     def retrieve_document_chunks(self, query: str, document_ids: Optional[List[str]] = None, k: int = 5):
         """Retrieve relevant document chunks for a query"""
-        return self.doc_processor.retrieve_relevant_chunks(query, document_ids, k)
+        chunks = self.doc_processor.retrieve_relevant_chunks(query, document_ids, k)
+        annotate(k=k, chunks=len(chunks))
+        return chunks
     
+    @traced("tool")
     def summarize_document(self, document_id: str, summary_type: str = "general", length: str = "medium") -> DocumentSummary:
         """Generate a summary of the document"""
+        # Reuse the summary if an earlier attempt of this run already produced it
+        step_key = f"{document_id}|{summary_type}|{length}"
+        saved = saved_step("summarize", step_key)
+        annotate(cache_hit=saved is not None)
+        if saved is not None:
+            return DocumentSummary.model_validate(saved)
+        
         # Retrieve chunks from the document
         chunks = self.retrieve_document_chunks(
             f"Create a {summary_type} summary", 
@@ -52,7 +140,7 @@ class AgentTools:
         ])
         
         # Generate summary
-        summary_text = self.llm.invoke(prompt.format_messages()).content
+        summary_text = self.invoke_llm(prompt.format_messages(), task="summarize")
         
         # Create summary object
         summary = DocumentSummary(
@@ -61,11 +149,18 @@ class AgentTools:
             summary_type=summary_type,
             length=length
         )
+        save_step("summarize", step_key, summary.model_dump(mode="json"))
         
         return summary
     
+    @traced("tool")
     def extract_methodology(self, document_id: str) -> MethodologyInfo:
         """Extract methodology information from a document"""
+        saved = saved_step("extract_methodology", document_id)
+        annotate(cache_hit=saved is not None)
+        if saved is not None:
+            return MethodologyInfo.model_validate(saved)
+        
         # Retrieve chunks likely to contain methodology information
         chunks = self.retrieve_document_chunks(
             "methodology experimental setup methods algorithm approach", 
@@ -91,7 +186,7 @@ class AgentTools:
         ])
         
         # Generate extraction
-        extraction_text = self.llm.invoke(prompt.format_messages()).content
+        extraction_text = self.invoke_llm(prompt.format_messages(), task="extract")
         
         # Use the LLM to convert the extraction text to a structured format
         structure_prompt = ChatPromptTemplate.from_messages([
@@ -107,7 +202,7 @@ class AgentTools:
             HumanMessage(content=extraction_text)
         ])
         
-        structure_text = self.llm.invoke(structure_prompt).content
+        structure_text = self.invoke_llm(structure_prompt.format_messages(), task="structure")
         
         # Parse the JSON (in a real implementation, we'd handle this more robustly)
         import json
@@ -123,6 +218,7 @@ class AgentTools:
                 limitations=structure.get("limitations", []),
                 document_id=document_id
             )
+            save_step("extract_methodology", document_id, methodology.model_dump(mode="json"))
             
             return methodology
             
@@ -133,8 +229,14 @@ class AgentTools:
                 document_id=document_id
             )
     
+    @traced("tool")
     def extract_claims(self, document_id: str) -> List[ResearchClaim]:
         """Extract key claims from a document"""
+        saved = saved_step("extract_claims", document_id)
+        annotate(cache_hit=saved is not None)
+        if saved is not None:
+            return [ResearchClaim.model_validate(claim) for claim in saved]
+        
         # Retrieve chunks from the document
         chunks = self.retrieve_document_chunks(
             "key findings results conclusions claims contributions", 
@@ -159,7 +261,7 @@ class AgentTools:
         ])
         
         # Generate extraction
-        extraction_text = self.llm.invoke(prompt.format_messages()).content
+        extraction_text = self.invoke_llm(prompt.format_messages(), task="extract")
         
         # Use the LLM to convert the extraction text to a structured format
         structure_prompt = ChatPromptTemplate.from_messages([
@@ -173,7 +275,7 @@ class AgentTools:
             HumanMessage(content=extraction_text)
         ])
         
-        structure_text = self.llm.invoke(structure_prompt).content
+        structure_text = self.invoke_llm(structure_prompt.format_messages(), task="structure")
         
         # Parse the JSON (in a real implementation, we'd handle this more robustly)
         import json
@@ -190,6 +292,7 @@ class AgentTools:
                     document_id=document_id
                 )
                 claims.append(claim)
+            save_step("extract_claims", document_id, [claim.model_dump(mode="json") for claim in claims])
             
             return claims
             
@@ -202,6 +305,7 @@ class AgentTools:
                 document_id=document_id
             )]
     
+    @traced("tool")
     def compare_documents(self, document_ids: List[str]) -> ComparisonResult:
         """Compare multiple documents"""
         if len(document_ids) < 2:
@@ -238,7 +342,7 @@ class AgentTools:
         ])
         
         # Generate comparison
-        comparison_text = self.llm.invoke(prompt.format_messages()).content
+        comparison_text = self.invoke_llm(prompt.format_messages(), task="compare")
         
         # Use the LLM to convert to a structured format
         structure_prompt = ChatPromptTemplate.from_messages([
@@ -253,7 +357,7 @@ class AgentTools:
             HumanMessage(content=comparison_text)
         ])
         
-        structure_text = self.llm.invoke(structure_prompt).content
+        structure_text = self.invoke_llm(structure_prompt.format_messages(), task="structure")
         
         # Parse the JSON
         import json
@@ -279,10 +383,24 @@ class AgentTools:
                 document_ids=document_ids
             )
     
+    @traced("tool")
     def generate_citation(self, document_id: str, style: str = "APA") -> Citation:
-        """Generate a citation for a document"""
-        # We'd normally look up document metadata from a database
-        # For this example, we'll retrieve some text from the document to infer metadata
+        """Generate a citation for a document, from registered metadata when it is complete"""
+        metadata = self.doc_processor.metadata_registry.get(document_id)
+        if can_format(metadata, style):
+            annotate(source="metadata_registry")
+            return Citation(
+                document_id=document_id,
+                citation_text=format_citation(document_id, metadata, style),
+                style=style
+            )
+        
+        saved = saved_step("citation", f"{document_id}|{style}")
+        annotate(source="llm", cache_hit=saved is not None)
+        if saved is not None:
+            return Citation.model_validate(saved)
+        
+        # Fall back to the LLM, inferring the missing fields from the document text
         chunks = self.retrieve_document_chunks(
             "title authors publication", 
             document_ids=[document_id],
@@ -290,6 +408,9 @@ class AgentTools:
         )
         
         context = "\n\n".join([chunk.page_content for chunk in chunks])
+        if metadata is not None:
+            known = metadata.model_dump(exclude_none=True, mode="json")
+            context = f"Known metadata: {known}\n\n{context}"
         
         # Create citation prompt
         prompt = ChatPromptTemplate.from_messages([
@@ -300,7 +421,7 @@ class AgentTools:
         ])
         
         # Generate citation
-        citation_text = self.llm.invoke(prompt.format_messages()).content
+        citation_text = self.invoke_llm(prompt.format_messages(), task="citation")
         
         # Create citation object
         citation = Citation(
@@ -308,9 +429,11 @@ class AgentTools:
             citation_text=citation_text,
             style=style
         )
+        save_step("citation", f"{document_id}|{style}", citation.model_dump(mode="json"))
         
         return citation
     
+    @traced("tool")
     def answer_question(self, question: str, document_ids: Optional[List[str]] = None) -> str:
         """Answer a question based on document content"""
         # Retrieve relevant chunks
@@ -346,10 +469,11 @@ class AgentTools:
         ])
         
         # Generate answer
-        answer = self.llm.invoke(prompt.format_messages()).content
+        answer = self.invoke_llm(prompt.format_messages(), task="answer")
         
         return answer
     
+    @traced("tool")
     def generate_literature_review(self, document_ids: List[str], focus: Optional[str] = None) -> str:
         """Generate a literature review from multiple documents"""
         # Get summaries for each document
@@ -405,7 +529,7 @@ class AgentTools:
         ])
         
         # Generate literature review
-        review = self.llm.invoke(prompt.format_messages()).content
+        review = self.invoke_llm(prompt.format_messages(), task="literature_review")
         
         return review
 
@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Set
+
+from .. import config
+
+def is_artifact_ref(value: Any) -> bool:
+    return isinstance(value, dict) and set(value) == {"artifact_id", "size"}
+
+class ArtifactStore:
+    """Content-addressed store for large run artifacts, so the agent state only holds small references.
+
+    Artifacts are JSON values written once to disk (which lets checkpointed runs resolve
+    them after a restart), with the most recently used ones cached in memory. Identical
+    content is shared between runs, so files are only deleted by sweep(), once no
+    checkpointed run refers to them.
+    """
+    def __init__(self, directory: str = config.ARTIFACT_DIR, cache_size: int = 256):
+        self.directory = directory
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, artifact_id: str) -> str:
+        return os.path.join(self.directory, f"{artifact_id}.json")
+
+    def _remember(self, artifact_id: str, value: Any):
+        with self._lock:
+            self._cache[artifact_id] = value
+            self._cache.move_to_end(artifact_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def put(self, value: Any) -> Dict[str, Any]:
+        """Store a JSON-serializable value and return its reference"""
+        data = json.dumps(value, sort_keys=True)
+        artifact_id = hashlib.sha256(data.encode("utf-8")).hexdigest()[:32]
+        path = self._path(artifact_id)
+        # Identical content is only written once; rewriting it refreshes its age for sweep()
+        if os.path.exists(path):
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        else:
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        self._remember(artifact_id, value)
+        return {"artifact_id": artifact_id, "size": len(data)}
+
+    def get(self, value: Any) -> Any:
+        """Resolve a reference to its stored value; anything else is returned unchanged"""
+        if not is_artifact_ref(value):
+            return value
+        artifact_id = value["artifact_id"]
+        with self._lock:
+            if artifact_id in self._cache:
+                self._cache.move_to_end(artifact_id)
+                return self._cache[artifact_id]
+        with open(self._path(artifact_id)) as f:
+            resolved = json.load(f)
+        self._remember(artifact_id, resolved)
+        return resolved
+
+    def sweep(self, keep: Set[str], min_age: float = config.ARTIFACT_MIN_AGE) -> int:
+        """Delete the artifacts not in `keep` and older than min_age seconds; returns how many were deleted.
+
+        Recent files are spared, since a run still in progress may not have checkpointed its references yet.
+        """
+        cutoff = time.time() - min_age
+        deleted = 0
+        for entry in os.scandir(self.directory):
+            artifact_id, extension = os.path.splitext(entry.name)
+            if extension != ".json" or artifact_id in keep:
+                continue
+            try:
+                if entry.stat().st_mtime >= cutoff:
+                    continue
+                os.remove(entry.path)
+            except OSError:
+                continue
+            deleted += 1
+            with self._lock:
+                self._cache.pop(artifact_id, None)
+        return deleted
@@ -0,0 +1,142 @@
+import contextvars
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from ..models.agent import AgentState
+from .. import config
+
+# Artifact references (see utils.artifacts) inside saved states and step results
+_ARTIFACT_REF = re.compile(r'"artifact_id":\s*"([0-9a-f]+)"')
+
+# Run statuses; anything but COMPLETED can be resumed
+RUNNING = "running"
+FAILED = "failed"
+COMPLETED = "completed"
+
+class CheckpointStore:
+    """SQLite store of workflow state and per-document step results, keyed by run ID.
+
+    Completed runs older than `retention_hours` are pruned when the store is opened and
+    whenever a run completes.
+    """
+    def __init__(self, path: str = config.CHECKPOINT_DB_PATH,
+                 retention_hours: float = config.CHECKPOINT_RETENTION_HOURS):
+        self.path = path
+        self.retention_hours = retention_hours
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # Nodes run on worker threads, so the connection is shared under the lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY, status TEXT NOT NULL, state TEXT NOT NULL, updated REAL NOT NULL)""")
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS steps (
+                run_id TEXT NOT NULL, step TEXT NOT NULL, key TEXT NOT NULL, result TEXT NOT NULL,
+                PRIMARY KEY (run_id, step, key))""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS runs_by_status ON runs (status, updated)")
+        self.prune()
+
+    def save_state(self, run_id: str, state: AgentState, status: str = RUNNING):
+        data = state.model_dump_json()
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?)",
+                               (run_id, status, data, time.time()))
+        if status == COMPLETED:
+            self.prune()
+
+    def set_status(self, run_id: str, status: str):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE runs SET status = ?, updated = ? WHERE run_id = ?",
+                               (status, time.time(), run_id))
+
+    def load_state(self, run_id: str) -> Optional[Tuple[str, AgentState]]:
+        """Status and last saved state of a run, or None if it was never checkpointed"""
+        with self._lock:
+            row = self._conn.execute("SELECT status, state FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        if row is None:
+            return None
+        return row[0], AgentState.model_validate_json(row[1])
+
+    def save_step(self, run_id: str, step: str, key: str, result: Any):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO steps VALUES (?, ?, ?, ?)",
+                               (run_id, step, key, json.dumps(result)))
+
+    def load_step(self, run_id: str, step: str, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM steps WHERE run_id = ? AND step = ? AND key = ?",
+                                     (run_id, step, key)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def runs(self) -> List[Dict[str, Any]]:
+        """Checkpointed runs, most recently updated first"""
+        with self._lock:
+            rows = self._conn.execute("SELECT run_id, status, updated FROM runs ORDER BY updated DESC").fetchall()
+        return [{"run_id": run_id, "status": status, "updated": updated} for run_id, status, updated in rows]
+
+    def delete_run(self, run_id: str):
+        """Delete a run's state and step results"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+            self._conn.execute("DELETE FROM steps WHERE run_id = ?", (run_id,))
+
+    def artifact_ids(self) -> Set[str]:
+        """IDs of the artifacts referred to by the states and step results of the stored runs"""
+        with self._lock:
+            rows = self._conn.execute("SELECT state FROM runs UNION ALL SELECT result FROM steps").fetchall()
+        return {artifact_id for (data,) in rows for artifact_id in _ARTIFACT_REF.findall(data)}
+
+    def prune(self) -> List[str]:
+        """Delete the completed runs not updated within the retention period; returns their IDs"""
+        if self.retention_hours <= 0:
+            return []
+        cutoff = time.time() - self.retention_hours * 3600
+        with self._lock, self._conn:
+            run_ids = [row[0] for row in self._conn.execute(
+                "SELECT run_id FROM runs WHERE status = ? AND updated < ?", (COMPLETED, cutoff))]
+            self._conn.executemany("DELETE FROM runs WHERE run_id = ?", [(run_id,) for run_id in run_ids])
+            self._conn.executemany("DELETE FROM steps WHERE run_id = ?", [(run_id,) for run_id in run_ids])
+        return run_ids
+
+# Store and run ID of the run executing in the current context (copied into worker threads)
+_current_run = contextvars.ContextVar("checkpoint_run", default=None)
+
+@contextmanager
+def checkpoint_run(store: CheckpointStore, run_id: str):
+    """Checkpoint the state and steps saved in this context under the given run"""
+    token = _current_run.set((store, run_id))
+    try:
+        yield
+    finally:
+        _current_run.reset(token)
+
+def save_run_state(state: AgentState):
+    """Checkpoint the state of the current run, if there is one"""
+    run = _current_run.get()
+    if run is not None:
+        store, run_id = run
+        store.save_state(run_id, state)
+
+def saved_step(step: str, key: str) -> Optional[Any]:
+    """Result of a step already completed by the current run, or None"""
+    run = _current_run.get()
+    if run is None:
+        return None
+    store, run_id = run
+    return store.load_step(run_id, step, key)
+
+def save_step(step: str, key: str, result: Any):
+    """Checkpoint the JSON-serializable result of a step of the current run, if there is one"""
+    run = _current_run.get()
+    if run is not None:
+        store, run_id = run
+        store.save_step(run_id, step, key, result)
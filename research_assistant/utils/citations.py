@@ -0,0 +1,108 @@
+import re
+from typing import List, Optional, Tuple
+
+from ..models.document import DocumentMetadata
+
+SUPPORTED_STYLES = ("APA", "MLA", "BIBTEX")
+
+def missing_fields(metadata: Optional[DocumentMetadata]) -> List[str]:
+    """Fields a citation needs that the metadata does not have"""
+    if metadata is None:
+        return ["title", "authors", "publication_date"]
+    missing = []
+    if not metadata.title:
+        missing.append("title")
+    if not [author for author in metadata.authors if author.strip()]:
+        missing.append("authors")
+    if metadata.publication_date is None:
+        missing.append("publication_date")
+    return missing
+
+def can_format(metadata: Optional[DocumentMetadata], style: str) -> bool:
+    return style.upper() in SUPPORTED_STYLES and not missing_fields(metadata)
+
+def _name_parts(author: str) -> Tuple[str, List[str]]:
+    """Split an author name into (last name, given names), accepting "Last, First" too"""
+    author = author.strip()
+    if "," in author:
+        last, given = author.split(",", 1)
+        return last.strip(), given.split()
+    words = author.split()
+    return words[-1], words[:-1]
+
+def _locator(metadata: DocumentMetadata) -> str:
+    if metadata.doi:
+        return f"https://doi.org/{metadata.doi}"
+    return metadata.url or ""
+
+def _apa(metadata: DocumentMetadata) -> str:
+    names = []
+    for author in metadata.authors:
+        last, given = _name_parts(author)
+        initials = " ".join(f"{name[0]}." for name in given if name)
+        names.append(f"{last}, {initials}".strip(", "))
+    if len(names) > 20:
+        names = names[:19] + ["... " + names[-1]]
+    if len(names) > 1:
+        authors = ", ".join(names[:-1]) + ", & " + names[-1]
+    else:
+        authors = names[0]
+    source = "arXiv" if metadata.arxiv_id else (metadata.source or "")
+    parts = [f"{authors} ({metadata.publication_date.year}). {metadata.title.rstrip('.')}."]
+    if metadata.arxiv_id:
+        parts.append(f"{source} preprint arXiv:{metadata.arxiv_id}.")
+    locator = _locator(metadata)
+    if locator:
+        parts.append(locator)
+    return " ".join(parts)
+
+def _mla(metadata: DocumentMetadata) -> str:
+    last, given = _name_parts(metadata.authors[0])
+    first_author = f"{last}, {' '.join(given)}".strip(", ")
+    if len(metadata.authors) == 2:
+        authors = f"{first_author}, and {metadata.authors[1].strip()}"
+    elif len(metadata.authors) > 2:
+        authors = f"{first_author}, et al"
+    else:
+        authors = first_author
+    parts = [f"{authors.rstrip('.')}.", f"\"{metadata.title.rstrip('.')}.\""]
+    if metadata.arxiv_id:
+        parts.append(f"arXiv preprint arXiv:{metadata.arxiv_id},")
+    parts.append(f"{metadata.publication_date.year}.")
+    locator = _locator(metadata)
+    if locator:
+        parts.append(f"{locator}.")
+    return " ".join(parts)
+
+def _bibtex(document_id: str, metadata: DocumentMetadata) -> str:
+    last, _ = _name_parts(metadata.authors[0])
+    first_word = next((word for word in re.findall(r"[A-Za-z]+", metadata.title) if len(word) > 3), "paper")
+    key = re.sub(r"[^A-Za-z0-9]", "", f"{last}{metadata.publication_date.year}{first_word}").lower()
+    fields = [
+        ("title", f"{{{metadata.title}}}"),
+        ("author", " and ".join(author.strip() for author in metadata.authors)),
+        ("year", str(metadata.publication_date.year)),
+    ]
+    entry_type = "misc"
+    if metadata.arxiv_id:
+        fields += [("eprint", metadata.arxiv_id), ("archivePrefix", "arXiv")]
+    if metadata.doi:
+        entry_type = "article"
+        fields.append(("doi", metadata.doi))
+    if metadata.url:
+        fields.append(("url", metadata.url))
+    body = ",\n".join(f"  {name} = {{{value}}}" for name, value in fields)
+    return f"@{entry_type}{{{key or document_id},\n{body}\n}}"
+
+def format_citation(document_id: str, metadata: DocumentMetadata, style: str = "APA") -> str:
+    """Format a citation locally from complete metadata (see missing_fields)"""
+    style = style.upper()
+    # Blank entries (e.g. from a trailing separator in the PDF's author field) are not authors
+    metadata = metadata.model_copy(update={"authors": [author.strip() for author in metadata.authors if author.strip()]})
+    if style == "APA":
+        return _apa(metadata)
+    if style == "MLA":
+        return _mla(metadata)
+    if style == "BIBTEX":
+        return _bibtex(document_id, metadata)
+    raise ValueError(f"Unsupported citation style: {style}")
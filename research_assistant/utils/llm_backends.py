@@ -0,0 +1,254 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Iterator, AsyncIterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+try:
+    import fcntl
+except ImportError:  # Windows: saves are only serialized within one process
+    fcntl = None
+
+from .. import config
+
+# Responses that keep every step of the pipeline working against the fake backend
+DEFAULT_FAKE_RULES = [
+    {"pattern": r"Parse the following methodology extraction", "response": json.dumps({
+        "approach": "Empirical evaluation of a proposed model",
+        "datasets": ["Synthetic benchmark"],
+        "algorithms": ["Baseline model", "Proposed model"],
+        "evaluation_metrics": ["Accuracy"],
+        "limitations": ["Small evaluation set"]})},
+    {"pattern": r"Parse the following claim extraction", "response": json.dumps([
+        {"claim": "The proposed model outperforms the baseline", "evidence": "Reported accuracy gains",
+         "confidence": 0.8}])},
+    {"pattern": r"Parse the following comparison", "response": json.dumps({
+        "similarities": ["Both papers evaluate on benchmark data"],
+        "differences": ["The papers use different model families"],
+        "methodology_comparison": "Comparable experimental setups",
+        "result_comparison": "Similar headline results"})},
+    {"pattern": r"Identify any document references", "response": ""},
+    {"pattern": r"Choose the analysis that best serves", "response": "answer_question"},
+]
+
+def _message_text(messages: List[BaseMessage]) -> str:
+    return "\n".join(str(message.content) for message in messages)
+
+def _split_tokens(text: str) -> List[str]:
+    """Split text into word-sized pieces that concatenate back to the original"""
+    return re.findall(r"\S+\s*|\s+", text)
+
+def _usage(prompt: str, completion: str) -> Dict[str, int]:
+    input_tokens = len(prompt) // 4 + 1
+    output_tokens = len(completion) // 4 + 1
+    return {"input_tokens": input_tokens, "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens}
+
+class FakeChatModel(BaseChatModel):
+    """Offline chat model with scripted responses and injected latency.
+
+    Each rule is a dict with a regex `pattern` matched against the prompt text and the
+    `response` to return; the first match wins, otherwise `default_response` is used.
+    """
+    rules: List[Dict[str, str]] = DEFAULT_FAKE_RULES
+    default_response: str = "This is a response from the offline fake LLM backend."
+    latency: float = 0.0        # Seconds before the first token
+    token_latency: float = 0.0  # Seconds between streamed tokens
+
+    @classmethod
+    def from_script(cls, path: str, **kwargs) -> "FakeChatModel":
+        """Load rules, default response and latencies from a JSON script file"""
+        with open(path) as f:
+            script = json.load(f)
+        script.update(kwargs)
+        return cls(**script)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _respond(self, messages: List[BaseMessage]) -> str:
+        prompt = _message_text(messages)
+        for rule in self.rules:
+            if re.search(rule["pattern"], prompt, re.IGNORECASE):
+                return rule["response"]
+        return self.default_response
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        text = self._respond(messages)
+        time.sleep(self.latency + self.token_latency * len(_split_tokens(text)))
+        message = AIMessage(content=text, usage_metadata=_usage(_message_text(messages), text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        text = self._respond(messages)
+        await asyncio.sleep(self.latency + self.token_latency * len(_split_tokens(text)))
+        message = AIMessage(content=text, usage_metadata=_usage(_message_text(messages), text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency)
+        for token in _split_tokens(self._respond(messages)):
+            time.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency)
+        for token in _split_tokens(self._respond(messages)):
+            await asyncio.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+class CassetteMissError(LookupError):
+    """Raised in replay mode when a prompt has no recorded response"""
+
+class _Cassette:
+    """The interactions of one cassette file, shared by every model instance recording to or replaying it"""
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.interactions: Dict[str, Dict[str, Any]] = {}
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path) as f:
+            return json.load(f).get("interactions", {})
+
+    def load(self):
+        """Pick up interactions saved to the file since it was last read (called with the lock held)"""
+        for key, interaction in self._read().items():
+            self.interactions.setdefault(key, interaction)
+
+    def save(self):
+        """Write the interactions, merged with what other processes saved meanwhile (called with the lock held)"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(f"{self.path}.lock", "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self.load()
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"version": 1, "interactions": self.interactions}, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+# Cassettes by absolute path, so the models of all tiers record into the same interactions
+_cassettes: Dict[str, _Cassette] = {}
+_cassettes_lock = threading.Lock()
+
+def _open_cassette(path: str) -> _Cassette:
+    with _cassettes_lock:
+        cassette = _cassettes.get(os.path.abspath(path))
+        if cassette is None:
+            cassette = _cassettes[os.path.abspath(path)] = _Cassette(path)
+    with cassette.lock:
+        cassette.load()
+    return cassette
+
+class CassetteChatModel(BaseChatModel):
+    """Records real LLM exchanges to a cassette file, or replays them offline.
+
+    Exchanges are keyed by a hash of the model name and the prompt messages. In
+    "record" mode a miss is forwarded to `inner` and saved; in "replay" mode a miss
+    raises CassetteMissError so a benchmark never silently goes to the network.
+    Instances on the same path (one per model tier) share the recorded interactions.
+    """
+    path: str
+    mode: str = "replay"  # "record" or "replay"
+    model_name: str = ""
+    inner: Optional[BaseChatModel] = None
+    replay_latency: bool = False  # Sleep for the recorded latency when replaying
+
+    _cassette: Any = None
+
+    def model_post_init(self, __context):
+        self._cassette = _open_cassette(self.path)
+        if self.mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {self.mode}")
+        if self.mode == "record" and self.inner is None:
+            raise ValueError("Record mode needs an inner model to record from")
+
+    @property
+    def _llm_type(self) -> str:
+        return "cassette"
+
+    def _key(self, messages: List[BaseMessage]) -> str:
+        payload = json.dumps([self.model_name] + [[m.type, m.content] for m in messages], sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _lookup(self, messages: List[BaseMessage]) -> Optional[Dict[str, Any]]:
+        with self._cassette.lock:
+            interaction = self._cassette.interactions.get(self._key(messages))
+        if interaction is None and self.mode == "replay":
+            raise CassetteMissError(f"No recorded response for this prompt in {self.path}")
+        return interaction
+
+    def _record(self, messages: List[BaseMessage], text: str, usage, latency: float) -> Dict[str, Any]:
+        interaction = {
+            "model": self.model_name,
+            "messages": [[m.type, m.content] for m in messages],
+            "response": text,
+            "usage": usage,
+            "latency": latency,
+        }
+        with self._cassette.lock:
+            self._cassette.interactions[self._key(messages)] = interaction
+            self._cassette.save()
+        return interaction
+
+    def _result(self, interaction: Dict[str, Any]) -> ChatResult:
+        message = AIMessage(content=interaction["response"], usage_metadata=interaction.get("usage"))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        interaction = self._lookup(messages)
+        if interaction is None:
+            start = time.perf_counter()
+            response = self.inner.invoke(messages, stop=stop, **kwargs)
+            interaction = self._record(messages, response.content, response.usage_metadata,
+                                       time.perf_counter() - start)
+        elif self.replay_latency:
+            time.sleep(interaction["latency"])
+        return self._result(interaction)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        interaction = self._lookup(messages)
+        if interaction is None:
+            start = time.perf_counter()
+            parts = []
+            for chunk in self.inner.stream(messages, stop=stop, **kwargs):
+                parts.append(chunk.content)
+                yield ChatGenerationChunk(message=AIMessageChunk(content=chunk.content))
+            self._record(messages, "".join(parts), None, time.perf_counter() - start)
+            return
+        if self.replay_latency:
+            time.sleep(interaction["latency"])
+        for token in _split_tokens(interaction["response"]):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+def create_chat_model(model: str = config.DEFAULT_MODEL, backend: str = config.LLM_BACKEND) -> BaseChatModel:
+    """Create the chat model for the configured backend: groq, fake, record or replay"""
+    if backend == "fake":
+        settings = {"latency": config.FAKE_LLM_LATENCY, "token_latency": config.FAKE_LLM_TOKEN_LATENCY}
+        if config.FAKE_LLM_SCRIPT:
+            return FakeChatModel.from_script(config.FAKE_LLM_SCRIPT, **settings)
+        return FakeChatModel(**settings)
+    if backend == "replay":
+        return CassetteChatModel(path=config.LLM_CASSETTE_PATH, mode="replay", model_name=model)
+
+    from langchain_groq import ChatGroq
+    # Retries are handled by the scheduler, which knows about the shared rate limits
+    groq = ChatGroq(temperature=0, model=model, max_retries=0)
+    if backend == "record":
+        return CassetteChatModel(path=config.LLM_CASSETTE_PATH, mode="record", model_name=model, inner=groq)
+    if backend == "groq":
+        return groq
+    raise ValueError(f"Unknown LLM backend: {backend}")
@@ -0,0 +1,340 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from enum import IntEnum
+from typing import Optional
+
+from .. import config
+from .tracing import annotate
+
+logger = logging.getLogger(__name__)
+
+class Priority(IntEnum):
+    """Priority classes for LLM calls (lower values are served first)"""
+    INTERACTIVE = 0
+    BATCH = 1
+
+# Priority used by LLM calls made in the current context
+_current_priority = contextvars.ContextVar("llm_priority", default=Priority.INTERACTIVE)
+
+@contextmanager
+def llm_priority(priority: Priority):
+    """Run the LLM calls made inside this block with the given priority"""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+def estimate_tokens(messages) -> int:
+    """Rough prompt token count (about four characters per token)"""
+    if isinstance(messages, str):
+        return len(messages) // 4 + 1
+    return sum(len(str(getattr(message, "content", message))) for message in messages) // 4 + 1
+
+def _status_code(exc: Exception) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    """Seconds the server asked us to wait, from the Retry-After header"""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+def is_retryable(exc: Exception) -> bool:
+    """Whether an LLM error is transient (rate limited, overloaded or a dropped connection)"""
+    if _status_code(exc) in RETRYABLE_STATUS_CODES:
+        return True
+    return isinstance(exc, (TimeoutError, ConnectionError)) or type(exc).__name__ in (
+        "APIConnectionError", "APITimeoutError")
+
+def _distribution(samples) -> dict:
+    ordered = sorted(samples)
+    if not ordered:
+        return {"count": 0, "mean": 0.0, "p95": 0.0, "max": 0.0}
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered),
+        "p95": ordered[int(0.95 * (len(ordered) - 1))],
+        "max": ordered[-1],
+    }
+
+class TokenBucket:
+    """Token bucket refilled continuously up to a per-minute capacity"""
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount: float, now: float) -> float:
+        """Seconds until `amount` tokens are available (0 if they are available now)"""
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate)
+
+    def consume(self, amount: float, now: float):
+        # The balance may go negative when a call used more than was reserved
+        self._refill(now)
+        self.tokens -= amount
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+class LLMScheduler:
+    """Central gate for LLM calls with rate limits, a concurrency cap, priorities and retries.
+
+    Calls wait in a priority queue until they are at its head, a concurrency slot is
+    free and both the request and token buckets have capacity. Transient failures are
+    retried with jittered exponential backoff, and a Retry-After from the server pauses
+    every queued call, not just the one that was rejected. Threads wait on a condition
+    variable and coroutines on futures the scheduler resolves, so a queued stream holds
+    no thread while it waits.
+    """
+    def __init__(self, llm,
+                 requests_per_minute: int = config.LLM_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: int = config.LLM_TOKENS_PER_MINUTE,
+                 max_concurrency: int = config.LLM_MAX_CONCURRENCY,
+                 max_retries: int = config.LLM_MAX_RETRIES,
+                 base_delay: float = config.LLM_RETRY_BASE_DELAY,
+                 max_delay: float = config.LLM_RETRY_MAX_DELAY):
+        self.llm = llm
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self._cond = threading.Condition()
+        self._queue = []  # Heap of (priority, sequence) tickets
+        self._async_waiters = set()  # (loop, future) of calls waiting in a coroutine
+        self._sequence = itertools.count()
+        self._active = 0
+        self._paused_until = 0.0
+
+        # Metrics
+        self._wait_times = {priority: deque(maxlen=1000) for priority in Priority}
+        self._max_queue_depth = 0
+        self._calls = 0
+        self._retries = 0
+        self._rate_limited = 0
+        self._failures = 0
+        self._latencies = deque(maxlen=1000)
+        self._prompt_tokens = 0
+        self._completion_tokens = 0
+
+    def _enqueue(self, priority: Priority):
+        """Queue a call and return its ticket (called with the lock held)"""
+        ticket = (int(priority), next(self._sequence))
+        heapq.heappush(self._queue, ticket)
+        self._max_queue_depth = max(self._max_queue_depth, len(self._queue))
+        return ticket
+
+    def _ready_in(self, ticket, tokens: int) -> Optional[float]:
+        """Seconds until a queued call may start (0: now), or None while it waits for its turn or a slot"""
+        if self._queue[0] != ticket or self._active >= self.max_concurrency:
+            return None
+        now = time.monotonic()
+        return max(0.0, self._paused_until - now, self._requests.time_until(1, now),
+                   self._tokens.time_until(tokens, now))
+
+    def _start(self, priority: Priority, tokens: int, enqueued: float) -> float:
+        """Take the call at the head of the queue off it and charge its capacity; returns its wait"""
+        heapq.heappop(self._queue)
+        now = time.monotonic()
+        self._requests.consume(1, now)
+        self._tokens.consume(tokens, now)
+        self._active += 1
+        waited = now - enqueued
+        self._wait_times[Priority(priority)].append(waited)
+        self._notify()
+        return waited
+
+    def _dequeue(self, ticket):
+        """Remove a call that gave up waiting"""
+        self._queue.remove(ticket)
+        heapq.heapify(self._queue)
+        self._notify()
+
+    def _notify(self):
+        """Wake every waiting call, in threads and on event loops, to check whether it may start"""
+        self._cond.notify_all()
+        for loop, wakeup in self._async_waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, wakeup)
+            except RuntimeError:  # Its loop has been closed
+                pass
+
+    def _acquire(self, priority: Priority, tokens: int) -> float:
+        """Block until the call may start; returns the time spent waiting"""
+        enqueued = time.monotonic()
+        with self._cond:
+            ticket = self._enqueue(priority)
+            try:
+                while (delay := self._ready_in(ticket, tokens)) != 0:
+                    self._cond.wait(delay)
+            except BaseException:
+                self._dequeue(ticket)
+                raise
+            return self._start(priority, tokens, enqueued)
+
+    def _release(self, reserved_tokens: int, usage: Optional[dict] = None, latency: Optional[float] = None):
+        with self._cond:
+            self._active -= 1
+            if usage:
+                # Settle the difference between the estimate and the actual usage; with no usable
+                # count the reservation stands, rather than being refunded as if nothing was used
+                total = usage.get("total_tokens")
+                if total is None and ("input_tokens" in usage or "output_tokens" in usage):
+                    total = usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+                if total is not None:
+                    self._tokens.consume(total - reserved_tokens, time.monotonic())
+                self._prompt_tokens += usage.get("input_tokens", 0)
+                self._completion_tokens += usage.get("output_tokens", 0)
+            if latency is not None:
+                self._latencies.append(latency)
+            self._notify()
+
+    def _backoff(self, attempt: int, exc: Exception) -> float:
+        """Delay before the next attempt: the server's Retry-After if given, else full jitter"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        retry_after = _retry_after(exc)
+        if retry_after is not None:
+            delay = retry_after + random.uniform(0, self.base_delay)
+        with self._cond:
+            self._retries += 1
+            if _status_code(exc) == 429:
+                self._rate_limited += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        logger.warning("LLM call failed (%s), retrying in %.1fs", type(exc).__name__, delay,
+                       extra={"attempt": attempt + 1, "status_code": _status_code(exc)})
+        return delay
+
+    def _record_failure(self):
+        with self._cond:
+            self._failures += 1
+
+    def _reservation(self, messages) -> int:
+        return estimate_tokens(messages) + config.LLM_COMPLETION_TOKEN_ESTIMATE
+
+    @staticmethod
+    def _usage(response) -> Optional[dict]:
+        return getattr(response, "usage_metadata", None)
+
+    def invoke(self, messages, priority: Optional[Priority] = None):
+        """Invoke the wrapped LLM once capacity allows, retrying transient failures"""
+        priority = _current_priority.get() if priority is None else priority
+        reserved = self._reservation(messages)
+        queue_wait = 0.0
+        for attempt in range(self.max_retries + 1):
+            queue_wait += self._acquire(priority, reserved)
+            with self._cond:
+                self._calls += 1
+            start = time.perf_counter()
+            try:
+                response = self.llm.invoke(messages)
+            except Exception as e:
+                self._release(reserved)
+                if attempt >= self.max_retries or not is_retryable(e):
+                    self._record_failure()
+                    raise
+                time.sleep(self._backoff(attempt, e))
+                continue
+            self._release(reserved, self._usage(response), time.perf_counter() - start)
+            annotate(queue_wait=queue_wait, attempts=attempt + 1)
+            return response
+
+    async def astream(self, messages, priority: Optional[Priority] = None):
+        """Stream from the wrapped LLM once capacity allows.
+
+        Failures are only retried before the first chunk has been yielded.
+        """
+        priority = _current_priority.get() if priority is None else priority
+        reserved = self._reservation(messages)
+        for attempt in range(self.max_retries + 1):
+            await self._acquire_async(priority, reserved)
+            with self._cond:
+                self._calls += 1
+            started = False
+            usage = None
+            latency = None
+            start = time.perf_counter()
+            try:
+                async for chunk in self.llm.astream(messages):
+                    started = True
+                    usage = self._usage(chunk) or usage
+                    yield chunk
+                latency = time.perf_counter() - start
+                return
+            except Exception as e:
+                if started or attempt >= self.max_retries or not is_retryable(e):
+                    self._record_failure()
+                    raise
+                delay = self._backoff(attempt, e)
+            finally:
+                self._release(reserved, usage, latency)
+            await asyncio.sleep(delay)
+
+    async def _acquire_async(self, priority: Priority, tokens: int) -> float:
+        """Wait on the event loop, without holding a thread, until the call may start; returns the wait"""
+        loop = asyncio.get_running_loop()
+        enqueued = time.monotonic()
+        with self._cond:
+            ticket = self._enqueue(priority)
+        try:
+            while True:
+                with self._cond:
+                    delay = self._ready_in(ticket, tokens)
+                    if delay == 0:
+                        return self._start(priority, tokens, enqueued)
+                    wakeup = loop.create_future()
+                    self._async_waiters.add((loop, wakeup))
+                try:
+                    await asyncio.wait_for(wakeup, delay)
+                except asyncio.TimeoutError:
+                    pass
+                finally:
+                    with self._cond:
+                        self._async_waiters.discard((loop, wakeup))
+        except BaseException:
+            with self._cond:
+                self._dequeue(ticket)
+            raise
+
+    def metrics(self):
+        """Snapshot of queue depth, wait times, call latency, token usage and retry counters"""
+        with self._cond:
+            return {
+                "queue_depth": len(self._queue),
+                "max_queue_depth": self._max_queue_depth,
+                "active": self._active,
+                "calls": self._calls,
+                "retries": self._retries,
+                "rate_limited": self._rate_limited,
+                "failures": self._failures,
+                "wait_time": {priority.name.lower(): _distribution(samples)
+                              for priority, samples in self._wait_times.items()},
+                "latency": _distribution(self._latencies),
+                "prompt_tokens": self._prompt_tokens,
+                "completion_tokens": self._completion_tokens,
+            }
@@ -0,0 +1,49 @@
+import json
+import logging
+import time
+
+from .. import config
+
+# Attributes every LogRecord has; anything else was passed as a structured field via `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+def _fields(record: logging.LogRecord) -> dict:
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the fields passed via `extra` as top-level keys"""
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **_fields(record),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class KeyValueFormatter(logging.Formatter):
+    """Human-readable lines with the structured fields appended as key=value pairs"""
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = _fields(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+def configure_logging(level: str = config.LOG_LEVEL, fmt: str = config.LOG_FORMAT):
+    """Send the package's logs to stderr at the given level (idempotent, safe across Streamlit reruns)"""
+    logger = logging.getLogger("research_assistant")
+    logger.setLevel(level.upper())
+    handler = next((h for h in logger.handlers if getattr(h, "_research_assistant", False)), None)
+    if handler is None:
+        handler = logging.StreamHandler()
+        handler._research_assistant = True
+        logger.addHandler(handler)
+        logger.propagate = False
+    handler.setFormatter(JsonFormatter() if fmt == "json" else KeyValueFormatter())
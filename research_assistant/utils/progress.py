@@ -0,0 +1,53 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+from ..models.events import AgentEvent, EventType
+
+# Reporter for the run executing in the current context (copied into worker threads)
+_current_reporter = contextvars.ContextVar("progress_reporter", default=None)
+
+class ProgressReporter:
+    """Turns progress notifications into AgentEvents and hands them to a callback"""
+    def __init__(self, callback):
+        self.callback = callback
+        self.start = time.perf_counter()
+        self.first_token = None  # Elapsed time of the first answer token
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def emit(self, event_type: EventType, content=None, state=None, **data) -> AgentEvent:
+        event = AgentEvent(
+            type=event_type,
+            content=content,
+            data=data,
+            elapsed=self.elapsed(),
+            state=state
+        )
+        if event_type == EventType.TOKEN and self.first_token is None:
+            self.first_token = event.elapsed
+        self.callback(event)
+        return event
+
+@contextmanager
+def report_progress(reporter: ProgressReporter):
+    """Route progress events emitted in this context to the given reporter"""
+    token = _current_reporter.set(reporter)
+    try:
+        yield reporter
+    finally:
+        _current_reporter.reset(token)
+
+def get_reporter() -> ProgressReporter:
+    """Reporter of the current run, or one that discards events when there is none"""
+    reporter = _current_reporter.get()
+    if reporter is None:
+        reporter = ProgressReporter(lambda event: None)
+    return reporter
+
+def emit_progress(event_type: EventType, **data):
+    """Emit a progress event to the reporter of the current run, if there is one"""
+    reporter = _current_reporter.get()
+    if reporter is not None:
+        reporter.emit(event_type, **data)
@@ -0,0 +1,89 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from .. import config
+
+def query_key(query_type, query_text: str, document_ids, options, corpus_version) -> Tuple:
+    """Key under which identical queries are coalesced: same type, text (case and spacing
+    aside), documents, options and corpus version"""
+    return (
+        getattr(query_type, "value", query_type),
+        " ".join((query_text or "").lower().split()),
+        tuple(sorted(document_ids or [])),
+        json.dumps(options or {}, sort_keys=True, default=str),
+        corpus_version,
+    )
+
+class SingleFlight:
+    """Coalesces concurrent executions with the same key into one, and keeps results briefly.
+
+    The first caller for a key becomes its leader and runs it; callers arriving while it
+    runs get the leader's future and share its result or error. Successful results stay
+    in a small TTL cache for late arrivals. Futures are thread-safe, so callers may be on
+    different threads and event loops (one per Streamlit session).
+    """
+    def __init__(self, ttl: float = config.QUERY_CACHE_TTL, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._in_flight: Dict[Hashable, Future] = {}
+        self._results: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._executions = 0
+        self._coalesced = 0
+        self._cache_hits = 0
+
+    def claim(self, key: Hashable) -> Tuple[bool, Future]:
+        """(True, future) if the caller must run the key and publish to the future; otherwise
+        (False, future) where the future holds, or will hold, the shared result"""
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None:
+                if cached[0] > time.monotonic():
+                    self._cache_hits += 1
+                    future = Future()
+                    future.set_result(cached[1])
+                    return False, future
+                del self._results[key]
+            future = self._in_flight.get(key)
+            if future is not None:
+                self._coalesced += 1
+                return False, future
+            future = self._in_flight[key] = Future()
+            self._executions += 1
+            return True, future
+
+    def publish(self, key: Hashable, future: Future, result: Any = None, error: Optional[BaseException] = None,
+                cache: bool = True):
+        """Hand the leader's result or error to every waiter; `cache` keeps a result for late arrivals"""
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+            if error is None and cache and self.ttl > 0:
+                self._results[key] = (time.monotonic() + self.ttl, result)
+                self._results.move_to_end(key)
+                while len(self._results) > self.max_entries:
+                    self._results.popitem(last=False)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def abandon(self, key: Hashable, future: Future):
+        """The leader stopped without a result (it was cancelled); waiters run the key themselves"""
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+        future.cancel()
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"executions": self._executions, "coalesced": self._coalesced, "cache_hits": self._cache_hits,
+                    "in_flight": len(self._in_flight), "cached": len(self._results)}
@@ -0,0 +1,184 @@
+import contextvars
+import functools
+import inspect
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+# Tracer of the run executing in the current context, and the innermost open span
+_current_tracer = contextvars.ContextVar("tracer", default=None)
+_current_span = contextvars.ContextVar("trace_span", default=None)
+
+class Span:
+    """A timed operation within a run, with free-form attributes (tokens, chunk counts, cache hits)"""
+    __slots__ = ("tracer", "span_id", "parent_id", "name", "category", "start", "end", "thread", "attrs")
+
+    def __init__(self, tracer, span_id: int, parent_id: Optional[int], name: str, category: str, attrs: Dict[str, Any]):
+        self.tracer = tracer
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.category = category
+        self.start = time.perf_counter()
+        self.end = None
+        self.thread = threading.current_thread().name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def finish(self):
+        if self.end is None:
+            self.end = time.perf_counter()
+            self.tracer._record(self)
+
+class Tracer:
+    """Collects the spans of one run"""
+    def __init__(self):
+        self.start = time.perf_counter()
+        self._spans: List[Span] = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def start_span(self, name: str, category: str, parent: Optional[Span] = None, **attrs) -> Span:
+        return Span(self, next(self._ids), parent.span_id if parent else None, name, category, attrs)
+
+    def _record(self, span: Span):
+        with self._lock:
+            self._spans.append(span)
+
+    def records(self) -> List[Dict[str, Any]]:
+        """Finished spans as dicts, ordered by start time (seconds relative to the run start)"""
+        with self._lock:
+            spans = sorted(self._spans, key=lambda span: span.start)
+        return [{
+            "span_id": span.span_id,
+            "parent_id": span.parent_id,
+            "name": span.name,
+            "category": span.category,
+            "start": span.start - self.start,
+            "duration": span.end - span.start,
+            "thread": span.thread,
+            **span.attrs,
+        } for span in spans]
+
+@contextmanager
+def trace_run(tracer: Tracer):
+    """Record the spans opened in this context into the given tracer"""
+    token = _current_tracer.set(tracer)
+    try:
+        yield tracer
+    finally:
+        _current_tracer.reset(token)
+
+def start_span(name: str, category: str, **attrs) -> Optional[Span]:
+    """Open a span under the current one without making it current (for async generators).
+
+    Returns None when no run is being traced; the caller must finish() the span.
+    """
+    tracer = _current_tracer.get()
+    if tracer is None:
+        return None
+    return tracer.start_span(name, category, _current_span.get(), **attrs)
+
+@contextmanager
+def span(name: str, category: str, **attrs):
+    """Time the enclosed block as a span of the current run (a no-op when nothing is traced)"""
+    current = start_span(name, category, **attrs)
+    if current is None:
+        yield None
+        return
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set(error=type(e).__name__)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.finish()
+
+def annotate(**attrs):
+    """Add attributes to the innermost open span, if any"""
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attrs)
+
+def traced(category: str):
+    """Decorator that records each call of a function as a span named after it"""
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_tracer.get() is None:
+                return func(*args, **kwargs)
+            attrs = {}
+            arguments = signature.bind_partial(*args, **kwargs).arguments
+            if "document_id" in arguments:
+                attrs["document_id"] = arguments["document_id"]
+            if arguments.get("document_ids"):
+                attrs["documents"] = len(arguments["document_ids"])
+            with span(func.__name__, category, **attrs):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def chrome_trace(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Convert span records to the Chrome trace event format (chrome://tracing, Perfetto)"""
+    threads = {}
+    events = []
+    for record in records:
+        tid = threads.setdefault(record["thread"], len(threads) + 1)
+        args = {key: value for key, value in record.items()
+                if key not in ("name", "category", "start", "duration", "thread")}
+        events.append({
+            "name": record["name"],
+            "cat": record["category"],
+            "ph": "X",
+            "ts": record["start"] * 1e6,
+            "dur": record["duration"] * 1e6,
+            "pid": 1,
+            "tid": tid,
+            "args": args,
+        })
+    events.extend({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": name}}
+                  for name, tid in threads.items())
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+def export_trace(records: List[Dict[str, Any]], directory: str, run_id: str,
+                 max_runs: Optional[int] = None) -> Dict[str, str]:
+    """Write a run's spans as JSONL and as a Chrome trace file; returns the paths written.
+
+    With `max_runs`, the files of older runs beyond the most recent max_runs are removed.
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = {
+        "jsonl": os.path.join(directory, f"{run_id}.jsonl"),
+        "chrome": os.path.join(directory, f"{run_id}.trace.json"),
+    }
+    with open(paths["jsonl"], "w") as f:
+        for record in records:
+            f.write(json.dumps(record, default=str) + "\n")
+    with open(paths["chrome"], "w") as f:
+        json.dump(chrome_trace(records), f, default=str)
+    if max_runs is not None:
+        _prune_traces(directory, max_runs)
+    return paths
+
+def _prune_traces(directory: str, max_runs: int):
+    """Remove the trace files of all but the max_runs most recently written runs"""
+    runs = {}
+    for entry in os.scandir(directory):
+        if entry.name.endswith(".jsonl"):
+            runs[entry.name[:-len(".jsonl")]] = entry.stat().st_mtime_ns
+    for run_id in sorted(runs, key=runs.get, reverse=True)[max(0, max_runs):]:
+        for name in (f"{run_id}.jsonl", f"{run_id}.trace.json"):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
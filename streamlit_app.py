@@ -4,9 +4,17 @@ import asyncio
 import nest_asyncio
 from research_assistant.app import ResearchAssistant
 from research_assistant.models.query import QueryType
+from research_assistant.models.events import EventType
+from research_assistant.models.job import JobStatus
+from research_assistant.graph.router import routing_stats
+from research_assistant.utils.tracing import chrome_trace
 from research_assistant.config import init_environment
-import time
 import tempfile
+import time
+import uuid
+import json
+import pandas as pd
+import altair as alt
 from langchain_core.messages import HumanMessage
 # SQLite compatibility fix for Streamlit Cloud
 import sys
@@ -40,8 +48,19 @@ st.title("AI Research Assistant")
 # Initialize session state for tracking documents
 if 'document_ids' not in st.session_state:
     st.session_state.document_ids = []
+@st.cache_resource
+def get_assistant():
+    """One warm assistant shared by every session, so identical queries from different users run once"""
+    return ResearchAssistant()
+
 if 'assistant' not in st.session_state:
-    st.session_state.assistant = ResearchAssistant()
+    st.session_state.assistant = get_assistant()
+# Run that has not finished yet; it is checkpointed and can be resumed after a rerun or failure
+if 'pending_run_id' not in st.session_state:
+    st.session_state.pending_run_id = None
+# Papers being processed in the background; polled on every rerun until they finish
+if 'ingest_jobs' not in st.session_state:
+    st.session_state.ingest_jobs = []
 
 # Sidebar for document input
 st.sidebar.header("Document Input")
@@ -51,43 +70,52 @@ doc_source = st.sidebar.radio("Choose document source:", ("Upload PDF", "arXiv I
 if doc_source == "Upload PDF":
     uploaded_file = st.sidebar.file_uploader("Upload a PDF file", type=["pdf"])
     if uploaded_file:
-        # Create a temp file with the correct extension
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-            temp_path = temp_file.name
-            temp_file.write(uploaded_file.getvalue())
-        
         # Process button with clear visual feedback
         process_pdf = st.sidebar.button("Process PDF")
         if process_pdf:
-            try:
-                with st.sidebar.status("Processing PDF..."):
-                    doc_id = st.session_state.assistant.process_paper(temp_path)
-                    if doc_id not in st.session_state.document_ids:
-                        st.session_state.document_ids.append(doc_id)
-                st.sidebar.success(f"PDF processed successfully! Document ID: {doc_id}")
-                
-                # Clean up temp file
-                try:
-                    os.unlink(temp_path)
-                except:
-                    pass
-            except Exception as e:
-                st.sidebar.error(f"Error processing PDF: {str(e)}")
-                st.sidebar.info("Check console for detailed error messages.")
+            # Create a temp file with the correct extension; the ingest job deletes it when it ends
+            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
+                temp_file.write(uploaded_file.getvalue())
+            job_id = st.session_state.assistant.submit_paper(temp_file.name, display_name=uploaded_file.name,
+                                                             temp_file=True)
+            st.session_state.ingest_jobs.append(job_id)
 else:
     arxiv_id = st.sidebar.text_input("Enter arXiv ID (e.g., 1706.03762)")
     process_arxiv = st.sidebar.button("Process arXiv Paper")
     
     if process_arxiv and arxiv_id:
-        try:
-            with st.sidebar.status("Processing arXiv paper..."):
-                doc_id = st.session_state.assistant.process_paper(arxiv_id)
-                if doc_id not in st.session_state.document_ids:
-                    st.session_state.document_ids.append(doc_id)
-            st.sidebar.success(f"arXiv paper processed! Document ID: {doc_id}")
-        except Exception as e:
-            st.sidebar.error(f"Error processing arXiv paper: {str(e)}")
-            st.sidebar.info("Check console for detailed error messages.")
+        st.session_state.ingest_jobs.append(st.session_state.assistant.submit_paper(arxiv_id))
+
+# Status of the background ingest jobs
+ingest_running = False
+for job_id in list(st.session_state.ingest_jobs):
+    job = st.session_state.assistant.ingest_jobs.get(job_id)
+    if job is None or not job.active:
+        st.session_state.ingest_jobs.remove(job_id)
+    if job is None:
+        continue
+    if job.status == JobStatus.COMPLETED and job.document_id is None:
+        st.toast(f"{job.source} finished")  # Index maintenance, not an ingest
+    elif job.status == JobStatus.COMPLETED:
+        if job.document_id not in st.session_state.document_ids:
+            st.session_state.document_ids.append(job.document_id)
+        st.toast(f"{job.source} processed! Document ID: {job.document_id}")
+    elif job.status == JobStatus.FAILED:
+        st.sidebar.error(f"Error processing {job.source}: {job.error}")
+        st.sidebar.info("Check console for detailed error messages.")
+    elif job.status == JobStatus.CANCELLED:
+        st.toast(f"Processing of {job.source} cancelled")
+    else:
+        ingest_running = True
+        stage = job.progress.get(job.stage) if job.stage else None
+        label = f"{job.source}: {job.stage or 'queued'}"
+        fraction = 0.0
+        if stage is not None:
+            label += f" {stage.done}/{stage.total}" if stage.total else f" {stage.done}"
+            fraction = stage.done / stage.total if stage.total else 0.0
+        st.sidebar.progress(min(fraction, 1.0), text=label)
+        if st.sidebar.button("Cancel", key=f"cancel_{job_id}"):
+            st.session_state.assistant.ingest_jobs.cancel(job_id)
 
 # Display currently loaded documents
 if st.session_state.document_ids:
@@ -96,8 +124,24 @@ if st.session_state.document_ids:
         st.sidebar.text(f"{i+1}. {doc_id}")
     
     if st.sidebar.button("Clear All Documents"):
+        # Remove the documents from the index, then compact it in the background so the space is freed
+        with st.sidebar.status("Removing documents..."):
+            deleted = st.session_state.assistant.doc_processor.delete_documents(st.session_state.document_ids)
+        if deleted:
+            st.session_state.ingest_jobs.append(st.session_state.assistant.compact_index())
         st.session_state.document_ids = []
-        st.sidebar.success("All documents cleared!")
+        st.sidebar.success(f"All documents cleared! Removed {deleted} chunks")
+
+# Everything in the vector index (all sessions share it); scanned only when asked for
+with st.sidebar.expander("Indexed documents"):
+    if st.checkbox("Scan the index"):
+        indexed = st.session_state.assistant.doc_processor.list_documents()
+        if indexed:
+            st.dataframe(pd.DataFrame([info.model_dump() for info in indexed]), hide_index=True)
+        else:
+            st.write("The index is empty.")
+    if st.button("Compact index"):
+        st.session_state.ingest_jobs.append(st.session_state.assistant.compact_index())
 
 # Main panel for query
 st.header("Ask a Research Question")
@@ -122,6 +166,8 @@ if query_type == QueryType.SUMMARIZE.value:
         options["summary_type"] = st.selectbox("Summary type:", ["general", "methods", "results", "background"])
     with col2:
         options["length"] = st.selectbox("Summary length:", ["short", "medium", "long"])
+elif query_type == QueryType.GENERATE_CITATION.value:
+    options["style"] = st.selectbox("Citation style:", ["APA", "MLA", "BibTeX"])
 
 # Result display area with proper placeholder
 result_container = st.container()
@@ -129,55 +175,105 @@ result_placeholder = st.empty()
 
 # Execute query
 run_button = st.button("Run Research Assistant", disabled=not st.session_state.document_ids)
+resume_button = False
+if st.session_state.pending_run_id and not run_button:
+    st.info("The previous query did not finish. Its completed steps are saved and can be resumed.")
+    resume_button = st.button("Resume interrupted run")
 
-async def run_async_query():
-    """Execute the query asynchronously and return the result"""
+def iterate_events(event_stream):
+    """Drive the assistant's async event stream from the synchronous Streamlit script"""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
     try:
-        # Create query and send to assistant
-        result = await st.session_state.assistant.run(
-            query_text=query_text,
-            query_type=query_type,
-            document_ids=st.session_state.document_ids,
-            options=options
-        )
-        return result
-    except Exception as e:
-        import traceback
-        st.error(f"Error running query: {str(e)}")
-        st.code(traceback.format_exc())
-        return None
-
-if run_button and query_text and st.session_state.document_ids:
+        while True:
+            try:
+                yield loop.run_until_complete(event_stream.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        # Also reached when the caller stops early: close the stream so the run is cancelled
+        loop.run_until_complete(event_stream.aclose())
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+
+if (run_button and query_text and st.session_state.document_ids) or resume_button:
+    if run_button:
+        st.session_state.pending_run_id = uuid.uuid4().hex
     with st.status("Processing your query...", expanded=True) as status:
         try:
-            # Create a progress indicator
-            progress_text = "Running research assistant..."
-            progress_bar = st.progress(0)
+            # Progress is driven entirely by the events the assistant emits
+            progress_bar = st.progress(0.0, text="Starting research assistant...")
+            progress = 0.0
+            current_node, current_step, total_steps = None, 0, 1
+            llm_calls_in_flight = set()
             
-            # Execute the query
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
+            # Placeholder the answer is streamed into
+            with result_container:
+                st.subheader("Research Assistant Response")
+                answer_placeholder = st.empty()
             
-            # Update progress to show activity
-            for percent_complete in range(0, 101, 10):
-                time.sleep(0.1)  # Simulate processing time
-                progress_bar.progress(percent_complete)
-            
-            # Actually run the query
-            result = loop.run_until_complete(run_async_query())
-            loop.close()
+            # Actually run the query, rendering tokens as they arrive
+            answer_text = ""
+            result = None
+            events = st.session_state.assistant.stream(
+                query_text=query_text,
+                query_type=query_type,
+                document_ids=st.session_state.document_ids,
+                options=options,
+                run_id=st.session_state.pending_run_id
+            )
+            for event in iterate_events(events):
+                if event.type == EventType.TOKEN:
+                    if not answer_text:
+                        status.update(label="Writing answer...")
+                    answer_text += event.content
+                    answer_placeholder.markdown(answer_text + "▌")
+                    continue
+                
+                if event.type == EventType.NODE_START:
+                    current_node = event.data["node"].replace("_", " ")
+                    current_step, total_steps = event.data["step"], event.data["total_steps"]
+                    progress = (current_step - 1) / total_steps
+                    status.update(label=f"Running {current_node}...")
+                elif event.type == EventType.DOCUMENT_DONE:
+                    progress = (current_step - 1 + event.data["completed"] / event.data["total"]) / total_steps
+                    st.write(f"{current_node}: finished {event.data['document_id']} "
+                             f"({event.data['completed']}/{event.data['total']})")
+                elif event.type == EventType.NODE_END:
+                    progress = current_step / total_steps
+                    st.write(f"Finished {current_node} in {event.data['duration']:.1f}s")
+                elif event.type == EventType.LLM_START:
+                    llm_calls_in_flight.add(event.data["call_id"])
+                elif event.type == EventType.LLM_END:
+                    llm_calls_in_flight.discard(event.data["call_id"])
+                elif event.type == EventType.FINAL:
+                    result = event.state
+                    st.session_state.last_trace = event.data.get("trace")
+                
+                progress_text = f"Step {current_step}/{total_steps}: {current_node or 'starting'}"
+                if llm_calls_in_flight:
+                    progress_text += f" ({len(llm_calls_in_flight)} LLM call(s) in flight)"
+                progress_bar.progress(min(progress, 1.0), text=progress_text)
             
             # Update status
-            progress_bar.progress(100)
+            progress_bar.progress(1.0, text="Done")
             status.update(label="Query complete!", state="complete", expanded=False)
             
             # Display the result
+            if result and not result.error:
+                st.session_state.pending_run_id = None
             if result:
                 if hasattr(result, "final_answer") and result.final_answer:
                     # Show the final answer if available
+                    answer_placeholder.markdown(result.final_answer)
                     with result_container:
-                        st.subheader("Research Assistant Response")
-                        st.markdown(result.final_answer)
+                        ttft = result.metrics.get("time_to_first_token")
+                        total = result.metrics.get("total_latency", 0.0)
+                        # Not set when no answer tokens were streamed
+                        ttft_text = f"{ttft:.2f}s" if ttft is not None else "n/a"
+                        st.caption(f"Time to first token: {ttft_text} | Total latency: {total:.2f}s")
+                        with st.expander("Execution plan"):
+                            st.dataframe(result.plan)
                 else:
                     # Show a human-readable message when no final answer
                     with result_container:
@@ -188,7 +284,7 @@ if run_button and query_text and st.session_state.document_ids:
         
         except Exception as e:
             import traceback
-            st.error(f"Unexpected error: {str(e)}")
+            st.error(f"Error running query: {str(e)}")
             st.code(traceback.format_exc())
             status.update(label="Error occurred", state="error")
 
@@ -197,8 +293,38 @@ with st.expander("Debug Information"):
     st.write("Document IDs:", st.session_state.document_ids)
     st.write("Query Type:", query_type)
     st.write("Query Options:", options)
+    st.write("LLM Metrics (per model tier):", st.session_state.assistant.tools.llm_metrics())
+    st.write("Embedding batching:", st.session_state.assistant.doc_processor.embedding_metrics())
+    st.write("Routing decisions:", routing_stats())
+    if st.session_state.assistant.single_flight is not None:
+        st.write("Query coalescing:", st.session_state.assistant.single_flight.stats())
+    
+    # Waterfall of the spans recorded during the last run
+    trace = st.session_state.get("last_trace")
+    if trace:
+        st.write("Trace of the last run:")
+        trace_df = pd.DataFrame(trace)
+        trace_df["end"] = trace_df["start"] + trace_df["duration"]
+        trace_df["span"] = trace_df["span_id"].astype(str) + " " + trace_df["name"]
+        tooltip_fields = ["name", "category", "start", "duration", "document_id", "chunks",
+                          "prompt_tokens", "completion_tokens", "cache_hit", "queue_wait"]
+        chart = alt.Chart(trace_df).mark_bar().encode(
+            x=alt.X("start:Q", title="Seconds since start"),
+            x2="end:Q",
+            y=alt.Y("span:N", sort=None, title=None),
+            color="category:N",
+            tooltip=[field for field in tooltip_fields if field in trace_df.columns]
+        )
+        st.altair_chart(chart, use_container_width=True)
+        st.download_button("Download Chrome trace", json.dumps(chrome_trace(trace), default=str),
+                           file_name="trace.json", mime="application/json")
     
     if st.button("Print Session State"):
         filtered_state = {k: v for k, v in st.session_state.items() 
                           if k not in ['assistant']}  # Filter out complex objects
         st.write(filtered_state)
+
+# Poll the background ingest jobs until they finish
+if ingest_running:
+    time.sleep(1)
+    st.rerun()
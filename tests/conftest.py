@@ -0,0 +1,40 @@
+"""Shared test setup: the offline fake LLM backend and every store under a temporary directory.
+
+The environment is set before research_assistant is imported, since its config is read at import.
+"""
+import os
+import tempfile
+
+import pytest
+
+from benchmarks.common import setup_offline_environment, HashingEmbeddings
+
+setup_offline_environment(tempfile.mkdtemp(prefix="ra_tests_"))
+
+from research_assistant.utils.llm_backends import FakeChatModel
+
+@pytest.fixture
+def make_assistant(tmp_path):
+    """Builds a ResearchAssistant on a fresh index in tmp_path, with the fake LLM and hashing embeddings"""
+    from research_assistant.app import ResearchAssistant
+    from research_assistant.processors.document_processor import DocumentProcessor
+    from research_assistant.processors.metadata_registry import MetadataRegistry
+
+    assistants = []
+
+    def make(llm_latency: float = 0.0):
+        processor = DocumentProcessor(embeddings=HashingEmbeddings(), persist_directory=str(tmp_path / "chroma"),
+                                      metadata_registry=MetadataRegistry(str(tmp_path / "metadata.json")))
+        assistant = ResearchAssistant(llm=FakeChatModel(latency=llm_latency), doc_processor=processor)
+        assistants.append(assistant)
+        return assistant
+
+    yield make
+    for assistant in assistants:
+        assistant.ingest_jobs.shutdown()
+
+@pytest.fixture
+def paper(tmp_path):
+    """Path of a small synthetic PDF"""
+    from benchmarks.synthetic import make_pdfs
+    return make_pdfs(str(tmp_path / "pdfs"), 1, 2)[0][0]
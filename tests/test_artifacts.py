@@ -0,0 +1,46 @@
+import os
+import time
+
+from research_assistant.models.agent import AgentState
+from research_assistant.utils.artifacts import ArtifactStore
+from research_assistant.utils.checkpoint import CheckpointStore, COMPLETED
+
+def backdate(store: ArtifactStore, ref, seconds: float):
+    path = os.path.join(store.directory, f"{ref['artifact_id']}.json")
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+def test_sweep_keeps_referenced_and_recent_artifacts(tmp_path):
+    store = ArtifactStore(str(tmp_path), cache_size=0)
+    kept, dropped, recent = store.put("kept"), store.put("dropped"), store.put("recent")
+    backdate(store, kept, 7200)
+    backdate(store, dropped, 7200)
+
+    assert store.sweep({kept["artifact_id"]}, min_age=3600) == 1
+    assert sorted(os.listdir(tmp_path)) == sorted(f"{ref['artifact_id']}.json" for ref in (kept, recent))
+    assert store.get(kept) == "kept"
+
+def test_putting_existing_content_again_refreshes_its_age(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    ref = store.put("shared")
+    backdate(store, ref, 7200)
+    store.put("shared")
+    assert store.sweep(set(), min_age=3600) == 0
+
+def test_checkpointed_runs_keep_their_artifacts(tmp_path):
+    artifacts = ArtifactStore(str(tmp_path / "artifacts"))
+    checkpoints = CheckpointStore(str(tmp_path / "runs.db"), retention_hours=1)
+    in_state, in_step, orphan = artifacts.put("state"), artifacts.put("step"), artifacts.put("orphan")
+    state = AgentState(query={"query_text": "q", "query_type": "answer_question"},
+                       extracted_info={"doc": {"summary": in_state}})
+    checkpoints.save_state("run", state, COMPLETED)
+    checkpoints.save_step("run", "summary", "doc", {"review": in_step})
+    assert checkpoints.artifact_ids() == {in_state["artifact_id"], in_step["artifact_id"]}
+
+    for ref in (in_state, in_step, orphan):
+        backdate(artifacts, ref, 7200)
+    assert artifacts.sweep(checkpoints.artifact_ids(), min_age=3600) == 1
+    # Once the run is deleted, nothing refers to its artifacts any more
+    checkpoints.delete_run("run")
+    assert artifacts.sweep(checkpoints.artifact_ids(), min_age=3600) == 2
+    assert os.listdir(tmp_path / "artifacts") == []
@@ -0,0 +1,97 @@
+import asyncio
+import json
+import shutil
+
+import pytest
+
+from research_assistant.batch import BatchRunner, load_jobs, COMPLETED, FAILED
+
+def write_jobs(path, jobs):
+    path.write_text("\n".join(json.dumps(job) for job in jobs) + "\n")
+    return str(path)
+
+def read_results(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+def count_ingests(assistant, monkeypatch):
+    """Replaces process_paper with a spy; returns the list of sources it was called with"""
+    sources, process_paper = [], assistant.process_paper
+    def spy(source):
+        sources.append(source)
+        return process_paper(source)
+    monkeypatch.setattr(assistant, "process_paper", spy)
+    return sources
+
+def test_load_jobs(tmp_path):
+    path = tmp_path / "jobs.jsonl"
+    path.write_text('{"job_id": "a", "tool": "summarize", "source": "p.pdf"}\n\n'
+                    '{"job_id": "b", "query_type": "compare_papers", "document_ids": ["x", "y"]}\n')
+    assert [job["job_id"] for job in load_jobs(str(path))] == ["a", "b"]
+
+    for jobs, error in [
+        ([{"tool": "summarize"}], "no job_id"),
+        ([{"job_id": "a", "tool": "claims"}, {"job_id": "a", "tool": "claims"}], "duplicate job_id"),
+        ([{"job_id": "a", "tool": "translate"}], "unknown tool"),
+        ([{"job_id": "a"}], "needs a 'tool' or a 'query_type'"),
+    ]:
+        with pytest.raises(ValueError, match=error):
+            load_jobs(write_jobs(path, jobs))
+    with pytest.raises(ValueError):
+        load_jobs(write_jobs(path, [{"job_id": "a", "query_type": "no_such_query"}]))
+
+def test_completed_jobs_are_skipped_on_resume(make_assistant, paper, tmp_path, monkeypatch):
+    assistant = make_assistant()
+    ingests = count_ingests(assistant, monkeypatch)
+    output = str(tmp_path / "results.jsonl")
+    jobs = [{"job_id": f"citation-{style}", "tool": "citation", "source": paper, "args": {"style": style}}
+            for style in ("APA", "MLA")]
+
+    stats = asyncio.run(BatchRunner(assistant, output).run(jobs[:1]))
+    assert stats["completed"] == 1 and stats["skipped"] == 0
+    stats = asyncio.run(BatchRunner(assistant, output).run(jobs))
+    assert stats["completed"] == 1 and stats["skipped"] == 1
+
+    results = read_results(output)
+    assert [result["job_id"] for result in results] == ["citation-APA", "citation-MLA"]
+    assert all(result["status"] == COMPLETED for result in results)
+    assert results[0]["document_ids"] == results[1]["document_ids"]
+    assert ingests == [paper]
+
+def test_failed_jobs_are_recorded_and_retried(make_assistant, paper, tmp_path, monkeypatch):
+    assistant = make_assistant()
+    ingests = count_ingests(assistant, monkeypatch)
+    output = str(tmp_path / "results.jsonl")
+    jobs = [{"job_id": "claims", "tool": "claims", "source": paper},
+            {"job_id": "citation", "tool": "citation", "source": paper}]
+
+    def fail(document_id, **kwargs):
+        raise RuntimeError("model unavailable")
+    monkeypatch.setattr(assistant.tools, "extract_claims", fail)
+    stats = asyncio.run(BatchRunner(assistant, output).run(jobs))
+    assert stats["completed"] == 1 and stats["failed"] == 1
+    failed = next(result for result in read_results(output) if result["job_id"] == "claims")
+    assert failed["status"] == FAILED and failed["error"] == "RuntimeError: model unavailable"
+
+    monkeypatch.setattr(assistant.tools, "extract_claims", lambda document_id, **kwargs: [])
+    stats = asyncio.run(BatchRunner(assistant, output).run(jobs))
+    assert stats["completed"] == 1 and stats["skipped"] == 1 and stats["failed"] == 0
+    # The retry finds the paper ingested by the failed run rather than ingesting it again
+    assert ingests == [paper]
+    assert len(assistant.doc_processor.list_documents()) == 1
+
+def test_indexed_sources_are_not_ingested_again(make_assistant, paper, tmp_path, monkeypatch):
+    assistant = make_assistant()
+    ingests = count_ingests(assistant, monkeypatch)
+    copy = str(tmp_path / "copy.pdf")
+    shutil.copy(paper, copy)
+
+    asyncio.run(BatchRunner(assistant, str(tmp_path / "first.jsonl")).run(
+        [{"job_id": "a", "tool": "citation", "source": paper}]))
+    # A new output file and the same contents under another path
+    asyncio.run(BatchRunner(assistant, str(tmp_path / "second.jsonl")).run(
+        [{"job_id": "a", "tool": "citation", "source": paper}, {"job_id": "b", "tool": "citation", "source": copy}]))
+
+    assert ingests == [paper]
+    [info] = assistant.doc_processor.list_documents()
+    assert {result["document_ids"][0] for result in read_results(tmp_path / "second.jsonl")} == {info.document_id}
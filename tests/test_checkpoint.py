@@ -0,0 +1,50 @@
+import time
+
+from research_assistant.models.agent import AgentState
+from research_assistant.utils.checkpoint import CheckpointStore, COMPLETED, FAILED
+
+def make_state() -> AgentState:
+    return AgentState(query={"query_text": "question", "query_type": "answer_question"})
+
+def age_run(store: CheckpointStore, run_id: str, hours: float):
+    with store._conn:
+        store._conn.execute("UPDATE runs SET updated = ? WHERE run_id = ?", (time.time() - hours * 3600, run_id))
+
+def test_delete_run_removes_state_and_steps(tmp_path):
+    store = CheckpointStore(str(tmp_path / "runs.db"))
+    store.save_state("run", make_state())
+    store.save_step("run", "summary", "doc", {"text": "summary"})
+    store.delete_run("run")
+    assert store.load_state("run") is None
+    assert store.load_step("run", "summary", "doc") is None
+    assert store.runs() == []
+
+def test_old_completed_runs_are_pruned_on_open(tmp_path):
+    path = str(tmp_path / "runs.db")
+    store = CheckpointStore(path, retention_hours=1)
+    for run_id, status in [("old_completed", COMPLETED), ("old_failed", FAILED), ("recent", COMPLETED)]:
+        store.save_state(run_id, make_state(), status)
+        store.save_step(run_id, "summary", "doc", "summary")
+    age_run(store, "old_completed", 2)
+    age_run(store, "old_failed", 2)
+
+    reopened = CheckpointStore(path, retention_hours=1)
+    assert {run["run_id"] for run in reopened.runs()} == {"old_failed", "recent"}
+    assert reopened.load_step("old_completed", "summary", "doc") is None
+    assert reopened.load_step("old_failed", "summary", "doc") == "summary"
+
+def test_completing_a_run_prunes_old_ones(tmp_path):
+    store = CheckpointStore(str(tmp_path / "runs.db"), retention_hours=1)
+    store.save_state("old", make_state(), COMPLETED)
+    age_run(store, "old", 2)
+    store.save_state("new", make_state())
+    assert {run["run_id"] for run in store.runs()} == {"old", "new"}
+    store.save_state("new", make_state(), COMPLETED)
+    assert [run["run_id"] for run in store.runs()] == ["new"]
+
+def test_zero_retention_keeps_runs(tmp_path):
+    store = CheckpointStore(str(tmp_path / "runs.db"), retention_hours=0)
+    store.save_state("old", make_state(), COMPLETED)
+    age_run(store, "old", 10_000)
+    assert store.prune() == []
+    assert len(store.runs()) == 1
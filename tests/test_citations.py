@@ -0,0 +1,34 @@
+from datetime import datetime
+
+import pytest
+
+from research_assistant.models.document import DocumentMetadata
+from research_assistant.utils.citations import format_citation, missing_fields
+
+def make_metadata(**fields) -> DocumentMetadata:
+    return DocumentMetadata(**{"title": "Attention Is All You Need", "authors": ["Ashish Vaswani", "Noam Shazeer"],
+                               "publication_date": datetime(2017, 6, 12), "arxiv_id": "1706.03762", **fields})
+
+def test_missing_fields():
+    assert missing_fields(None) == ["title", "authors", "publication_date"]
+    assert missing_fields(make_metadata()) == []
+    assert missing_fields(make_metadata(authors=["", " "], publication_date=None)) == ["authors", "publication_date"]
+
+@pytest.mark.parametrize("style, expected", [
+    ("APA", "Vaswani, A., & Shazeer, N. (2017). Attention Is All You Need. arXiv preprint arXiv:1706.03762."),
+    ("MLA", "Vaswani, Ashish, and Noam Shazeer. \"Attention Is All You Need.\" arXiv preprint arXiv:1706.03762, 2017."),
+])
+def test_format_citation(style, expected):
+    assert format_citation("doc", make_metadata(), style) == expected
+
+@pytest.mark.parametrize("style", ["APA", "MLA", "BIBTEX"])
+def test_blank_authors_are_skipped(style):
+    metadata = make_metadata(authors=["", "  ", "Ashish Vaswani", " ", "Noam Shazeer"])
+    assert not missing_fields(metadata)
+    assert format_citation("doc", metadata, style) == format_citation("doc", make_metadata(), style)
+
+def test_bibtex_entry():
+    entry = format_citation("doc", make_metadata(authors=["Vaswani, Ashish"]), "bibtex")
+    assert entry.startswith("@misc{vaswani2017attention,")
+    assert "  author = {Vaswani, Ashish}" in entry
+    assert "  eprint = {1706.03762}" in entry
@@ -0,0 +1,69 @@
+import pytest
+from langchain_core.documents import Document
+
+from research_assistant.processors import document_processor
+
+def fake_arxiv(metadata):
+    """ArxivLoader stand-in returning one paper with the given feed metadata"""
+    class FakeArxivLoader:
+        def __init__(self, query, load_max_docs):
+            pass
+
+        def load(self):
+            return [Document(page_content="Attention is all you need. " * 200, metadata=metadata)]
+    return FakeArxivLoader
+
+def test_process_pdf_parses_the_file_once(make_assistant, paper, monkeypatch):
+    processor = make_assistant().doc_processor
+    opened = []
+
+    class CountingReader(document_processor.PdfReader):
+        def __init__(self, stream, *args, **kwargs):
+            opened.append(stream)
+            super().__init__(stream, *args, **kwargs)
+
+    monkeypatch.setattr(document_processor, "PdfReader", CountingReader)
+    document_id = processor.process_pdf(paper)
+    assert opened == [paper]
+
+    metadata = processor.metadata_registry.get(document_id)
+    assert metadata.title.startswith("A Study of")
+    assert metadata.authors == ["Ada Lovelace", "Alan Turing"]
+    chunks = processor.retrieve_relevant_chunks("methods", [document_id], k=2)
+    assert chunks and all(chunk.metadata["document_id"] == document_id for chunk in chunks)
+
+def test_delete_documents_removes_chunks_and_metadata(make_assistant, paper):
+    processor = make_assistant().doc_processor
+    kept, deleted = processor.process_pdf(paper), processor.process_pdf(paper)
+    version = processor.corpus_version
+    assert processor.delete_documents([deleted]) > 0
+    assert processor.corpus_version > version
+    assert [info.document_id for info in processor.list_documents()] == [kept]
+    assert processor.metadata_registry.get(deleted) is None
+    assert processor.retrieve_relevant_chunks("methods", [deleted]) == []
+
+def test_process_arxiv_leaves_a_missing_date_unknown(make_assistant, monkeypatch):
+    processor = make_assistant().doc_processor
+    monkeypatch.setattr(document_processor, "ArxivLoader",
+                        fake_arxiv({"Title": "Attention", "Authors": "A. Vaswani, N. Shazeer"}))
+    document_id = processor.process_arxiv("1706.03762")
+    metadata = processor.metadata_registry.get(document_id)
+    assert metadata.publication_date is None
+    assert metadata.authors == ["A. Vaswani", "N. Shazeer"]
+
+def test_process_arxiv_registers_metadata_after_the_chunks(make_assistant, monkeypatch):
+    processor = make_assistant().doc_processor
+    monkeypatch.setattr(document_processor, "ArxivLoader", fake_arxiv({"Title": "Attention", "Published": "2017-06-12"}))
+
+    def fail(doc_chunks):
+        raise RuntimeError("embedding failed")
+    monkeypatch.setattr(processor, "_add_chunks", fail)
+    with pytest.raises(Exception, match="embedding failed"):
+        processor.process_arxiv("1706.03762")
+    assert processor.metadata_registry.document_ids() == []
+
+    monkeypatch.undo()
+    monkeypatch.setattr(document_processor, "ArxivLoader", fake_arxiv({"Title": "Attention", "Published": "2017-06-12"}))
+    document_id = processor.process_arxiv("1706.03762")
+    assert processor.metadata_registry.get(document_id).publication_date.year == 2017
+    assert processor.retrieve_relevant_chunks("attention", [document_id], k=1)
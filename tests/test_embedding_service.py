@@ -0,0 +1,94 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from research_assistant.processors.embedding_service import BatchingEmbeddings
+
+class RecordingEmbeddings(Embeddings):
+    """Embeds "<n>" as [n]; records each batch, holds the one containing "hold" until released
+    and fails the one containing "bad\""""
+    def __init__(self):
+        self.batches = []
+        self.holding = threading.Event()
+        self.release = threading.Event()
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        if "hold" in texts:
+            self.holding.set()
+            self.release.wait(5)
+        if "bad" in texts:
+            raise RuntimeError("model failed")
+        return [[float(text)] if text.isdigit() else [0.0] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+def queue_behind_a_busy_model(service, model, pool, requests, max_wait=None):
+    """Submit `requests` while the model is busy with another batch, so they queue up together
+    (then gathered with `max_wait`, if given)"""
+    held = pool.submit(service.embed_documents, ["hold"])
+    assert model.holding.wait(5)
+    if max_wait is not None:
+        service.max_wait = max_wait
+    futures = [pool.submit(service.embed_documents, texts) for texts in requests]
+    deadline = time.monotonic() + 5
+    while service.metrics()["queue_depth"] < len(requests) and time.monotonic() < deadline:
+        time.sleep(0.005)
+    model.release.set()
+    held.result(5)
+    return futures
+
+def test_concurrent_callers_share_one_batch():
+    model = RecordingEmbeddings()
+    service = BatchingEmbeddings(model, max_batch_size=32, max_wait=0.01)
+    with ThreadPoolExecutor(8) as pool:
+        futures = queue_behind_a_busy_model(service, model, pool, [[str(i), str(i + 10)] for i in range(5)])
+        results = [future.result(5) for future in futures]
+    service.close()
+
+    assert results == [[[float(i)], [float(i + 10)]] for i in range(5)]
+    assert len(model.batches) == 2 and len(model.batches[1]) == 10
+    metrics = service.metrics()
+    assert (metrics["batches"], metrics["texts"], metrics["max_queue_depth"]) == (2, 11, 5)
+
+def test_a_full_batch_is_flushed_without_waiting():
+    model = RecordingEmbeddings()
+    service = BatchingEmbeddings(model, max_batch_size=4, max_wait=0.01)
+    start = time.monotonic()
+    with ThreadPoolExecutor(8) as pool:
+        futures = queue_behind_a_busy_model(service, model, pool, [["1", "2"], ["3", "4"], ["5", "6", "7"], ["8"]],
+                                            max_wait=10)
+        # The first two requests fill a batch; the third does not fit and starts the next one
+        results = [future.result(5) for future in futures]
+    assert time.monotonic() - start < 5
+    assert results == [[[1.0], [2.0]], [[3.0], [4.0]], [[5.0], [6.0], [7.0]], [[8.0]]]
+    assert model.batches[1:] == [["1", "2", "3", "4"], ["5", "6", "7", "8"]]
+    service.close()
+
+def test_a_partial_batch_is_flushed_after_max_wait():
+    model = RecordingEmbeddings()
+    service = BatchingEmbeddings(model, max_batch_size=32, max_wait=0.1)
+    start = time.monotonic()
+    assert service.embed_query("7") == [7.0]
+    assert 0.1 <= time.monotonic() - start < 2
+    assert model.batches == [["7"]]
+    service.close()
+
+def test_a_failed_batch_fails_every_caller_in_it():
+    model = RecordingEmbeddings()
+    service = BatchingEmbeddings(model, max_batch_size=32, max_wait=0.01)
+    with ThreadPoolExecutor(8) as pool:
+        futures = queue_behind_a_busy_model(service, model, pool, [["1"], ["bad"], ["2", "3"]])
+        for future in futures:
+            with pytest.raises(RuntimeError, match="model failed"):
+                future.result(5)
+    assert service.metrics()["failures"] == 1
+    # The worker keeps serving later requests
+    assert service.embed_documents(["4"]) == [[4.0]]
+    service.close()
+    with pytest.raises(RuntimeError, match="closed"):
+        service.embed_query("5")
@@ -0,0 +1,212 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from research_assistant.processors.embedding_store import EmbeddingStore
+
+def random_vectors(n: int, dimensions: int = 16, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((n, dimensions), dtype=np.float32)
+
+def fill(store: EmbeddingStore, vectors: np.ndarray, documents: int = 2):
+    store.append([f"chunk_{i}" for i in range(len(vectors))], vectors,
+                 [f"doc_{i % documents}" for i in range(len(vectors))])
+
+def test_append_and_search(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    vectors = random_vectors(20)
+    fill(store, vectors)
+    assert len(store) == 20
+    assert store.stats()["dimensions"] == 16
+
+    hits = store.search(vectors[7], 3)
+    assert hits[0] == ("chunk_7", pytest.approx(0.0, abs=1e-4))
+    assert [distance for _, distance in hits] == sorted(distance for _, distance in hits)
+    assert {chunk_id for chunk_id, _ in store.search(vectors[7], 20, ["doc_0"])} == {
+        f"chunk_{i}" for i in range(0, 20, 2)}
+    assert store.search(vectors[7], 3, ["unknown"]) == []
+
+def test_append_rejects_mismatched_input(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    fill(store, random_vectors(2))
+    with pytest.raises(ValueError):
+        store.append(["a"], random_vectors(1, dimensions=8), ["doc"])
+    with pytest.raises(ValueError):
+        store.append(["a", "b"], random_vectors(1), ["doc", "doc"])
+
+def test_appending_a_chunk_again_supersedes_its_row(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    vectors = random_vectors(4)
+    fill(store, vectors)
+    store.append(["chunk_0"], vectors[3:4], ["doc_0"])
+    assert len(store) == 4
+    assert store.stats()["dead_rows"] == 1
+    assert {chunk_id for chunk_id, _ in store.search(vectors[3], 2)} == {"chunk_0", "chunk_3"}
+
+def test_delete_hides_chunks_until_compacted(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    vectors = random_vectors(10)
+    fill(store, vectors)
+    assert store.delete(["chunk_3", "chunk_4", "missing"]) == 2
+    assert store.delete(["chunk_3"]) == 0
+    assert len(store) == 8
+    assert "chunk_3" not in {chunk_id for chunk_id, _ in store.search(vectors[3], 10)}
+
+    stats = store.stats()
+    assert (stats["rows"], stats["dead_rows"]) == (10, 2)
+    # Reopening replays the deletions from the log
+    assert len(EmbeddingStore(str(tmp_path))) == 8
+
+def test_compact_drops_dead_rows_into_a_new_generation(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    vectors = random_vectors(10)
+    fill(store, vectors)
+    store.delete(["chunk_0", "chunk_1"])
+    before = store.search(vectors[5], 5)
+
+    assert store.compact() == 2
+    stats = store.stats()
+    assert (stats["rows"], stats["dead_rows"], stats["generation"]) == (8, 0, 1)
+    assert sorted(os.listdir(tmp_path)) == ["lock", "rows.1.log", "store.json", "vectors.1.f32"]
+    assert store.search(vectors[5], 5) == before
+
+    reopened = EmbeddingStore(str(tmp_path))
+    assert len(reopened) == 8
+    assert reopened.search(vectors[5], 5) == before
+    assert store.compact() == 0
+
+def test_other_processes_see_appends_deletes_and_compaction(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    vectors = random_vectors(6)
+    fill(store, vectors[:3])
+
+    def in_other_process(code: str):
+        script = ("import sys, numpy as np\n"
+                  "from research_assistant.processors.embedding_store import EmbeddingStore\n"
+                  f"store = EmbeddingStore({str(tmp_path)!r})\n"
+                  f"vectors = np.array({vectors.tolist()!r}, dtype=np.float32)\n" + code)
+        subprocess.run([sys.executable, "-c", script], check=True, cwd=os.getcwd(), env=os.environ)
+
+    in_other_process("store.append(['chunk_3', 'chunk_4', 'chunk_5'], vectors[3:], ['doc_1'] * 3)")
+    assert len(store) == 6
+    assert store.search(vectors[4], 1)[0][0] == "chunk_4"
+
+    in_other_process("store.delete(['chunk_4'])")
+    assert store.search(vectors[4], 1)[0][0] != "chunk_4"
+
+    in_other_process("store.compact()")
+    stats = store.stats()
+    assert (stats["chunks"], stats["rows"], stats["generation"]) == (5, 5, 1)
+    assert store.search(vectors[5], 1)[0][0] == "chunk_5"
+    # And this process's appends land in the new generation
+    store.append(["chunk_6"], vectors[:1] * 2, ["doc_0"])
+    assert len(EmbeddingStore(str(tmp_path))) == 6
+
+def clustered_vectors(n: int, dimensions: int = 32, clusters: int = 10, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dimensions), dtype=np.float32)
+    return centres[np.arange(n) % clusters] + 0.5 * rng.standard_normal((n, dimensions), dtype=np.float32)
+
+def test_quantized_search_recall(tmp_path):
+    vectors = clustered_vectors(2000)
+    store = EmbeddingStore(str(tmp_path), rescore_factor=10)
+    store.quantize()
+    fill(store, vectors, documents=20)
+    assert store.stats()["quantization"] == "int8"
+
+    queries = clustered_vectors(50, seed=1)
+    recall = []
+    for query in queries:
+        exact = {chunk_id for chunk_id, _ in store.search(query, 10, exact=True)}
+        found = store.search(query, 10)
+        recall.append(len(exact & {chunk_id for chunk_id, _ in found}) / 10)
+        # Rescored candidates carry their exact distances
+        assert [distance for _, distance in found] == sorted(distance for _, distance in found)
+    assert np.mean(recall) >= 0.95
+
+def test_quantize_a_filled_store(tmp_path):
+    vectors = clustered_vectors(500)
+    store = EmbeddingStore(str(tmp_path))
+    fill(store, vectors)
+    store.delete(["chunk_1"])
+    before = store.search(vectors[10], 5)
+
+    store.quantize()
+    stats = store.stats()
+    assert (stats["quantization"], stats["chunks"], stats["rows"]) == ("int8", 499, 500)
+    assert stats["scan_bytes"] == 500 * (32 + 4)
+    assert os.path.getsize(tmp_path / "codes.0.i8") == 500 * 32
+    assert store.search(vectors[10], 5)[0][0] == "chunk_10"
+    assert [chunk_id for chunk_id, _ in store.search(vectors[10], 5, exact=True)] == [c for c, _ in before]
+
+    # Appends and compaction keep the codes in step with the vectors
+    store.append(["extra"], vectors[:1], ["doc_0"])
+    store.compact()
+    reopened = EmbeddingStore(str(tmp_path))
+    assert reopened.stats()["quantization"] == "int8"
+    assert os.path.getsize(tmp_path / "codes.1.i8") == 500 * 32
+    assert reopened.search(vectors[10], 1)[0][0] == "chunk_10"
+
+def test_dequantize_goes_back_to_exact_search(tmp_path):
+    vectors = clustered_vectors(200)
+    store = EmbeddingStore(str(tmp_path))
+    fill(store, vectors)
+    exact = store.search(vectors[3], 5)
+    store.quantize()
+    other = EmbeddingStore(str(tmp_path))
+    assert other.quantization == "int8"
+
+    store.dequantize()
+    assert store.stats()["quantization"] is None
+    assert not any(name.startswith(("codes.", "scales.")) for name in os.listdir(tmp_path))
+    assert [chunk_id for chunk_id, _ in store.search(vectors[3], 5)] == [chunk_id for chunk_id, _ in exact]
+    # Other processes pick the change up, and later appends write no codes
+    assert other.stats()["quantization"] is None
+    other.append(["extra"], vectors[:1], ["doc_0"])
+    assert len(EmbeddingStore(str(tmp_path))) == 201
+
+def test_processor_follows_the_configured_quantization(make_assistant, paper, monkeypatch):
+    from research_assistant import config
+
+    monkeypatch.setattr(config, "EMBEDDING_STORE", True)
+    monkeypatch.setattr(config, "EMBEDDING_QUANTIZATION", "int8")
+    processor = make_assistant().doc_processor
+    document_id = processor.process_pdf(paper)
+    assert processor.embedding_store.stats()["quantization"] == "int8"
+
+    monkeypatch.setattr(config, "EMBEDDING_QUANTIZATION", "none")
+    processor = make_assistant().doc_processor
+    assert processor.embedding_store.stats()["quantization"] is None
+    assert processor.retrieve_relevant_chunks("results", [document_id], k=2)
+
+
+def test_processor_keeps_no_vectors_in_chroma(make_assistant, paper, tmp_path, monkeypatch):
+    from research_assistant import config
+
+    monkeypatch.setattr(config, "EMBEDDING_STORE", True)
+    processor = make_assistant().doc_processor
+    document_id = processor.process_pdf(paper)
+    assert processor.vectorstore._collection.count() == 0
+    chunks = len(processor.embedding_store)
+    assert chunks and processor.chunk_table.count() == chunks
+    found = processor.retrieve_relevant_chunks("results", [document_id], k=2)
+    assert found and all(doc.metadata["document_id"] == document_id for doc in found)
+    [info] = processor.list_documents()
+    assert info.chunks == chunks and info.embedding_bytes == chunks * processor.embedding_store.dimensions * 4
+
+    manifest = processor.export_snapshot(str(tmp_path / "snapshot"))
+    assert manifest["rows"] == chunks
+    assert processor.delete_documents([document_id]) == chunks
+    assert processor.chunk_table.count() == 0 and not processor.retrieve_relevant_chunks("results", k=2)
+
+def test_existing_collection_moves_into_the_store(make_assistant, paper, monkeypatch):
+    from research_assistant import config
+
+    document_id = make_assistant().doc_processor.process_pdf(paper)
+    monkeypatch.setattr(config, "EMBEDDING_STORE", True)
+    processor = make_assistant().doc_processor
+    assert processor.vectorstore._collection.count() == 0
+    assert len(processor.embedding_store) == processor.chunk_table.count() > 0
+    assert processor.retrieve_relevant_chunks("results", [document_id], k=2)
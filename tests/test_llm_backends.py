@@ -0,0 +1,51 @@
+import json
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from research_assistant.utils import llm_backends
+from research_assistant.utils.llm_backends import CassetteChatModel, CassetteMissError, FakeChatModel
+
+def test_fake_model_follows_its_rules():
+    model = FakeChatModel(rules=[{"pattern": "hello", "response": "world"}], default_response="default")
+    assert model.invoke("Hello there").content == "world"
+    assert model.invoke("something else").content == "default"
+    assert "".join(chunk.content for chunk in model.stream("hello")) == "world"
+
+def test_both_tiers_record_into_one_cassette_and_replay(tmp_path, monkeypatch):
+    path = str(tmp_path / "cassette.json")
+    fast = CassetteChatModel(path=path, mode="record", model_name="fast-model",
+                             inner=FakeChatModel(default_response="fast answer"))
+    large = CassetteChatModel(path=path, mode="record", model_name="large-model",
+                              inner=FakeChatModel(default_response="large answer"))
+    prompt = [HumanMessage(content="Summarize the paper")]
+    assert fast.invoke(prompt).content == "fast answer"
+    assert large.invoke(prompt).content == "large answer"
+    assert "".join(chunk.content for chunk in large.stream("Stream this")) == "large answer"
+    with open(path) as f:
+        assert len(json.load(f)["interactions"]) == 3
+    assert not list(tmp_path.glob("*.tmp"))
+
+    # Replay from the file alone, as a new process would
+    monkeypatch.setattr(llm_backends, "_cassettes", {})
+    fast = CassetteChatModel(path=path, mode="replay", model_name="fast-model")
+    large = CassetteChatModel(path=path, mode="replay", model_name="large-model")
+    assert fast.invoke(prompt).content == "fast answer"
+    assert large.invoke(prompt).content == "large answer"
+    assert "".join(chunk.content for chunk in large.stream("Stream this")) == "large answer"
+    with pytest.raises(CassetteMissError):
+        fast.invoke("Stream this")
+
+def test_saving_keeps_recordings_made_by_another_process(tmp_path, monkeypatch):
+    path = str(tmp_path / "cassette.json")
+    first = CassetteChatModel(path=path, mode="record", model_name="m", inner=FakeChatModel(default_response="one"))
+    # A second process has its own registry, read before the first one recorded
+    monkeypatch.setattr(llm_backends, "_cassettes", {})
+    second = CassetteChatModel(path=path, mode="record", model_name="m", inner=FakeChatModel(default_response="two"))
+    first.invoke("first prompt")
+    second.invoke("second prompt")
+
+    monkeypatch.setattr(llm_backends, "_cassettes", {})
+    replay = CassetteChatModel(path=path, mode="replay", model_name="m")
+    assert replay.invoke("first prompt").content == "one"
+    assert replay.invoke("second prompt").content == "two"
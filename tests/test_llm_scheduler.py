@@ -0,0 +1,109 @@
+import asyncio
+import threading
+import time
+
+from research_assistant.utils.llm_backends import FakeChatModel
+from research_assistant.utils.llm_utils import LLMScheduler, Priority
+
+def make_scheduler(latency: float = 0.0, **limits) -> LLMScheduler:
+    limits = {"requests_per_minute": 10**9, "tokens_per_minute": 10**9, "max_concurrency": 4, **limits}
+    return LLMScheduler(FakeChatModel(latency=latency, default_response="ok"), **limits)
+
+async def stream_text(scheduler: LLMScheduler, prompt: str = "hi", priority=None) -> str:
+    return "".join([chunk.content async for chunk in scheduler.astream(prompt, priority)])
+
+def test_waiting_streams_hold_no_threads():
+    scheduler = make_scheduler(latency=0.02, max_concurrency=1)
+    baseline = threading.active_count()
+    peak = []
+
+    async def main():
+        calls = asyncio.gather(*(stream_text(scheduler) for _ in range(20)))
+        while not calls.done():
+            peak.append(threading.active_count())
+            await asyncio.sleep(0.01)
+        return await calls
+
+    assert asyncio.run(main()) == ["ok"] * 20
+    assert max(peak) <= baseline
+    metrics = scheduler.metrics()
+    assert (metrics["calls"], metrics["active"], metrics["queue_depth"]) == (20, 0, 0)
+    assert metrics["max_queue_depth"] >= 19
+
+def test_streams_wait_out_a_rate_limit_pause():
+    scheduler = make_scheduler()
+    scheduler._paused_until = time.monotonic() + 0.2
+
+    async def main():
+        start = time.monotonic()
+        await stream_text(scheduler)
+        return time.monotonic() - start
+
+    assert asyncio.run(main()) >= 0.2
+    assert scheduler.metrics()["wait_time"]["interactive"]["max"] >= 0.2
+
+def test_slot_released_by_a_thread_wakes_a_waiting_stream():
+    scheduler = make_scheduler(latency=0.2, max_concurrency=1)
+    worker = threading.Thread(target=scheduler.invoke, args=("slow",))
+    worker.start()
+    time.sleep(0.05)
+
+    async def main():
+        start = time.monotonic()
+        await asyncio.wait_for(stream_text(scheduler), 2)
+        return time.monotonic() - start
+
+    assert 0.1 <= asyncio.run(main()) < 1
+    worker.join()
+
+def test_interactive_calls_are_served_before_batch_calls():
+    scheduler = make_scheduler(latency=0.05, max_concurrency=1)
+    order = []
+
+    async def call(name, priority):
+        await stream_text(scheduler, name, priority)
+        order.append(name)
+
+    async def main():
+        first = asyncio.create_task(call("first", Priority.BATCH))
+        await asyncio.sleep(0.01)
+        await asyncio.gather(call("batch", Priority.BATCH), call("interactive", Priority.INTERACTIVE), first)
+
+    asyncio.run(main())
+    assert order == ["first", "interactive", "batch"]
+
+def test_cancelled_waiter_leaves_the_queue():
+    scheduler = make_scheduler(latency=0.2, max_concurrency=1)
+
+    async def main():
+        running = asyncio.create_task(stream_text(scheduler))
+        await asyncio.sleep(0.05)
+        waiting = asyncio.create_task(stream_text(scheduler))
+        await asyncio.sleep(0.05)
+        assert scheduler.metrics()["queue_depth"] == 1
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        assert scheduler.metrics()["queue_depth"] == 0
+        assert await running == "ok"
+        # The slot is free again for the next call
+        assert await asyncio.wait_for(stream_text(scheduler), 2) == "ok"
+
+    asyncio.run(main())
+    assert scheduler.metrics()["active"] == 0
+
+def test_release_settles_the_reservation_with_the_usage_reported():
+    scheduler = make_scheduler(tokens_per_minute=6000)
+    bucket = scheduler._tokens
+    bucket.rate = 0.0  # No refill while settling
+
+    def settle(usage):
+        scheduler._active += 1
+        bucket.tokens = 1000.0
+        scheduler._release(100, usage)
+        return 1000.0 - bucket.tokens
+
+    # The reserved 100 tokens were already taken; release takes (or refunds) the difference
+    assert settle({"total_tokens": 150}) == 50
+    assert settle({"input_tokens": 30, "output_tokens": 40}) == -30
+    assert settle({"model": "fake"}) == 0
+    assert settle(None) == 0
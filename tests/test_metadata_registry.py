@@ -0,0 +1,35 @@
+from datetime import datetime
+
+from research_assistant.processors.metadata_registry import MetadataRegistry, extract_pdf_metadata
+from research_assistant.utils.citations import missing_fields
+
+FIRST_PAGE = """Attention Is All You Need
+Ashish Vaswani, Noam Shazeer and Niki Parmar
+Abstract
+The dominant sequence transduction models are based on complex recurrent networks.
+"""
+
+def test_creation_date_is_not_taken_as_the_publication_date():
+    metadata = extract_pdf_metadata({"/CreationDate": "D:20240102120000Z"}, FIRST_PAGE, "paper.pdf")
+    assert metadata.title == "Attention Is All You Need"
+    assert metadata.authors == ["Ashish Vaswani", "Noam Shazeer", "Niki Parmar"]
+    assert metadata.publication_date is None
+    # So the citation is left to the LLM
+    assert missing_fields(metadata) == ["publication_date"]
+
+def test_arxiv_identifier_dates_the_paper():
+    metadata = extract_pdf_metadata({"/CreationDate": "D:20240102120000Z", "/Title": "Attention Is All You Need",
+                                     "/Author": "Ashish Vaswani; Noam Shazeer"},
+                                    FIRST_PAGE + "arXiv:1706.03762v7 [cs.CL] 2 Aug 2023", "paper.pdf")
+    assert metadata.arxiv_id == "1706.03762"
+    assert metadata.publication_date == datetime(2017, 6, 1)
+    assert metadata.url == "https://arxiv.org/abs/1706.03762"
+    assert missing_fields(metadata) == []
+
+def test_registry_persists_entries(tmp_path):
+    path = str(tmp_path / "metadata.json")
+    registry = MetadataRegistry(path)
+    registry.put("doc", extract_pdf_metadata({}, FIRST_PAGE, "paper.pdf"))
+    assert MetadataRegistry(path).get("doc").title == "Attention Is All You Need"
+    registry.remove("doc")
+    assert MetadataRegistry(path).document_ids() == []
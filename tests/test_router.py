@@ -0,0 +1,69 @@
+from langgraph.graph import END
+
+from research_assistant.graph import router
+from research_assistant.models.agent import AgentAction, AgentState
+
+def make_state(query_text: str, query_type=None, **fields) -> AgentState:
+    return AgentState(query={"query_text": query_text, "query_type": query_type}, **fields)
+
+def count_llm_calls(tools, monkeypatch):
+    """Record the tasks of the LLM calls made through the tools"""
+    calls = []
+    invoke_llm = tools.invoke_llm
+
+    def counted(messages, task="answer"):
+        calls.append(task)
+        return invoke_llm(messages, task=task)
+
+    monkeypatch.setattr(tools, "invoke_llm", counted)
+    return calls
+
+def test_query_types_follow_the_routing_table(make_assistant, monkeypatch):
+    tools = make_assistant().tools
+    calls = count_llm_calls(tools, monkeypatch)
+    state = make_state("Summarize the paper", "extract_info")
+    assert router.route(state, tools)["next_nodes"] == ["process_documents"]
+
+    state = state.model_copy(update={"documents": {"doc": {}}})
+    update = router.route(state, tools)
+    assert update["next_nodes"] == ["extract_methodology", "extract_claims"]
+    assert update["metrics"] == {"rule_routed_steps": 1}
+
+    state = state.model_copy(update={"extracted_info": {"methodologies": {}, "claims": {}}})
+    assert router.route(state, tools)["next_nodes"] == ["provide_final_answer"]
+    assert router.route(state.model_copy(update={"final_answer": "done"}), tools)["next_nodes"] == [END]
+    assert calls == []
+
+def test_free_text_keyword_rules_pick_the_analysis(make_assistant, monkeypatch):
+    tools = make_assistant().tools
+    calls = count_llm_calls(tools, monkeypatch)
+    for text, node in [("How do these two papers differ versus each other", "compare_documents"),
+                       ("Give me the BibTeX for this", "generate_citation"),
+                       ("What datasets were used?", "extract_methodology")]:
+        update = router.route(make_state(text, documents={"doc": {}}), tools)
+        assert update["next_nodes"] == [node], text
+        assert "next_actions" not in update
+    assert calls == []
+
+def test_ambiguous_free_text_is_routed_by_the_llm_once(make_assistant, monkeypatch):
+    tools = make_assistant().tools
+    calls = count_llm_calls(tools, monkeypatch)
+    state = make_state("Tell me about these papers", documents={"doc": {}})
+    update = router.route(state, tools)
+    # The fake backend answers the router prompt with answer_question
+    assert update["next_nodes"] == ["answer_question"]
+    assert update["next_actions"] == [AgentAction(action="answer_question")]
+    assert update["metrics"] == {"llm_routed_steps": 1}
+    assert calls == ["route"]
+
+    # Later steps follow the decision without asking again
+    state = state.model_copy(update={"next_actions": update["next_actions"],
+                                     "extracted_info": {"answer": "an answer"}})
+    assert router.route(state, tools)["next_nodes"] == ["provide_final_answer"]
+    assert calls == ["route"]
+
+def test_unusable_llm_choice_falls_back_to_the_default_analysis(make_assistant, monkeypatch):
+    tools = make_assistant().tools
+    monkeypatch.setattr(tools, "invoke_llm", lambda messages, task: "final_answer")
+    update = router.route(make_state("Tell me about these papers", documents={"doc": {}}), tools)
+    assert update["next_nodes"] == router.planner.DEFAULT_ANALYSIS
@@ -0,0 +1,197 @@
+import asyncio
+import json
+import tempfile
+import threading
+
+import aiohttp
+from aiohttp.test_utils import TestClient, TestServer
+
+from research_assistant import config
+from research_assistant.server import create_app
+
+QUERY = {"query_text": "What is the main contribution?", "query_type": "answer_question"}
+
+def serve(scenario, **app_kwargs):
+    """Run `scenario(client)` against the API on a localhost test server"""
+    async def main():
+        async with TestClient(TestServer(create_app(**app_kwargs))) as client:
+            return await scenario(client)
+    return asyncio.run(main())
+
+async def wait_for_job(client, job, timeout: float = 30.0):
+    for _ in range(int(timeout / 0.05)):
+        job = await (await client.get(job["status_url"])).json()
+        if job["status"] not in ("queued", "running"):
+            return job
+        await asyncio.sleep(0.05)
+    raise AssertionError(f"ingest job still {job['status']}")
+
+def test_ready_is_503_until_warm_up_finishes(make_assistant):
+    release = threading.Event()
+
+    def factory():
+        release.wait(10)
+        return make_assistant()
+
+    async def scenario(client):
+        response = await client.get("/ready")
+        assert response.status == 503
+        assert (await response.json())["ready"] is False
+        # Liveness does not wait for the assistant
+        health = await client.get("/health")
+        assert health.status == 200
+        assert (await health.json())["status"] == "ok"
+        # Requests needing the assistant are turned away until it is ready
+        response = await client.post("/query", json=QUERY)
+        assert response.status == 503
+
+        release.set()
+        for _ in range(200):
+            response = await client.get("/ready")
+            if response.status == 200:
+                break
+            await asyncio.sleep(0.05)
+        assert response.status == 200
+        assert (await response.json()) == {"ready": True}
+
+    serve(scenario, assistant_factory=factory)
+
+def test_health_reports_limiter_stats(make_assistant):
+    async def scenario(client):
+        body = await (await client.get("/health")).json()
+        assert body["limits"]["query"]["limit"] == config.SERVER_MAX_CONCURRENT_QUERIES
+        assert body["limits"]["query"]["running"] == 0
+
+    serve(scenario, assistant=make_assistant())
+
+def test_ingest_upload_runs_as_background_job(make_assistant, paper):
+    assistant = make_assistant()
+
+    async def scenario(client):
+        form = aiohttp.FormData()
+        with open(paper, "rb") as f:
+            form.add_field("file", f.read(), filename="paper.pdf", content_type="application/pdf")
+        response = await client.post("/ingest", data=form)
+        assert response.status == 202
+        job = await wait_for_job(client, await response.json())
+        assert job["status"] == "completed", job
+        assert job["source"] == "paper.pdf"
+        assert job["progress"]["embedding"]["done"] == job["progress"]["embedding"]["total"]
+        assert job["document_id"] in [info.document_id for info in assistant.doc_processor.list_documents()]
+
+        jobs = await (await client.get("/ingest")).json()
+        assert [listed["job_id"] for listed in jobs["jobs"]] == [job["job_id"]]
+        assert (await client.get("/ingest/unknown")).status == 404
+        assert (await client.delete("/ingest/unknown")).status == 404
+
+    serve(scenario, assistant=assistant)
+
+def test_ingest_rejects_an_upload_over_the_size_limit(make_assistant, monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "SERVER_MAX_UPLOAD_MB", 1)
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    monkeypatch.setattr(tempfile, "tempdir", str(uploads))
+    assistant = make_assistant()
+
+    async def scenario(client):
+        form = aiohttp.FormData()
+        form.add_field("file", b"%PDF-1.4" + b"0" * (5 * 2**20), filename="big.pdf", content_type="application/pdf")
+        response = await client.post("/ingest", data=form)
+        assert response.status == 413
+        assert "exceeds 1 MB" in (await response.json())["error"]
+
+    serve(scenario, assistant=assistant)
+    assert assistant.ingest_jobs.jobs() == []
+    assert list(uploads.iterdir()) == []
+
+def test_ingest_rejects_a_request_without_paper(make_assistant):
+    async def scenario(client):
+        assert (await client.post("/ingest", json={"title": "no paper"})).status == 400
+        form = aiohttp.FormData()
+        form.add_field("other", "value")
+        assert (await client.post("/ingest", data=form)).status == 400
+
+    serve(scenario, assistant=make_assistant())
+
+def test_query_returns_the_final_answer(make_assistant, paper):
+    assistant = make_assistant()
+    document_id = assistant.process_paper(paper)
+
+    async def scenario(client):
+        response = await client.post("/query", json={**QUERY, "document_ids": [document_id], "run_id": "run-1"})
+        assert response.status == 200
+        body = await response.json()
+        assert body["run_id"] == "run-1"
+        assert body["final_answer"]
+        assert body["error"] is None
+        assert "trace" not in body
+
+    serve(scenario, assistant=assistant)
+
+def test_query_rejects_an_invalid_body(make_assistant):
+    async def scenario(client):
+        assert (await client.post("/query", data="not json")).status == 400
+        response = await client.post("/query", json={**QUERY, "query_type": "unknown"})
+        assert response.status == 400
+        assert (await response.json())["error"] == "invalid query"
+
+    serve(scenario, assistant=make_assistant())
+
+def test_query_stream_is_ndjson_ending_with_the_final_event(make_assistant, paper):
+    assistant = make_assistant()
+    document_id = assistant.process_paper(paper)
+
+    async def scenario(client):
+        response = await client.post("/query/stream", json={**QUERY, "document_ids": [document_id]})
+        assert response.status == 200
+        assert response.headers["Content-Type"].startswith("application/x-ndjson")
+        run_id = response.headers["X-Run-Id"]
+        events = [json.loads(line) async for line in response.content if line.strip()]
+        assert {event["run_id"] for event in events} == {run_id}
+        assert "token" in {event["type"] for event in events}
+        assert events[-1]["type"] == "final"
+        assert events[-1]["final_answer"]
+        assert all(event["type"] != "final" for event in events[:-1])
+
+    serve(scenario, assistant=assistant)
+
+def test_queries_over_the_limit_get_503_with_retry_after(make_assistant, monkeypatch):
+    monkeypatch.setattr(config, "SERVER_MAX_CONCURRENT_QUERIES", 1)
+    monkeypatch.setattr(config, "SERVER_QUEUE_TIMEOUT", 0.1)
+
+    async def scenario(client):
+        first = asyncio.create_task(client.post("/query", json={**QUERY, "query_text": "first"}))
+        await asyncio.sleep(0.2)  # The first query holds the only slot
+        rejected = await client.post("/query", json={**QUERY, "query_text": "second"})
+        assert rejected.status == 503
+        assert rejected.headers["Retry-After"] == "1"
+        assert "too many concurrent query requests" in (await rejected.json())["error"]
+        assert (await first).status == 200
+        stats = (await (await client.get("/health")).json())["limits"]["query"]
+        assert stats["rejected"] == 1
+
+    serve(scenario, assistant=make_assistant(llm_latency=0.5))
+
+def test_query_timeout_is_504_with_the_run_id(make_assistant, monkeypatch):
+    monkeypatch.setattr(config, "SERVER_QUERY_TIMEOUT", 0.1)
+
+    async def scenario(client):
+        response = await client.post("/query", json={**QUERY, "run_id": "slow-run"})
+        assert response.status == 504
+        body = await response.json()
+        assert body["run_id"] == "slow-run"
+        assert "did not finish within 0.1s" in body["error"]
+
+    serve(scenario, assistant=make_assistant(llm_latency=2.0))
+
+def test_query_stream_timeout_is_reported_in_the_stream(make_assistant, monkeypatch):
+    monkeypatch.setattr(config, "SERVER_QUERY_TIMEOUT", 0.1)
+
+    async def scenario(client):
+        response = await client.post("/query/stream", json=QUERY)
+        assert response.status == 200
+        events = [json.loads(line) async for line in response.content if line.strip()]
+        assert events[-1]["type"] == "error"
+        assert "did not finish within 0.1s" in events[-1]["error"]
+
+    serve(scenario, assistant=make_assistant(llm_latency=2.0))
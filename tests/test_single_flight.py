@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+import pytest
+
+from research_assistant.utils.single_flight import SingleFlight, query_key
+
+def test_followers_share_the_leaders_result():
+    flight = SingleFlight(ttl=60)
+    leader, future = flight.claim("key")
+    follower, shared = flight.claim("key")
+    assert leader and not follower and shared is future
+
+    flight.publish("key", future, result="answer")
+    assert shared.result() == "answer"
+    # Late arrivals get the cached result
+    late, cached = flight.claim("key")
+    assert not late and cached.result() == "answer"
+    assert flight.stats() == {"executions": 1, "coalesced": 1, "cache_hits": 1, "in_flight": 0, "cached": 1}
+
+def test_failed_results_are_shared_but_not_cached():
+    flight = SingleFlight(ttl=60)
+    _, future = flight.claim("error")
+    _, shared = flight.claim("error")
+    flight.publish("error", future, error=RuntimeError("model down"))
+    with pytest.raises(RuntimeError, match="model down"):
+        shared.result()
+    assert flight.claim("error")[0]
+
+    # A run that finished with an error in its state is published with cache=False
+    _, future = flight.claim("failed_run")
+    flight.publish("failed_run", future, result="partial", cache=False)
+    assert future.result() == "partial"
+    assert flight.claim("failed_run")[0]
+
+def test_cached_results_expire_and_are_bounded():
+    flight = SingleFlight(ttl=0.05, max_entries=2)
+    for key in ("a", "b", "c"):
+        flight.publish(key, flight.claim(key)[1], result=key)
+    assert flight.stats()["cached"] == 2
+    assert flight.claim("a")[0]  # Evicted as the oldest
+    assert not flight.claim("c")[0]
+    time.sleep(0.1)
+    assert flight.claim("c")[0]
+
+def test_query_key_ignores_case_spacing_and_document_order():
+    assert (query_key("answer_question", "What  is  attention?", ["b", "a"], {"k": 1}, 3)
+            == query_key("answer_question", "what is attention?", ["a", "b"], {"k": 1}, 3))
+    assert query_key("answer_question", "q", ["a"], None, 3) != query_key("answer_question", "q", ["a"], None, 4)
+
+def test_a_cancelled_follower_does_not_cancel_the_leader(make_assistant):
+    assistant = make_assistant()
+    assistant.single_flight = SingleFlight(ttl=60)
+
+    async def main():
+        leader, future = assistant.single_flight.claim("key")
+        assert leader
+        follower = asyncio.create_task(assistant._join_flight("key"))
+        other = asyncio.create_task(assistant._join_flight("key"))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        assert not future.cancelled()
+        assistant.single_flight.publish("key", future, result="answer")
+        return await other
+
+    assert asyncio.run(main()) == ("answer", None)
+
+def test_an_abandoned_leader_hands_off_to_a_waiter(make_assistant):
+    assistant = make_assistant()
+    assistant.single_flight = SingleFlight(ttl=60)
+
+    async def main():
+        _, abandoned = assistant.single_flight.claim("key")
+        waiters = [asyncio.create_task(assistant._join_flight("key")) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        assistant.single_flight.abandon("key", abandoned)
+        # One waiter becomes the new leader, the other follows it
+        done, pending = await asyncio.wait(waiters, timeout=1, return_when=asyncio.FIRST_COMPLETED)
+        [new_leader] = done
+        shared, future = new_leader.result()
+        assert shared is None and future is not abandoned
+        assistant.single_flight.publish("key", future, result="answer")
+        return await pending.pop()
+
+    assert asyncio.run(main()) == ("answer", None)
+    assert assistant.single_flight.stats()["executions"] == 2
+
+def test_identical_runs_are_coalesced(make_assistant, paper):
+    assistant = make_assistant(llm_latency=0.05)
+    assistant.single_flight = SingleFlight(ttl=60)
+    document_id = assistant.process_paper(paper)
+
+    async def main():
+        return await asyncio.gather(*(assistant.run("What methods are used?", "answer_question", [document_id])
+                                      for _ in range(3)))
+
+    states = asyncio.run(main())
+    assert states[0].final_answer and len({state.final_answer for state in states}) == 1
+    assert assistant.single_flight.stats()["executions"] == 1
@@ -0,0 +1,49 @@
+import pytest
+
+from benchmarks.common import HashingEmbeddings
+from research_assistant.processors.document_processor import DocumentProcessor
+from research_assistant.processors.metadata_registry import MetadataRegistry
+from research_assistant.processors.snapshot import Snapshot
+
+def fresh_processor(directory, embeddings=None):
+    return DocumentProcessor(embeddings=embeddings or HashingEmbeddings(), persist_directory=str(directory / "chroma"),
+                             metadata_registry=MetadataRegistry(str(directory / "metadata.json")))
+
+@pytest.mark.parametrize("embedding_store", [False, True])
+def test_snapshot_round_trip(make_assistant, paper, tmp_path, monkeypatch, embedding_store):
+    from research_assistant import config
+
+    monkeypatch.setattr(config, "EMBEDDING_STORE", embedding_store)
+    source = make_assistant().doc_processor
+    document_id = source.process_pdf(paper)
+    manifest = source.export_snapshot(str(tmp_path / "snapshot"))
+    [info] = source.list_documents()
+    assert manifest["rows"] == info.chunks and manifest["embedding_model"] == "HashingEmbeddings"
+
+    target = fresh_processor(tmp_path / "restored")
+    assert target.import_snapshot(str(tmp_path / "snapshot")) == info.chunks
+    assert target.list_documents() == [info]
+    assert target.metadata_registry.get(document_id) == source.metadata_registry.get(document_id)
+    query = "methods results"
+    assert ([doc.page_content for doc in target.retrieve_relevant_chunks(query, [document_id], k=3)]
+            == [doc.page_content for doc in source.retrieve_relevant_chunks(query, [document_id], k=3)])
+
+def test_empty_snapshot_round_trip(tmp_path):
+    manifest = fresh_processor(tmp_path / "empty").export_snapshot(str(tmp_path / "snapshot"))
+    assert manifest["rows"] == 0
+    assert Snapshot(str(tmp_path / "snapshot")).documents == {}
+
+    target = fresh_processor(tmp_path / "restored")
+    assert target.import_snapshot(str(tmp_path / "snapshot")) == 0
+    assert target.list_documents() == []
+    assert target.retrieve_relevant_chunks("anything") == []
+
+def test_import_refuses_another_embedding_model(tmp_path):
+    class OtherEmbeddings(HashingEmbeddings):
+        model_name = "other-model"
+
+    fresh_processor(tmp_path / "source").export_snapshot(str(tmp_path / "snapshot"))
+    target = fresh_processor(tmp_path / "restored", OtherEmbeddings())
+    with pytest.raises(ValueError, match="HashingEmbeddings"):
+        target.import_snapshot(str(tmp_path / "snapshot"))
+    assert target.import_snapshot(str(tmp_path / "snapshot"), force=True) == 0
@@ -0,0 +1,29 @@
+import asyncio
+import os
+
+from research_assistant import config
+from research_assistant.models.events import EventType
+from research_assistant.utils.tracing import export_trace
+
+def test_export_keeps_only_the_most_recent_runs(tmp_path):
+    records = [{"span_id": 1, "parent_id": None, "name": "node", "category": "node", "start": 0.0,
+                "duration": 0.1, "thread": "main"}]
+    for i in range(5):
+        paths = export_trace(records, str(tmp_path), f"run_{i}", max_runs=2)
+        os.utime(paths["jsonl"], ns=(i, i))
+    export_trace(records, str(tmp_path), "run_5", max_runs=2)
+    assert sorted(os.listdir(tmp_path)) == ["run_4.jsonl", "run_4.trace.json", "run_5.jsonl", "run_5.trace.json"]
+
+def test_final_event_carries_the_spans_without_writing_files(make_assistant, tmp_path, monkeypatch):
+    assert config.TRACE_DIR == ""
+    monkeypatch.chdir(tmp_path)
+    assistant = make_assistant()
+
+    async def final_event():
+        async for event in assistant.stream("What is the main contribution?", "answer_question"):
+            if event.type == EventType.FINAL:
+                return event
+
+    trace = asyncio.run(final_event()).data["trace"]
+    assert trace and {"name", "start", "duration"} <= set(trace[0])
+    assert not os.path.exists(tmp_path / "traces")
@@ -0,0 +1,49 @@
+import time
+
+from research_assistant.models.job import JobStatus
+
+def wait_for_job(assistant, job_id, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while (job := assistant.ingest_jobs.get(job_id)).active:
+        assert time.monotonic() < deadline, f"job still {job.status}"
+        time.sleep(0.05)
+    return job
+
+def test_vacuum_rebuilds_only_after_deletes(make_assistant, paper):
+    processor = make_assistant().doc_processor
+    kept, deleted = processor.process_pdf(paper), processor.process_pdf(paper)
+    assert processor.dead_fraction() == 0
+    assert processor.vacuum()["rebuilt"] is False
+
+    chunks = processor.delete_documents([deleted])
+    assert chunks > 0
+    assert processor.dead_fraction() == 0.5
+    assert processor.vacuum()["rebuilt"] is True
+    assert processor.dead_fraction() == 0
+    assert [info.document_id for info in processor.list_documents()] == [kept]
+
+    # Nothing deleted since: a second vacuum leaves the index as it is
+    sizes = processor.vacuum()
+    assert sizes["rebuilt"] is False
+    assert sizes["bytes_after"] <= sizes["bytes_before"]
+
+def test_vacuum_below_the_dead_fraction_skips_the_rebuild(make_assistant, paper, monkeypatch):
+    from research_assistant import config
+
+    monkeypatch.setattr(config, "VACUUM_DEAD_FRACTION", 0.9)
+    processor = make_assistant().doc_processor
+    processor.process_pdf(paper)
+    processor.delete_documents([processor.process_pdf(paper)])
+    assert processor.vacuum()["rebuilt"] is False
+    assert processor.vacuum(rebuild=True)["rebuilt"] is True
+
+def test_compact_index_runs_as_a_background_job(make_assistant, paper):
+    assistant = make_assistant()
+    document_id = assistant.process_paper(paper)
+    assistant.doc_processor.delete_documents([document_id])
+
+    job = wait_for_job(assistant, assistant.compact_index())
+    assert job.status == JobStatus.COMPLETED, job.error
+    assert job.source == "index compaction"
+    assert job.document_id is None
+    assert assistant.doc_processor.dead_fraction() == 0